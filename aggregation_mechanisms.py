@@ -1,36 +1,100 @@
+import heapq
 import json
+import numpy as np
 import os 
+import random
+import threading
+import time
 
 from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dotenv import load_dotenv
 from google import genai 
-from google.genai import types
+from google.genai import errors, types
 
-def rank_using_direct_prompt(formatted_preference_data):
-    load_dotenv()
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    if google_api_key is None:
-        raise ValueError("GOOGLE_API_KEY not found in .env file")
+from comparisons import as_comparisons, partition_entities
+from consensus import aggregate_rankings
+from instrumentation import annotate, event, span
+from ranking_parser import RankingParser
+from utils import HEAD_TO_HEAD_HEADER, estimate_tokens, format_preference_data
 
-    client = genai.Client(api_key=google_api_key)
-    model = "gemini-2.0-flash"
+MODEL = "gemini-2.0-flash"
+RETRYABLE_STATUS_CODES = (429, 500, 503)
 
-    system_inst = '''You are provided a set of match results between teams. 
-Each result includes the winner and loser of a match, or a draw. Your task is to compute the final rankings for the teams based on their overall performance in these matches. Consider the following metrics for ranking:
-- Number of wins
-- Number of losses
-- Number of draws
-
-Rank the teams in descending order of their overall skill and performance. The team with the highest number of wins, followed by fewer losses and draws, will be ranked first. In case of ties, rank based on other performance metrics like match consistency and the margin of victories.
+# prompt for ranking a subset of the teams given their matches (hierarchical and hybrid)
+SUBSET_SYSTEM_INST = '''You are provided a set of match results between teams, either one line per match ("team1 vs team2, result") or as team records followed by head-to-head counts. 
+Your task is to rank only the teams listed after "Teams to rank", in descending order of their overall skill and performance. Consider the number of wins, losses and draws, and use the head-to-head results between the listed teams and the strength of the opponents they beat to separate teams with similar records.
 
-The results are formatted as follows:
-- "team1 vs team2 result" where result can be "team1 won", "team2 won", or "match drawn".
-
-Respond only with the final ranking of teams as a JSON list, sorted in descending order of performance:
+Respond only with the ranking of the listed teams as a JSON list, sorted in descending order of performance:
 Example:
 ["Team A", "Team B", "Team C"]
 '''
 
+# how the direct, self-consistency and chain-of-thought prompts describe their input, and what
+# replaces that description when they are sent the compact table instead
+MATCH_LINES_FORMAT = '''The results are formatted as follows:
+- "team1 vs team2 result" where result can be "team1 won", "team2 won", or "match drawn".'''
+HEAD_TO_HEAD_FORMAT = '''The results are summarised as a table rather than listed match by match:
+- first each team's record as "team: wins-losses-draws",
+- then one line per pair of teams that met, "team1 vs team2: team1 wins-team2 wins-draws".'''
+
+_client = None
+_client_lock = threading.Lock()
+
+def _get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            load_dotenv()
+            google_api_key = os.getenv("GOOGLE_API_KEY")
+            if google_api_key is None:
+                raise ValueError("GOOGLE_API_KEY not found in .env file")
+
+            _client = genai.Client(api_key=google_api_key)
+    return _client
+
+def _generate(client, system_inst, formatted_preference_data, model=MODEL, temperature=0.3, cache=None, seed=None,
+              timeout=None, max_retries=5, backoff=1.0, parser=None):
+    '''
+        Streams one JSON response from the model. With a llm_cache.ResponseCache, identical
+        requests (same prompt, model, config and sample seed) are answered from the cache.
+
+        timeout: seconds allowed for the whole call (TimeoutError); also passed on as the HTTP timeout,
+                    so a stream that stops sending chunks fails instead of blocking
+        max_retries / backoff: rate-limit and transient server errors are retried with exponential
+                    backoff and jitter, starting at backoff seconds
+        parser: a ranking_parser.RankingParser fed every chunk; the stream is closed as soon as it
+                    has a complete ranking, and the response read up to then is returned. With a
+                    parser, responses are cached only if they contain a ranking.
+    '''
+    with span("llm.generate", model=model, seed=seed) as record:
+        response_text = _stream_response(
+            client, system_inst, formatted_preference_data, model, temperature, cache, seed, timeout, max_retries,
+            backoff, parser, record,
+        )
+        record["response_chars"] = len(response_text)
+    return response_text
+
+def _stream_response(client, system_inst, formatted_preference_data, model, temperature, cache, seed, timeout,
+                     max_retries, backoff, parser, record):
+    config_params = {"temperature": temperature, "response_mime_type": "application/json"}
+    if seed is not None:
+        config_params["seed"] = seed
+
+    if cache is not None:
+        key = cache.make_key(model, system_inst, formatted_preference_data, config_params, seed)
+        response_text = cache.get(key)
+        if response_text is not None and parser is not None:
+            parser.feed(response_text)
+            if not parser.names():
+                # cached before responses were validated: drop it and ask again
+                cache.delete(key)
+                record["cache_invalid"] = True
+                response_text = None
+        record["cache_hit"] = response_text is not None
+        if response_text is not None:
+            return response_text
+
     contents = [
         types.Content(
             role="user",
@@ -39,35 +103,107 @@ Example:
     ]
 
     config = types.GenerateContentConfig(
-        temperature=0.3,
-        response_mime_type="application/json",
+        **config_params,
         system_instruction=[types.Part.from_text(text=system_inst)],
+        http_options=None if timeout is None else types.HttpOptions(timeout=int(timeout * 1000)),
     )
 
-    response_text = ""
-    for chunk in client.models.generate_content_stream(
-        model=model,
-        contents=contents,
-        config=config,
-    ):
-        response_text += chunk.text
-
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for attempt in range(max_retries + 1):
+        record["attempts"] = attempt + 1
+        if parser is not None:
+            parser.reset()
+        try:
+            chunks = []
+            usage = None
+            start = time.perf_counter()
+            first_chunk = None
+            stream = client.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=config,
+            )
+            try:
+                for chunk in stream:
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter()
+                    text = chunk.text or ""
+                    chunks.append(text)
+                    usage = chunk.usage_metadata or usage
+                    if parser is not None and parser.feed(text):
+                        record["stopped_early"] = True
+                        break
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise TimeoutError(f"LLM call exceeded {timeout}s")
+            finally:
+                # stops the remaining generation when leaving the loop early
+                if hasattr(stream, "close"):
+                    stream.close()
+            response_text = "".join(chunks)
+            end = time.perf_counter()
+            break
+        except errors.APIError as e:
+            if e.code not in RETRYABLE_STATUS_CODES or attempt == max_retries:
+                raise
+            delay = backoff * 2 ** attempt * (1 + random.random())
+            if deadline is not None and time.monotonic() + delay > deadline:
+                raise TimeoutError(f"LLM call exceeded {timeout}s") from e
+            time.sleep(delay)
+        except Exception as e:
+            # e.g. the HTTP read timeout of a stalled stream
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"LLM call exceeded {timeout}s") from e
+            raise
+
+    # token counts from the API when it reports them, otherwise estimated from the text
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    output_tokens = getattr(usage, "candidates_token_count", None)
+    record["prompt_tokens"] = prompt_tokens if prompt_tokens is not None else estimate_tokens(system_inst + formatted_preference_data)
+    record["output_tokens"] = output_tokens if output_tokens is not None else estimate_tokens(response_text)
+    record["latency"] = end - start
+    if first_chunk is not None:
+        record["ttft"] = first_chunk - start
+        if end > first_chunk:
+            record["tokens_per_second"] = record["output_tokens"] / (end - first_chunk)
+
+    # only responses holding a ranking are cached, so a truncated or malformed reply is not replayed
+    if cache is not None and (parser is None or parser.names()):
+        cache.put(key, response_text)
+    return response_text
+
+def _describe_input(system_inst, formatted_preference_data):
+    '''
+        system_inst with its description of the input matching what is sent: prompts written for one
+        line per match describe the head-to-head table instead when given format_head_to_head output.
+    '''
+    if not formatted_preference_data.startswith(HEAD_TO_HEAD_HEADER):
+        return system_inst
+    if MATCH_LINES_FORMAT in system_inst:
+        return system_inst.replace(MATCH_LINES_FORMAT, HEAD_TO_HEAD_FORMAT)
+    return system_inst + "\nInput format (this replaces the match list described above):\n" + HEAD_TO_HEAD_FORMAT + "\n"
+
+def _parse_ranking(parser, method, response_text, fallback=None):
+    '''
+        The ranking read by parser, with the teams it misses filled in from fallback. Responses
+        without any usable name are recorded as parse failures and raise ValueError.
+    '''
     try:
-        rankings = json.loads(response_text)
-        if not isinstance(rankings, list):
-            raise ValueError("Expected JSON list of strings")
-        return [str(team) for team in rankings]
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse JSON response from model: {e}")
-    
-def rank_using_self_consistency(formatted_preference_data, num_samples=10):
-    load_dotenv()
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    if google_api_key is None:
-        raise ValueError("GOOGLE_API_KEY not found in .env file")
-
-    client = genai.Client(api_key=google_api_key)
-    model = "gemini-2.0-flash"
+        ranking = parser.ranking(fallback)
+    except ValueError as e:
+        event("llm.parse_failure", method=method, error=str(e), response_chars=len(response_text))
+        raise ValueError(f"Failed to parse a ranking from the model response: {response_text[:200]!r}") from e
+    if parser.filled or parser.unknown:
+        event("llm.salvaged", method=method, parsed=len(ranking) - parser.filled, filled=parser.filled, unknown=parser.unknown)
+    return ranking
+
+def rank_using_direct_prompt(formatted_preference_data, client=None, cache=None, teams=None, fallback=None):
+    '''
+        teams: known team names; other names are dropped and the response stream is closed as soon
+                    as every team has been ranked
+        fallback: ranking (e.g. from Bradley-Terry) whose order fills in teams the response leaves out
+    '''
+    if client is None:
+        client = _get_client()
 
     system_inst = '''You are provided a set of match results between teams. 
 Each result includes the winner and loser of a match, or a draw. Your task is to compute the final rankings for the teams based on their overall performance in these matches. Consider the following metrics for ranking:
@@ -85,59 +221,316 @@ Example:
 ["Team A", "Team B", "Team C"]
 '''
 
-    contents = [
-        types.Content(
-            role="user",
-            parts=[types.Part.from_text(text=formatted_preference_data)],
-        )
-    ]
+    system_inst = _describe_input(system_inst, formatted_preference_data)
+    parser = RankingParser(teams)
+    response_text = _generate(client, system_inst, formatted_preference_data, cache=cache, parser=parser)
+    return _parse_ranking(parser, "direct_prompt", response_text, fallback)
+
+
+def rank_using_self_consistency(formatted_preference_data, num_samples=10, client=None, cache=None,
+                                max_concurrency=4, timeout=None, quorum=None, quorum_top_k=3, consensus='borda',
+                                teams=None, fallback=None):
+    '''
+        Draws num_samples rankings concurrently (at most max_concurrency requests in flight) and
+        aggregates them. Samples that contain no ranking or run longer than timeout seconds are
+        dropped; a sample stuck in a stalled stream is abandoned at its deadline rather than waited
+        for, and the whole call takes at most timeout seconds per round of max_concurrency samples.
+        With quorum=q the call returns as soon as q samples agree, cancelling the samples not yet
+        sent, and aggregates only the agreeing samples. Full rankings of a large league rarely match
+        exactly, so samples agree when they put the same quorum_top_k teams at the top in the same
+        order, whatever they say about the rest; quorum_top_k=None requires identical rankings.
+
+        consensus: 'borda', 'copeland', 'markov_chain' or 'kemeny' (see consensus.py)
+        teams: known team names; anything else the model returns is ignored, and each sample's
+                    stream is closed once it has ranked every team
+        fallback: ranking whose order breaks consensus ties and fills in the teams the samples
+                    leave out; without it, alphabetical order is used
+    '''
+    if client is None:
+        client = _get_client()
 
-    config = types.GenerateContentConfig(
-        temperature=0.3,
-        response_mime_type="application/json",
-        system_instruction=[types.Part.from_text(text=system_inst)],
-    )
-    
+    system_inst = '''You are provided a set of match results between teams. 
+Each result includes the winner and loser of a match, or a draw. Your task is to compute the final rankings for the teams based on their overall performance in these matches. Consider the following metrics for ranking:
+- Number of wins
+- Number of losses
+- Number of draws
+
+Rank the teams in descending order of their overall skill and performance. The team with the highest number of wins, followed by fewer losses and draws, will be ranked first. In case of ties, rank based on other performance metrics like match consistency and the margin of victories.
+
+The results are formatted as follows:
+- "team1 vs team2 result" where result can be "team1 won", "team2 won", or "match drawn".
+
+Respond only with the final ranking of teams as a JSON list, sorted in descending order of performance:
+Example:
+["Team A", "Team B", "Team C"]
+'''
+
+    system_inst = _describe_input(system_inst, formatted_preference_data)
     all_rankings = []
-    
-    for _ in range(num_samples):
-        response_text = ""
-        for chunk in client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=config,
-        ):
-            response_text += chunk.text
+    votes = Counter()
 
-        try:
-            rankings = json.loads(response_text)
-            if not isinstance(rankings, list):
-                raise ValueError("Expected JSON list of strings")
-            all_rankings.append([str(team) for team in rankings])
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Failed to parse JSON response from model: {e}")
-    
-    print(all_rankings)
-    final_ranking = []
-    num_positions = len(all_rankings[0])
-    
-    for pos in range(num_positions):
-        teams_in_position = [ranking[pos] for ranking in all_rankings if ranking[pos] not in final_ranking]
-        
-        position_counter = Counter(teams_in_position)
-        most_common_team = position_counter.most_common(1)[0][0]
-        final_ranking.append(most_common_team)
-        
-    return final_ranking
-
-def rank_using_cot(formatted_preference_data):
-    load_dotenv()
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    if google_api_key is None:
-        raise ValueError("GOOGLE_API_KEY not found in .env file")
-
-    client = genai.Client(api_key=google_api_key)
-    model = "gemini-2.0-flash"
+    # monotonic start time of every sample that has been sent, to enforce timeout while it streams
+    started = {}
+
+    def run_sample(sample, parser):
+        started[sample] = time.monotonic()
+        return _generate(
+            client, system_inst, formatted_preference_data, cache=cache, seed=sample, timeout=timeout, parser=parser,
+        )
+
+    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+    parsers = {}
+    samples = {}
+    for sample in range(num_samples):
+        parser = RankingParser(teams)
+        future = executor.submit(run_sample, sample, parser)
+        parsers[future] = parser
+        samples[future] = sample
+    pending = set(parsers)
+    if timeout is not None:
+        rounds = -(-num_samples // max_concurrency)
+        deadline = time.monotonic() + timeout * rounds
+    try:
+        while pending:
+            wait_for = None
+            if timeout is not None:
+                deadlines = [started[samples[future]] + timeout for future in pending if samples[future] in started]
+                wait_for = max(0, min(deadlines + [deadline]) - time.monotonic())
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            if timeout is not None:
+                now = time.monotonic()
+                overdue = {
+                    future for future in pending
+                    if now > deadline or (samples[future] in started and now > started[samples[future]] + timeout)
+                }
+                for future in overdue:
+                    future.cancel()
+                    event("llm.timeout", method="self_consistency", seed=samples[future], error=f"LLM call exceeded {timeout}s")
+                pending -= overdue
+            for future in done:
+                try:
+                    response_text = future.result()
+                except TimeoutError as e:
+                    event("llm.timeout", method="self_consistency", seed=samples[future], error=str(e))
+                    continue
+
+                try:
+                    all_rankings.append(_parse_ranking(parsers[future], "self_consistency", response_text))
+                except ValueError:
+                    continue
+
+                top = tuple(all_rankings[-1][:quorum_top_k])
+                votes[top] += 1
+                if quorum is not None and votes[top] >= quorum:
+                    event("llm.samples", method="self_consistency", num_samples=len(all_rankings), distinct=len(votes), quorum=True)
+                    return _combine_samples([r for r in all_rankings if tuple(r[:quorum_top_k]) == top], consensus, teams, fallback)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if not all_rankings:
+        raise ValueError("No self-consistency sample returned a ranking in time")
+    event("llm.samples", method="self_consistency", num_samples=len(all_rankings), distinct=len(votes), quorum=False)
+    return _combine_samples(all_rankings, consensus, teams, fallback)
+
+def _combine_samples(rankings, consensus, teams, fallback):
+    '''
+        Consensus of sampled rankings. Consensus breaks ties in candidate order, so the candidates are
+        the teams the samples listed in fallback (or alphabetical) order, and the teams no sample
+        listed follow in fallback order.
+    '''
+    listed = {team for ranking in rankings for team in ranking}
+    order = list(fallback) if fallback is not None else sorted(listed if teams is None else teams)
+    candidates = [team for team in order if team in listed]
+    candidates += sorted(listed.difference(candidates))
+    ranking = aggregate_rankings(rankings, method=consensus, candidates=candidates)
+    return ranking + [team for team in order if team not in listed]
+
+def _rank_subset(client, system_inst, comparisons, teams, prompt_format, token_budget, cache, method="hierarchical"):
+    '''
+        LLM ranking of teams given every match they took part in. Names outside teams are dropped and
+        teams the model leaves out keep their given order after the ones it ranked.
+    '''
+    ids = np.array([comparisons.entity_index[team] for team in teams])
+    involved = np.isin(comparisons.winner, ids) | np.isin(comparisons.loser, ids)
+    formatted_preference_data = format_preference_data(comparisons.subset(involved), prompt_format, token_budget)
+    formatted_preference_data += "\n\nTeams to rank: " + json.dumps(teams)
+
+    parser = RankingParser(teams)
+    response_text = _generate(client, system_inst, formatted_preference_data, cache=cache, parser=parser)
+    try:
+        return _parse_ranking(parser, method, response_text, fallback=teams)
+    except ValueError:
+        return list(teams)
+
+def rank_using_hierarchical(preference_data, client=None, cache=None, groups=None, group_size=8, window=8,
+                            merge_passes=2, max_concurrency=4, prompt_format='raw', token_budget=2000):
+    '''
+        Divide-and-conquer ranking for leagues too large for one prompt. Teams are split into groups
+        (the given groups of names, e.g. conferences, or clusters of the comparison graph of at most
+        group_size teams) that are ranked by parallel prompts. The group rankings are merged keeping
+        each group's order: the i-th team of a group is placed by the i-th highest win rate in that
+        group, so every group is sorted by its merge key. The result is refined by rounds of LLM
+        reranking over disjoint windows of window teams; alternate rounds shift the windows by half
+        a window so teams can cross window boundaries. Every round runs its prompts in parallel, so
+        the critical path is 1 + merge_passes LLM calls whatever the league size.
+
+        groups: lists of team names that together name every team exactly once (ValueError otherwise)
+        merge_passes: number of rounds; each moves a team at most window - 1 places, so the merged
+                    win-rate order does most of the placing. None repeats rounds until neither window
+                    alignment changes the ranking, which can take up to about 2 * n / window rounds.
+    '''
+    if client is None:
+        client = _get_client()
+
+    comparisons = as_comparisons(preference_data)
+    entities = comparisons.entities
+    if groups is None:
+        groups = [[entities[i] for i in members] for members in partition_entities(comparisons, group_size)]
+    else:
+        named = [team for group in groups for team in group]
+        unknown = sorted(set(named) - set(entities))
+        missing = sorted(set(entities) - set(named))
+        repeated = sorted(team for team, count in Counter(named).items() if count > 1)
+        if unknown or missing or repeated:
+            raise ValueError(
+                f"groups must name every team exactly once; unknown: {unknown}, missing: {missing}, repeated: {repeated}"
+            )
+
+    n = comparisons.num_entities
+    draw = comparisons.draw
+    points = np.bincount(comparisons.winner, comparisons.outcome, minlength=n) + np.bincount(comparisons.loser[draw], minlength=n) * 0.5
+    games = np.bincount(comparisons.winner, minlength=n) + np.bincount(comparisons.loser, minlength=n)
+    win_rate = {entities[i]: points[i] / max(games[i], 1) for i in range(n)}
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        def rerank(blocks):
+            futures = [
+                executor.submit(_rank_subset, client, SUBSET_SYSTEM_INST, comparisons, block, prompt_format, token_budget, cache)
+                for block in blocks
+            ]
+            return [future.result() for future in futures]
+
+        group_rankings = rerank([list(group) for group in groups if len(group) > 1])
+        group_rankings += [list(group) for group in groups if len(group) == 1]
+        merge_key = {}
+        for group_ranking in group_rankings:
+            rates = sorted((win_rate[team] for team in group_ranking), reverse=True)
+            merge_key.update(zip(group_ranking, rates))
+        ranking = list(heapq.merge(*group_rankings, key=lambda team: -merge_key[team]))
+
+        rounds = merge_passes
+        if rounds is None:
+            rounds = -(-len(ranking) // max(window // 2, 1)) + 1
+        unchanged = 0
+        for merge_pass in range(rounds):
+            offset = window // 2 if merge_pass % 2 else 0
+            starts = range(offset, len(ranking) - 1, window)
+            blocks = [ranking[start:start + window] for start in starts]
+            previous = list(ranking)
+            for start, block in zip(starts, rerank(blocks)):
+                ranking[start:start + window] = block
+            unchanged = unchanged + 1 if ranking == previous else 0
+            if merge_passes is None and unchanged == 2:
+                break
+        annotate(merge_rounds=merge_pass + 1 if rounds else 0)
+
+    return ranking
+
+def _scores_with_errors(comparisons, model):
+    '''
+        (scores, standard errors) of every entity from a fast statistical fit.
+    '''
+    if model == 'bradley_terry':
+        # scipy.optimize is imported only when the hybrid ranker runs
+        from bradley_terry import fit_bradley_terry, standard_errors, win_edges
+
+        W = comparisons.win_matrix()
+        res = fit_bradley_terry(W)
+        return res.x, standard_errors(res.x, *win_edges(W))
+    if model == 'glicko':
+        from rating_systems import init_glicko, update_glicko
+
+        state = init_glicko(comparisons.num_entities)
+        update_glicko(state, comparisons.winner, comparisons.loser, comparisons.outcome)
+        return state['mu'], state['phi']
+    raise ValueError(f"Unknown hybrid model: {model}")
+
+def _split_block(z, start, stop, window):
+    # cut at the most separated adjacent pair until every piece has at most window teams
+    if stop - start <= window:
+        return [(start, stop)]
+    cut = start + int(np.argmax(z[start:stop - 1])) + 1
+    return _split_block(z, start, cut, window) + _split_block(z, cut, stop, window)
+
+def _ambiguous_blocks(z, threshold, window):
+    '''
+        [start, stop) position ranges of at least two teams linked by adjacent gaps z below
+        threshold (z[p] is the gap between positions p and p + 1), at most window teams each.
+    '''
+    blocks = []
+    position = 0
+    while position < len(z):
+        if z[position] >= threshold:
+            position += 1
+            continue
+        end = position
+        while end < len(z) and z[end] < threshold:
+            end += 1
+        blocks += [(start, stop) for start, stop in _split_block(z, position, end + 1, window) if stop - start > 1]
+        position = end
+    return blocks
+
+def rank_using_hybrid(preference_data, client=None, cache=None, model='bradley_terry', threshold=1.0, window=8,
+                      max_queries=None, max_concurrency=4, prompt_format='raw', token_budget=2000):
+    '''
+        Statistical ranking that asks the LLM only about the teams it cannot separate. A fast model
+        ('bradley_terry' or 'glicko') gives scores s and standard errors se; adjacent teams in its
+        order are ambiguous when z = (s_i - s_j) / sqrt(se_i^2 + se_j^2) < threshold. Every run
+        of teams linked by ambiguous gaps (cut into blocks of at most window teams) is reranked by
+        one LLM prompt holding only those teams' matches, and spliced back in place. The number of
+        prompts therefore grows with the number of near-ties, not with the league size, and the
+        prompts run in parallel.
+
+        max_queries: rerank only this many blocks, the most ambiguous (smallest z) first
+    '''
+    comparisons = as_comparisons(preference_data)
+    scores, errors = _scores_with_errors(comparisons, model)
+    order = comparisons.appearance_order()
+    order = order[np.argsort(-scores[order], kind='stable')]
+    ranking = [comparisons.entities[i] for i in order]
+
+    z = (scores[order[:-1]] - scores[order[1:]]) / np.sqrt(errors[order[:-1]] ** 2 + errors[order[1:]] ** 2)
+    blocks = _ambiguous_blocks(z, threshold, window)
+    blocks.sort(key=lambda block: z[block[0]:block[1] - 1].min())
+    if max_queries is not None:
+        blocks = blocks[:max_queries]
+    annotate(ambiguous_pairs=int((z < threshold).sum()), queries=len(blocks), reranked=sum(stop - start for start, stop in blocks))
+    if not blocks:
+        return ranking
+
+    if client is None:
+        client = _get_client()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = [
+            (start, executor.submit(
+                _rank_subset, client, SUBSET_SYSTEM_INST, comparisons, ranking[start:stop], prompt_format, token_budget,
+                cache, "hybrid",
+            ))
+            for start, stop in blocks
+        ]
+        for start, future in futures:
+            block = future.result()
+            ranking[start:start + len(block)] = block
+    return ranking
+
+def rank_using_cot(formatted_preference_data, client=None, cache=None, teams=None, fallback=None):
+    '''
+        teams / fallback: as for rank_using_direct_prompt, except that the stream is read to the
+                    end, as the reasoning may list candidate rankings before the final one (the
+                    last array in the response)
+    '''
+    if client is None:
+        client = _get_client()
 
 #     system_inst = '''
 # You are an expert sports analyst. You are given a list of match results between cricket teams. Each result is in the form:
@@ -268,31 +661,8 @@ Notes:
 - Do NOT randomly select between tied teams — use deterministic tie-breaking as described.
 - This is a deterministic task. All steps must lead to a reproducible, verifiable result.
 '''
-    contents = [
-        types.Content(
-            role="user",
-            parts=[types.Part.from_text(text=formatted_preference_data)],
-        )
-    ]
 
-    config = types.GenerateContentConfig(
-        temperature=0.3,
-        response_mime_type="application/json",
-        system_instruction=[types.Part.from_text(text=system_inst)],
-    )
-
-    response_text = ""
-    for chunk in client.models.generate_content_stream(
-        model=model,
-        contents=contents,
-        config=config,
-    ):
-        response_text += chunk.text
-    try:
-        parsed = json.loads(response_text)
-        print(parsed)
-        if not isinstance(parsed, list):
-            raise ValueError("Expected a JSON object with a 'ranking' field")
-        return parsed
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse JSON output: {e}\n\nRaw response:\n{response_text}")
+    system_inst = _describe_input(system_inst, formatted_preference_data)
+    parser = RankingParser(teams, stop_early=False)
+    response_text = _generate(client, system_inst, formatted_preference_data, cache=cache, parser=parser)
+    return _parse_ranking(parser, "chain_of_thought", response_text, fallback)
@@ -1,92 +1,131 @@
 import numpy as np
-import trueskill 
 
-from collections import defaultdict
-from glicko2 import Player as GlickoPlayer
-from elo_rating import Elo
-from scipy.optimize import minimize
-from collections import defaultdict
+from comparisons import as_comparisons
+from instrumentation import annotate
+from rating_systems import (
+    ELO_POINTS, glicko_rating, init_elo, init_glicko, init_trueskill, update_elo, update_elo_mov, update_glicko,
+    update_trueskill,
+)
 
-def rank_using_trueskill(preference_data):
+def _period(comparisons, by_period):
+    if not by_period:
+        return None
+    if comparisons.period is None:
+        raise ValueError("by_period requires comparisons with period labels")
+    return comparisons.period
+
+def rank_using_trueskill(preference_data, by_period=False):
     '''
-        preference_data: [('South Africa', 'Pakistan', 'W'),
+        preference_data: ComparisonSet or a list of tuples
+                    [('South Africa', 'Pakistan', 'W'),
                     ('South Africa', 'West Indies', 'W'),
                     ('South Africa', 'West Indies', 'D'),
                     ('South Africa', 'New Zealand', 'L'),
+        by_period: rate each rating period (e.g. NFL week) as one vectorized batch instead of
+                    replaying matches one at a time
+    '''
+    comparisons = as_comparisons(preference_data)
+    state = init_trueskill(comparisons.num_entities)
+    update_trueskill(state, comparisons.winner, comparisons.loser, comparisons.outcome, period=_period(comparisons, by_period))
+    return comparisons.rank(state['mu'])
+
+def rank_using_elo(preference_data, k=0.15, by_period=False):
+    comparisons = as_comparisons(preference_data)
+    state = init_elo(comparisons.num_entities)
+    update_elo(state, comparisons.winner, comparisons.loser, comparisons.outcome, k=k, period=_period(comparisons, by_period))
+    return comparisons.rank(state['rating'])
+
+
+def rank_using_elo_mov(preference_data, k=0.15, home_advantage=65 / ELO_POINTS, by_period=False):
+    '''
+        Elo with a margin-of-victory multiplier and home-field advantage (default 65 Elo points);
+        needs a ComparisonSet with margins, e.g. from process_nfl_dataset.
     '''
-    ratings = defaultdict(trueskill.Rating)
-    for p1, p2, outcome in preference_data:
-        if outcome == 'W':
-            ratings[p1], ratings[p2] = trueskill.rate_1vs1(ratings[p1], ratings[p2])
-        elif outcome == 'L':
-            ratings[p2], ratings[p1] = trueskill.rate_1vs1(ratings[p2], ratings[p1])
-        else:
-            ratings[p1], ratings[p2] = trueskill.rate_1vs1(ratings[p1], ratings[p2], drawn=True)
-            
-    trueskill_rankings = []
-    for team, rating in sorted(ratings.items(), key=lambda x: x[1].mu, reverse=True):
-        trueskill_rankings.append(team)
-    
-    return trueskill_rankings
-
-def rank_using_elo(preference_data, k=0.15):
-    e = Elo()
-    for p1, p2, outcome in preference_data:
-        if outcome == 'W':
-            e.add_match(p1, p2, 1.0, k=k)     
-        elif outcome == 'L':
-            e.add_match(p1, p2, 0.0, k=k)   
-        else:
-            e.add_match(p1, p2, 0.5, k=k)    
-
-    sorted_teams = sorted(e.ratings().items(), key=lambda x: x[1], reverse=True)
-    return [team for team, _ in sorted_teams]
-
-
-def rank_using_glicko(preference_data):
-    players = defaultdict(GlickoPlayer)
-    for p1, p2, outcome in preference_data:
-        if outcome == 'W':
-            players[p1].update_player([players[p2].rating], [players[p2].rd], [1])
-            players[p2].update_player([players[p1].rating], [players[p1].rd], [0])
-        elif outcome == 'L':
-            players[p2].update_player([players[p1].rating], [players[p1].rd], [1])
-            players[p1].update_player([players[p2].rating], [players[p2].rd], [0])
-        else:
-            players[p1].update_player([players[p2].rating], [players[p2].rd], [0.5])
-            players[p2].update_player([players[p1].rating], [players[p1].rd], [0.5])
-    return [team for team, _ in sorted(players.items(), key=lambda x: x[1].rating, reverse=True)]
-
-def rank_using_bradley_terry(preference_data):
-    teams = list(set([x[0] for x in preference_data] + [x[1] for x in preference_data]))
-    team_to_idx = {team: i for i, team in enumerate(teams)}
-    n = len(teams)
-
-    win_matrix = np.zeros((n, n))
-    for p1, p2, outcome in preference_data:
-        i, j = team_to_idx[p1], team_to_idx[p2]
-        if outcome == 'W':
-            win_matrix[i, j] += 1
-        elif outcome == 'L':
-            win_matrix[j, i] += 1
-        else:
-            win_matrix[i, j] += 0.5
-            win_matrix[j, i] += 0.5
-
-    def neg_log_likelihood(params):
-        likelihood = 0.0
-        for i in range(n):
-            for j in range(n):
-                if i != j and (win_matrix[i, j] + win_matrix[j, i] > 0):
-                    pi = np.exp(params[i])
-                    pj = np.exp(params[j])
-                    pij = pi / (pi + pj)
-                    likelihood += win_matrix[i, j] * np.log(pij)
-        return -likelihood
-
-    init_params = np.zeros(n)
-    res = minimize(neg_log_likelihood, init_params, method='L-BFGS-B')
-    strengths = res.x
-    ranked_teams = [team for team, _ in sorted(zip(teams, strengths), key=lambda x: x[1], reverse=True)]
-    return ranked_teams
-    
\ No newline at end of file
+    comparisons = as_comparisons(preference_data)
+    if comparisons.margin is None:
+        raise ValueError("rank_using_elo_mov requires comparisons with score margins")
+    state = init_elo(comparisons.num_entities)
+    update_elo_mov(
+        state, comparisons.winner, comparisons.loser, comparisons.outcome, comparisons.margin, comparisons.home,
+        k=k, home_advantage=home_advantage, period=_period(comparisons, by_period),
+    )
+    return comparisons.rank(state['rating'])
+
+def rank_using_glicko(preference_data, by_period=False):
+    comparisons = as_comparisons(preference_data)
+    state = init_glicko(comparisons.num_entities)
+    update_glicko(state, comparisons.winner, comparisons.loser, comparisons.outcome, period=_period(comparisons, by_period))
+    return comparisons.rank(glicko_rating(state))
+
+def rank_using_bradley_terry(preference_data, method='lbfgs', init_params=None, tol=None):
+    '''
+        method: 'lbfgs', 'mm' or 'newton' (see bradley_terry.fit_bradley_terry)
+        init_params: warm-start log-strengths indexed by entity id
+    '''
+    # scipy.optimize and scipy.sparse.linalg are imported only by the rankers that use them
+    from bradley_terry import fit_bradley_terry
+
+    comparisons = as_comparisons(preference_data)
+    res = fit_bradley_terry(comparisons.win_matrix(), method=method, init_params=init_params, tol=tol)
+    annotate(nit=res.nit, nfev=res.nfev, converged=res.success)
+    return comparisons.rank(res.x)
+
+def rank_using_bradley_terry_home(preference_data, init_params=None, tol=None):
+    '''
+        Bradley-Terry with a home-field parameter; matches without venue information count as neutral.
+    '''
+    from bradley_terry import fit_bradley_terry_home
+
+    comparisons = as_comparisons(preference_data)
+    home = comparisons.home if comparisons.home is not None else np.zeros(len(comparisons), dtype=np.int8)
+    res = fit_bradley_terry_home(
+        comparisons.num_entities, comparisons.winner, comparisons.loser, comparisons.outcome, home,
+        init_params=init_params, tol=tol,
+    )
+    annotate(nit=res.nit, nfev=res.nfev, converged=res.success, home_advantage=res.x[-1])
+    return comparisons.rank(res.x[:-1])
+
+def rank_using_rank_centrality(preference_data, reg=1.0):
+    from spectral import rank_centrality_scores
+
+    comparisons = as_comparisons(preference_data)
+    return comparisons.rank(rank_centrality_scores(comparisons.win_matrix(), reg=reg))
+
+def rank_using_pagerank(preference_data, damping=0.85):
+    from spectral import pagerank_scores
+
+    comparisons = as_comparisons(preference_data)
+    return comparisons.rank(pagerank_scores(comparisons.win_matrix(), damping=damping))
+
+def rank_using_keener(preference_data):
+    from spectral import keener_scores
+
+    comparisons = as_comparisons(preference_data)
+    return comparisons.rank(keener_scores(comparisons.win_matrix()))
+
+def rank_using_massey(preference_data):
+    from spectral import massey_scores
+
+    comparisons = as_comparisons(preference_data)
+    return comparisons.rank(massey_scores(comparisons.win_matrix()))
+
+def rank_using_massey_margin(preference_data):
+    '''
+        Massey ratings fitted to the score margins of individual games, with a home-field term when
+        the comparisons carry venues; needs a ComparisonSet with margins, e.g. from process_nfl_dataset.
+    '''
+    from spectral import massey_least_squares
+
+    comparisons = as_comparisons(preference_data)
+    if comparisons.margin is None:
+        raise ValueError("rank_using_massey_margin requires comparisons with score margins")
+    scores = massey_least_squares(
+        comparisons.num_entities, comparisons.winner, comparisons.loser, comparisons.margin, comparisons.home,
+    )
+    return comparisons.rank(scores[:comparisons.num_entities])
+
+def rank_using_colley(preference_data):
+    from spectral import colley_scores
+
+    comparisons = as_comparisons(preference_data)
+    return comparisons.rank(colley_scores(comparisons.win_matrix()))
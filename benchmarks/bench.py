@@ -0,0 +1,156 @@
+'''
+    Timing, peak-memory and recovery-accuracy benchmarks on synthetic leagues, e.g.
+
+        python -m benchmarks.bench --sizes 10 100 1000 10000 100000 --output benchmarks/results.json
+
+    Every rank_using_* function in baseline.py is run on each league size and scored against the
+    latent strengths with evaluate_ranking, those with a by_period option once more as
+    <method>_by_period, rating every period of the league as one vectorized batch; consensus methods and the evaluators are timed on
+    stacks of noisy rankings. A method that exceeds --max_seconds at one size is skipped at the
+    larger ones. Wall time is the best of --repeat runs without tracing; peak memory comes from
+    one extra run under tracemalloc (skipped with --no_memory, as tracing slows Python loops).
+'''
+
+import argparse
+import functools
+import inspect
+import json
+import numpy as np
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import baseline
+
+from benchmarks.synthetic import generate_league
+from consensus import CONSENSUS_METHODS
+from utils import encode_rankings, evaluate_ranking, evaluate_rankings
+
+parser = argparse.ArgumentParser(description="Benchmark rankers on synthetic leagues")
+parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+parser.add_argument("--games_per_team", type=int, default=16)
+parser.add_argument("--draw_rate", type=float, default=0.0)
+parser.add_argument("--noise", type=float, default=1.0)
+parser.add_argument("--num_periods", type=int, default=None, help="rating periods per league (default: games_per_team)")
+parser.add_argument("--methods", type=str, nargs="+", default=None, help="baseline methods (default: all)")
+parser.add_argument("--consensus_samples", type=int, default=10, help="rankings aggregated by the consensus methods")
+parser.add_argument("--consensus_max_teams", type=int, default=1000)
+parser.add_argument("--eval_samples", type=int, default=1000, help="rankings scored per evaluate_rankings call")
+parser.add_argument("--repeat", type=int, default=3)
+parser.add_argument("--max_seconds", type=float, default=60.0)
+parser.add_argument("--no_memory", action="store_true")
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--output", type=str, default="benchmarks/results.json")
+
+def baseline_methods():
+    methods = {}
+    for name, function in inspect.getmembers(baseline, inspect.isfunction):
+        if not name.startswith('rank_using_'):
+            continue
+        methods[name[len('rank_using_'):]] = function
+        if 'by_period' in inspect.signature(function).parameters:
+            methods[name[len('rank_using_'):] + '_by_period'] = functools.partial(function, by_period=True)
+    return methods
+
+def measure(function, *args, repeat=3, memory=True, **kwargs):
+    '''
+        (result, best wall time in seconds, peak traced bytes or None)
+    '''
+    seconds = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds = min(seconds, time.perf_counter() - start)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            function(*args, **kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, seconds, peak
+
+def noisy_rankings(strength, num_samples, noise, rng):
+    scores = strength[None, :] + noise * rng.standard_normal((num_samples, len(strength)))
+    return np.argsort(-scores, axis=1, kind='stable')
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    methods = baseline_methods()
+    if args.methods is not None:
+        methods = {name: methods[name] for name in args.methods}
+    memory = not args.no_memory
+    rng = np.random.default_rng(args.seed)
+
+    records = []
+    too_slow = set()
+
+    def record(group, method, num_teams, seconds, peak, **extra):
+        records.append({
+            'group': group, 'method': method, 'num_teams': num_teams, 'games_per_team': args.games_per_team,
+            'seconds': seconds, 'peak_bytes': peak, **extra,
+        })
+        if seconds > args.max_seconds:
+            too_slow.add((group, method))
+        print(f"{group:>10} {method:>20} n={num_teams:<7} {seconds:9.4f}s" + ("" if peak is None else f" {peak / 2 ** 20:9.1f} MiB"))
+
+    for num_teams in args.sizes:
+        comparisons, strength, gold_rankings = generate_league(
+            num_teams, args.games_per_team, draw_rate=args.draw_rate, noise=args.noise,
+            num_periods=args.num_periods, seed=args.seed,
+        )
+
+        for name, function in methods.items():
+            if ('baseline', name) in too_slow:
+                continue
+            try:
+                predicted_rankings, seconds, peak = measure(function, comparisons, repeat=args.repeat, memory=memory)
+            except Exception as e:
+                print(f"{name} failed on n={num_teams}: {e!r}")
+                continue
+            metrics = {key: float(value) for key, value in evaluate_ranking(gold_rankings, predicted_rankings).items()}
+            record('baseline', name, num_teams, seconds, peak, num_comparisons=len(comparisons), metrics=metrics)
+
+        gold = np.argsort(-strength, kind='stable')
+        samples = noisy_rankings(strength, args.eval_samples, args.noise, rng)
+        if ('evaluation', 'evaluate_rankings') not in too_slow:
+            _, seconds, peak = measure(evaluate_rankings, gold, samples, repeat=args.repeat, memory=memory)
+            record('evaluation', 'evaluate_rankings', num_teams, seconds, peak, num_rankings=args.eval_samples)
+        if ('evaluation', 'evaluate_ranking') not in too_slow:
+            names = [f"team_{i}" for i in range(num_teams)]
+            predicted = [names[i] for i in samples[0]]
+            _, seconds, peak = measure(evaluate_ranking, gold_rankings, predicted, repeat=args.repeat, memory=memory)
+            record('evaluation', 'evaluate_ranking', num_teams, seconds, peak, num_rankings=1)
+
+        if num_teams <= args.consensus_max_teams:
+            names = np.array([f"team_{i}" for i in range(num_teams)])
+            rankings = [names[order].tolist() for order in noisy_rankings(strength, args.consensus_samples, args.noise, rng)]
+            for name, function in CONSENSUS_METHODS.items():
+                if ('consensus', name) in too_slow:
+                    continue
+                aggregated, seconds, peak = measure(function, rankings, repeat=args.repeat, memory=memory)
+                metrics = evaluate_rankings(gold, encode_rankings([aggregated], names.tolist()))
+                record(
+                    'consensus', name, num_teams, seconds, peak, num_rankings=args.consensus_samples,
+                    metrics={key: float(value[0]) for key, value in metrics.items()},
+                )
+
+    with open(args.output, "w") as f:
+        json.dump({'environment': environment(), 'config': vars(args), 'results': records}, f, indent=2)
+    print(f"{len(records)} measurements written to {args.output}")
@@ -0,0 +1,42 @@
+import numpy as np
+
+from comparisons import ComparisonSet
+
+
+def generate_league(num_teams, games_per_team=16, draw_rate=0.0, noise=1.0, home_advantage=0.0, num_periods=None,
+                    points_per_unit=7.0, seed=0):
+    '''
+        Synthetic league from a Thurstone model with known latent strengths s_i ~ N(0, 1): in a
+        game at i's home, i's performance edge is d = s_i - s_j + home_advantage + noise * N(0, 1).
+        The sign of d decides the winner, the fraction draw_rate of games with the smallest |d| are
+        draws, and the margin is round(points_per_unit * |d|). Opponents are drawn uniformly and
+        games are spread evenly over num_periods rating periods (default games_per_team).
+
+        Returns (ComparisonSet with period, margin and home columns, latent strengths, gold ranking).
+    '''
+    rng = np.random.default_rng(seed)
+    strength = rng.standard_normal(num_teams)
+    num_games = num_teams * games_per_team // 2
+    if num_periods is None:
+        num_periods = games_per_team
+
+    home = rng.integers(0, num_teams, num_games)
+    away = (home + rng.integers(1, num_teams, num_games)) % num_teams
+    edge = strength[home] - strength[away] + home_advantage + noise * rng.standard_normal(num_games)
+
+    draw = np.zeros(num_games, dtype=bool)
+    if draw_rate > 0:
+        draw = np.abs(edge) <= np.quantile(np.abs(edge), draw_rate)
+    home_won = (edge > 0) | draw
+    winner = np.where(home_won, home, away)
+    loser = np.where(home_won, away, home)
+    margin = np.where(draw, 0, np.maximum(np.round(points_per_unit * np.abs(edge)), 1))
+    period = np.arange(num_games) * num_periods // max(num_games, 1)
+
+    entities = [f"team_{i}" for i in range(num_teams)]
+    comparisons = ComparisonSet(
+        entities, winner, loser, np.where(draw, 0.5, 1.0), period=period, margin=margin,
+        home=np.where(home_won, 1, -1),
+    )
+    gold_rankings = [entities[i] for i in np.argsort(-strength, kind='stable')]
+    return comparisons, strength, gold_rankings
@@ -0,0 +1,278 @@
+'''
+    Bootstrap and jackknife uncertainty for any baseline ranker, e.g.
+
+        python bootstrap.py --method elo --dataset nfl-2020 --num_samples 2000
+
+    Bootstrap intervals are percentiles of the resampled values. Leave-one-out replicates are far
+    less spread out than the sampling distribution, so jackknife intervals are instead normal
+    intervals around the replicate mean with the jackknife variance (n - 1) / n * sum((x_i - mean)^2).
+
+    Resamples are ranked in a process pool. The workers get the encoded match arrays once, from
+    the pool initializer, and then only receive seeds, so nothing but small int arrays crosses
+    process boundaries per task. Results are folded into fixed-size rank and metric histograms
+    as chunks arrive, so memory does not grow with the number of resamples.
+'''
+
+import argparse
+import numpy as np
+import os
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from statistics import NormalDist
+
+from comparisons import ComparisonSet, as_comparisons, period_slices
+from utils import evaluate_rankings
+
+_comparisons = None
+_ranker = None
+_ranker_kwargs = None
+
+
+class StreamingHistogram:
+    '''
+        Fixed-bin histogram of a stream of values on [low, high] with quantiles read off the
+        cumulative counts (interpolated within a bin, so accurate to (high - low) / bins).
+        Values outside the range are clipped to it; NaNs are counted separately.
+    '''
+
+    def __init__(self, low, high, bins=2000):
+        self.low = low
+        self.high = high
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.nan_count = 0
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        nan = np.isnan(values)
+        self.nan_count += int(nan.sum())
+        values = np.clip(values[~nan], self.low, self.high)
+        bins = len(self.counts)
+        idx = np.minimum(((values - self.low) / (self.high - self.low) * bins).astype(np.int64), bins - 1)
+        self.counts += np.bincount(idx, minlength=bins)
+        self.total += values.sum()
+        self.total_sq += (values ** 2).sum()
+
+    def mean(self):
+        return self.total / self.count if self.count else np.nan
+
+    def jackknife_std(self):
+        '''
+            Jackknife standard error, treating the values as the leave-one-out replicates.
+        '''
+        n = self.count
+        if n < 2:
+            return np.nan
+        return np.sqrt(max((n - 1) * (self.total_sq / n - self.mean() ** 2), 0.0))
+
+    def quantile(self, q):
+        q = np.asarray(q, dtype=float)
+        if self.count == 0:
+            return np.full(q.shape, np.nan)
+        cumulative = np.concatenate([[0], np.cumsum(self.counts)])
+        target = q * self.count
+        b = np.clip(np.searchsorted(cumulative, target, side='left') - 1, 0, len(self.counts) - 1)
+        inside = (target - cumulative[b]) / np.maximum(self.counts[b], 1)
+        width = (self.high - self.low) / len(self.counts)
+        return self.low + (b + np.clip(inside, 0, 1)) * width
+
+
+class BootstrapResult:
+    '''
+        rank_counts[i, p]: number of resamples that put entity i at 0-based position p
+        absent[i]: number of resamples in which entity i played no match (and was not ranked)
+        metrics: metric name -> StreamingHistogram, when a gold ranking was given
+        method: 'bootstrap' or 'jackknife', the resampling the intervals are computed for
+    '''
+
+    def __init__(self, entities, gold=None, method='bootstrap'):
+        n = len(entities)
+        self.entities = list(entities)
+        self.method = method
+        self.rank_counts = np.zeros((n, n), dtype=np.int64)
+        self.absent = np.zeros(n, dtype=np.int64)
+        self.num_samples = 0
+        self.gold = gold
+        self.metrics = {}
+
+    def add(self, encoded):
+        '''
+            encoded: S x n array of entity ids per resampled ranking, padded with -1.
+        '''
+        rows, positions = np.nonzero(encoded >= 0)
+        np.add.at(self.rank_counts, (encoded[rows, positions], positions), 1)
+        self.absent += len(encoded) - np.bincount(encoded[encoded >= 0], minlength=len(self.entities))
+        self.num_samples += len(encoded)
+        if self.gold is not None:
+            for metric, values in evaluate_rankings(self.gold, encoded).items():
+                if metric not in self.metrics:
+                    self.metrics[metric] = StreamingHistogram(-1.0, 1.0)
+                self.metrics[metric].add(values)
+
+    def rank_quantiles(self, q):
+        '''
+            len(q) x n array of 1-based rank quantiles per entity over the resamples that ranked it
+            (exact, since ranks are integers).
+        '''
+        q = np.atleast_1d(np.asarray(q, dtype=float))
+        cumulative = np.cumsum(self.rank_counts, axis=1)
+        ranked = cumulative[:, -1]
+        quantiles = np.full((len(q), len(self.entities)), np.nan)
+        for k, level in enumerate(q):
+            has = ranked > 0
+            target = np.maximum(np.ceil(level * ranked[has]), 1)
+            quantiles[k, has] = (cumulative[has] < target[:, None]).sum(axis=1) + 1
+        return quantiles
+
+    def mean_rank(self):
+        ranked = self.rank_counts.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (self.rank_counts @ np.arange(1, len(self.entities) + 1)) / ranked
+
+    def rank_std(self):
+        '''
+            Jackknife standard error of each entity's rank over the replicates that ranked it.
+        '''
+        positions = np.arange(1, len(self.entities) + 1)
+        ranked = self.rank_counts.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_sq = (self.rank_counts @ positions ** 2) / ranked
+            variance = (ranked - 1) * np.maximum(mean_sq - self.mean_rank() ** 2, 0)
+        return np.where(ranked > 1, np.sqrt(variance), np.nan)
+
+    def rank_intervals(self, level=0.95):
+        '''
+            {entity: (low, median, high)} 1-based rank interval holding `level` of the resamples; for
+            the jackknife {entity: (low, mean, high)}, the normal interval from the jackknife variance
+            clipped to the possible ranks.
+        '''
+        if self.method == 'jackknife':
+            z = NormalDist().inv_cdf(0.5 + level / 2)
+            mean, std = self.mean_rank(), self.rank_std()
+            low, high = np.clip(mean - z * std, 1, len(self.entities)), np.clip(mean + z * std, 1, len(self.entities))
+            return {entity: (low[i], mean[i], high[i]) for i, entity in enumerate(self.entities)}
+        alpha = (1 - level) / 2
+        low, median, high = self.rank_quantiles([alpha, 0.5, 1 - alpha])
+        return {entity: (low[i], median[i], high[i]) for i, entity in enumerate(self.entities)}
+
+    def metric_intervals(self, level=0.95):
+        '''
+            {metric: (low, mean, high)} interval holding `level` of the resampled metric values; for
+            the jackknife, the normal interval from the jackknife variance.
+        '''
+        alpha = (1 - level) / 2
+        z = NormalDist().inv_cdf(1 - alpha)
+        intervals = {}
+        for metric, hist in self.metrics.items():
+            if self.method == 'jackknife':
+                low, high = hist.mean() - z * hist.jackknife_std(), hist.mean() + z * hist.jackknife_std()
+            else:
+                low, high = hist.quantile([alpha, 1 - alpha])
+            intervals[metric] = (low, hist.mean(), high)
+        return intervals
+
+
+def _init_worker(entities, winner, loser, outcome, period, margin, home, ranker, ranker_kwargs):
+    global _comparisons, _ranker, _ranker_kwargs
+    _comparisons = ComparisonSet(entities, winner, loser, outcome, period, margin, home)
+    _ranker = ranker
+    _ranker_kwargs = ranker_kwargs
+
+
+def _resample_indices(comparisons, method, sample, rng):
+    m = len(comparisons)
+    if method == 'bootstrap':
+        # sorted so that sequential rating systems still see the matches in chronological order
+        return np.sort(rng.integers(0, m, m))
+    # jackknife: leave out one rating period (or one match without period labels)
+    if comparisons.period is None:
+        return np.delete(np.arange(m), sample)
+    block = period_slices(comparisons.period)[sample]
+    return np.concatenate([np.arange(block.start), np.arange(block.stop, m)])
+
+
+def _rank_resamples(method, samples, seed_sequence):
+    comparisons = _comparisons
+    rng = np.random.default_rng(seed_sequence)
+    index = {entity: idx for idx, entity in enumerate(comparisons.entities)}
+    encoded = np.full((len(samples), comparisons.num_entities), -1, dtype=np.int32)
+    for row, sample in enumerate(samples):
+        ranking = _ranker(comparisons.subset(_resample_indices(comparisons, method, sample, rng)), **_ranker_kwargs)
+        encoded[row, :len(ranking)] = [index[entity] for entity in ranking]
+    return encoded
+
+
+def bootstrap_rankings(preference_data, ranker, num_samples=1000, method='bootstrap', gold_rankings=None,
+                       workers=None, chunk_size=50, seed=0, **ranker_kwargs):
+    '''
+        Ranks num_samples resamples of preference_data with ranker (a module-level rank_using_*
+        function, so it can be sent to worker processes) and returns a BootstrapResult.
+
+        method: 'bootstrap' resamples matches with replacement; 'jackknife' leaves out one rating
+                    period at a time (one match without period labels), num_samples is ignored
+        gold_rankings: if given, the evaluate_rankings metrics of every resample are histogrammed too
+        workers: processes to use (default: CPU count); 1 runs in this process
+    '''
+    comparisons = as_comparisons(preference_data)
+    if method == 'jackknife':
+        num_samples = len(comparisons) if comparisons.period is None else len(period_slices(comparisons.period))
+    elif method != 'bootstrap':
+        raise ValueError(f"Unknown resampling method: {method}")
+
+    gold = None
+    if gold_rankings is not None:
+        gold = np.array([comparisons.entity_index[team] for team in gold_rankings if team in comparisons.entity_index])
+    result = BootstrapResult(comparisons.entities, gold, method)
+
+    chunks = [list(range(start, min(start + chunk_size, num_samples))) for start in range(0, num_samples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    initargs = (
+        comparisons.entities, comparisons.winner, comparisons.loser, comparisons.outcome, comparisons.period,
+        comparisons.margin, comparisons.home, ranker, ranker_kwargs,
+    )
+
+    if workers == 1:
+        _init_worker(*initargs)
+        for samples, seed_sequence in zip(chunks, seeds):
+            result.add(_rank_resamples(method, samples, seed_sequence))
+        return result
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+        futures = [executor.submit(_rank_resamples, method, samples, seed_sequence) for samples, seed_sequence in zip(chunks, seeds)]
+        for future in as_completed(futures):
+            result.add(future.result())
+    return result
+
+
+if __name__ == "__main__":
+    from run import BASELINE_METHODS, load_method, load_preference_data
+
+    parser = argparse.ArgumentParser(description="Bootstrap rank and metric intervals of a baseline ranker")
+    parser.add_argument("--method", type=str, required=True, choices=list(BASELINE_METHODS))
+    parser.add_argument("--dataset", type=str, required=True)
+    parser.add_argument("--resampling", type=str, default="bootstrap", choices=["bootstrap", "jackknife"])
+    parser.add_argument("--num_samples", type=int, default=1000)
+    parser.add_argument("--level", type=float, default=0.95)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    preference_data, team_identifier, gold_rankings = load_preference_data(args.dataset)
+    ranker = load_method(args.method)
+    result = bootstrap_rankings(
+        preference_data, ranker, num_samples=args.num_samples, method=args.resampling, gold_rankings=gold_rankings,
+        workers=args.workers, seed=args.seed,
+    )
+
+    print(f"{args.method} on {args.dataset}: {result.num_samples} {args.resampling} samples, {args.level:.0%} intervals")
+    intervals = result.rank_intervals(args.level)
+    for team in ranker(preference_data):
+        low, median, high = intervals[team]
+        print(f"{team:>30}  rank {median:>4.1f}  [{low:.1f}, {high:.1f}]")
+    for metric, (low, mean, high) in result.metric_intervals(args.level).items():
+        print(f"{metric:>30}  {mean:.4f}  [{low:.4f}, {high:.4f}]")
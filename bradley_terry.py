@@ -0,0 +1,201 @@
+import numpy as np
+
+from scipy import sparse
+from scipy.optimize import OptimizeResult, minimize
+from scipy.sparse.linalg import LinearOperator, cg
+from scipy.special import expit
+
+
+def win_edges(win_matrix):
+    '''
+        Flattens a (dense or scipy.sparse) win matrix into the (rows, cols, wins) triplets
+        of its non-zero off-diagonal entries; wins[k] is the number of times rows[k] beat cols[k].
+    '''
+    if sparse.issparse(win_matrix):
+        coo = sparse.coo_matrix(win_matrix)
+        coo.sum_duplicates()
+        rows, cols, wins = coo.row, coo.col, coo.data.astype(float)
+    else:
+        win_matrix = np.asarray(win_matrix, dtype=float)
+        rows, cols = np.nonzero(win_matrix)
+        wins = win_matrix[rows, cols]
+    mask = (rows != cols) & (wins > 0)
+    return rows[mask], cols[mask], wins[mask]
+
+
+def neg_log_likelihood(params, rows, cols, wins):
+    # -sum_ij w_ij * log(sigmoid(s_i - s_j)), written with logaddexp to stay finite for large gaps
+    return np.sum(wins * np.logaddexp(0.0, params[cols] - params[rows]))
+
+
+def neg_log_likelihood_grad(params, rows, cols, wins):
+    n = len(params)
+    q = wins * expit(params[cols] - params[rows])
+    return np.bincount(cols, q, minlength=n) - np.bincount(rows, q, minlength=n)
+
+
+def neg_log_likelihood_hess(params, rows, cols, wins):
+    n = len(params)
+    p = expit(params[rows] - params[cols])
+    h = wins * p * (1.0 - p)
+    diag = np.bincount(rows, h, minlength=n) + np.bincount(cols, h, minlength=n)
+    return sparse.coo_matrix(
+        (np.concatenate([diag, -h, -h]),
+         (np.concatenate([np.arange(n), rows, cols]), np.concatenate([np.arange(n), cols, rows]))),
+        shape=(n, n),
+    ).tocsc()
+
+
+def standard_errors(params, rows, cols, wins, ridge=1e-8):
+    '''
+        Approximate standard errors of fitted log-strengths: 1 / sqrt of the diagonal of the
+        observed information (neg_log_likelihood_hess), i.e. ignoring covariances between entities.
+        Entities whose games are all decided far from 50/50 get large errors.
+    '''
+    n = len(params)
+    p = expit(params[rows] - params[cols])
+    h = wins * p * (1.0 - p)
+    info = np.bincount(rows, h, minlength=n) + np.bincount(cols, h, minlength=n)
+    return 1.0 / np.sqrt(info + ridge)
+
+
+def _fit_lbfgs(rows, cols, wins, x0, tol, max_iter):
+    options = {} if max_iter is None else {'maxiter': max_iter}
+    return minimize(
+        neg_log_likelihood, x0, args=(rows, cols, wins), jac=neg_log_likelihood_grad,
+        method='L-BFGS-B', tol=tol, options=options,
+    )
+
+
+def _fit_mm(rows, cols, wins, x0, tol, max_iter):
+    '''
+        Hunter's (2004) minorization-maximization updates:
+            p_i <- W_i / sum_j n_ij / (p_i + p_j)
+        where W_i is the number of wins of i and n_ij the number of games between i and j.
+    '''
+    n = len(x0)
+    total_wins = np.bincount(rows, wins, minlength=n)
+    floor = np.finfo(float).tiny
+    p = np.exp(x0 - x0.max())
+    p *= n / p.sum()
+    converged = False
+    nit = 0
+    for nit in range(1, max_iter + 1):
+        inv = wins / (p[rows] + p[cols])
+        denom = np.bincount(rows, inv, minlength=n) + np.bincount(cols, inv, minlength=n)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            new_p = np.where(denom > 0, total_wins / denom, p)
+        new_p = np.maximum(new_p * (n / new_p.sum()), floor)
+        delta = np.max(np.abs(new_p - p), initial=0.0)
+        p = new_p
+        if delta < tol * p.max():
+            converged = True
+            break
+    x = np.log(p)
+    return OptimizeResult(
+        x=x, fun=neg_log_likelihood(x, rows, cols, wins), nit=nit, nfev=nit, success=converged,
+        message='converged' if converged else 'maximum number of iterations reached',
+    )
+
+
+def _fit_newton(rows, cols, wins, x0, tol, max_iter, ridge=1e-8):
+    n = len(x0)
+    x = x0.copy()
+    fun = neg_log_likelihood(x, rows, cols, wins)
+    nfev = 1
+    converged = False
+    nit = 0
+    for nit in range(1, max_iter + 1):
+        grad = neg_log_likelihood_grad(x, rows, cols, wins)
+        if np.max(np.abs(grad), initial=0.0) < tol:
+            converged = True
+            break
+        # the likelihood is invariant to a common shift, so the Hessian is singular without the ridge
+        hess = neg_log_likelihood_hess(x, rows, cols, wins) + ridge * sparse.identity(n, format='csc')
+        # conjugate gradients with a Jacobi preconditioner: direct factorisation fills in badly on
+        # large, randomly connected comparison graphs
+        inv_diag = 1.0 / hess.diagonal()
+        step, _ = cg(hess, grad, M=LinearOperator((n, n), matvec=lambda v: inv_diag * v), maxiter=max(n, 100))
+        t = 1.0
+        while True:
+            candidate = x - t * step
+            candidate_fun = neg_log_likelihood(candidate, rows, cols, wins)
+            nfev += 1
+            if candidate_fun <= fun or t < 1e-10:
+                break
+            t *= 0.5
+        x = candidate - candidate.mean()
+        if abs(fun - candidate_fun) < tol * max(1.0, abs(fun)):
+            fun = candidate_fun
+            converged = True
+            break
+        fun = candidate_fun
+    return OptimizeResult(
+        x=x, fun=fun, nit=nit, nfev=nfev, success=converged,
+        message='converged' if converged else 'maximum number of iterations reached',
+    )
+
+
+def fit_bradley_terry(win_matrix, method='lbfgs', init_params=None, tol=None, max_iter=None):
+    '''
+        Fits Bradley-Terry log-strengths to an n x n win matrix (dense array or scipy.sparse),
+        where win_matrix[i, j] counts the wins of i over j (draws as 0.5 each way).
+
+        method: 'lbfgs' (L-BFGS-B with the analytic gradient), 'mm' (Hunter's MM) or 'newton'.
+        init_params: warm start, e.g. the strengths from a previous fit.
+        tol: convergence tolerance; None keeps scipy's default for 'lbfgs' and 1e-8 otherwise.
+
+        Returns a scipy OptimizeResult whose x holds the log-strengths.
+    '''
+    n = win_matrix.shape[0]
+    rows, cols, wins = win_edges(win_matrix)
+    x0 = np.zeros(n) if init_params is None else np.asarray(init_params, dtype=float).copy()
+
+    if method == 'lbfgs':
+        return _fit_lbfgs(rows, cols, wins, x0, tol, max_iter)
+    if method == 'mm':
+        return _fit_mm(rows, cols, wins, x0, 1e-8 if tol is None else tol, 1000 if max_iter is None else max_iter)
+    if method == 'newton':
+        return _fit_newton(rows, cols, wins, x0, 1e-8 if tol is None else tol, 100 if max_iter is None else max_iter)
+    raise ValueError(f"Unknown Bradley-Terry method: {method}")
+
+
+def home_edges(winner, loser, outcome, home):
+    '''
+        Per-match (rows, cols, wins, venue) edges: rows[k] beat cols[k] with weight wins[k], and
+        venue[k] is +1 if rows[k] was at home, -1 if cols[k] was. Draws give half a win each way.
+    '''
+    draw = outcome == 0.5
+    rows = np.concatenate([winner, loser[draw]])
+    cols = np.concatenate([loser, winner[draw]])
+    wins = np.concatenate([outcome, outcome[draw]])
+    venue = np.concatenate([home, -home[draw]]).astype(float)
+    return rows, cols, wins, venue
+
+
+def neg_log_likelihood_home(params, rows, cols, wins, venue):
+    # params = log-strengths followed by the home advantage h: P(i beats j) = sigmoid(s_i - s_j + h * venue)
+    s, h = params[:-1], params[-1]
+    return np.sum(wins * np.logaddexp(0.0, s[cols] - s[rows] - h * venue))
+
+
+def neg_log_likelihood_home_grad(params, rows, cols, wins, venue):
+    s, h = params[:-1], params[-1]
+    n = len(s)
+    q = wins * expit(s[cols] - s[rows] - h * venue)
+    return np.concatenate([np.bincount(cols, q, minlength=n) - np.bincount(rows, q, minlength=n), [-np.sum(q * venue)]])
+
+
+def fit_bradley_terry_home(num_entities, winner, loser, outcome, home, init_params=None, tol=None, max_iter=None):
+    '''
+        Bradley-Terry with a common home-field advantage, fitted by L-BFGS-B on the per-match
+        likelihood (see home_edges for the columns). Returns a scipy OptimizeResult whose x holds
+        the num_entities log-strengths followed by the home advantage on the same logit scale.
+    '''
+    rows, cols, wins, venue = home_edges(winner, loser, outcome, home)
+    x0 = np.zeros(num_entities + 1) if init_params is None else np.asarray(init_params, dtype=float).copy()
+    options = {} if max_iter is None else {'maxiter': max_iter}
+    return minimize(
+        neg_log_likelihood_home, x0, args=(rows, cols, wins, venue), jac=neg_log_likelihood_home_grad,
+        method='L-BFGS-B', tol=tol, options=options,
+    )
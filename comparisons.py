@@ -0,0 +1,160 @@
+import numpy as np
+
+
+class ComparisonSet:
+    '''
+        Array-backed set of pairwise comparisons over integer-encoded entities.
+
+        entities: entity names, entity id i <-> entities[i]
+        winner, loser: entity ids per match (int32); drawn matches keep their original (p1, p2) order
+        outcome: score of the winner column per match, 1.0 for a win and 0.5 for a draw
+        period: optional rating-period label per match (e.g. the NFL week), in chronological order
+        margin: optional winner's score minus loser's score per match (0 for draws)
+        home: optional venue per match, +1 if the winner column played at home, -1 if the loser
+                    column did, 0 for a neutral or unknown venue
+
+        Iterating yields (winner, loser, 'W') / (p1, p2, 'D') name tuples, so a ComparisonSet can be
+        passed anywhere the old preference_data lists were accepted.
+    '''
+
+    def __init__(self, entities, winner, loser, outcome=None, period=None, margin=None, home=None):
+        self.entities = list(entities)
+        self.entity_index = {entity: idx for idx, entity in enumerate(self.entities)}
+        self.winner = np.asarray(winner, dtype=np.int32)
+        self.loser = np.asarray(loser, dtype=np.int32)
+        if outcome is None:
+            outcome = np.ones(len(self.winner))
+        self.outcome = np.asarray(outcome, dtype=float)
+        self.period = None if period is None else np.asarray(period)
+        self.margin = None if margin is None else np.asarray(margin, dtype=float)
+        self.home = None if home is None else np.asarray(home, dtype=np.int8)
+
+    @classmethod
+    def from_tuples(cls, preference_data, entities=None, period=None):
+        '''
+            preference_data: [('South Africa', 'Pakistan', 'W'),
+                        ('South Africa', 'West Indies', 'D'),
+                        ('South Africa', 'New Zealand', 'L'), ...]
+            entities: optional fixed entity order; unseen names are appended in order of appearance
+            period: optional rating-period label per tuple
+        '''
+        if isinstance(preference_data, cls):
+            return preference_data
+        entity_index = {} if entities is None else {entity: idx for idx, entity in enumerate(entities)}
+        m = len(preference_data)
+        winner = np.empty(m, dtype=np.int32)
+        loser = np.empty(m, dtype=np.int32)
+        outcome = np.ones(m)
+        for k, (p1, p2, result) in enumerate(preference_data):
+            i = entity_index.setdefault(p1, len(entity_index))
+            j = entity_index.setdefault(p2, len(entity_index))
+            if result == 'L':
+                i, j = j, i
+            elif result != 'W':
+                outcome[k] = 0.5
+            winner[k], loser[k] = i, j
+        return cls(entity_index.keys(), winner, loser, outcome, period)
+
+    @property
+    def num_entities(self):
+        return len(self.entities)
+
+    @property
+    def draw(self):
+        return self.outcome == 0.5
+
+    def __len__(self):
+        return len(self.winner)
+
+    def __iter__(self):
+        entities = self.entities
+        for i, j, draw in zip(self.winner.tolist(), self.loser.tolist(), self.draw.tolist()):
+            yield entities[i], entities[j], 'D' if draw else 'W'
+
+    def __repr__(self):
+        return f"ComparisonSet(entities={self.num_entities}, comparisons={len(self)})"
+
+    def subset(self, index):
+        '''
+            Comparisons selected by an integer or boolean index array, over the same entity encoding.
+        '''
+        period = None if self.period is None else self.period[index]
+        margin = None if self.margin is None else self.margin[index]
+        home = None if self.home is None else self.home[index]
+        return ComparisonSet(self.entities, self.winner[index], self.loser[index], self.outcome[index], period, margin, home)
+
+    def win_matrix(self, format='csr'):
+        '''
+            Sparse n x n matrix whose (i, j) entry counts the wins of i over j, draws as 0.5 each way.
+        '''
+        from scipy import sparse
+
+        n = self.num_entities
+        draw = self.draw
+        rows = np.concatenate([self.winner, self.loser[draw]])
+        cols = np.concatenate([self.loser, self.winner[draw]])
+        wins = np.concatenate([self.outcome, self.outcome[draw]])
+        return sparse.coo_matrix((wins, (rows, cols)), shape=(n, n)).asformat(format)
+
+    def appearance_order(self):
+        '''
+            Ids of the entities that took part in at least one comparison, in order of first appearance.
+        '''
+        ids = np.empty(2 * len(self), dtype=np.int32)
+        ids[0::2], ids[1::2] = self.winner, self.loser
+        unique, first = np.unique(ids, return_index=True)
+        return unique[np.argsort(first, kind='stable')]
+
+    def rank(self, scores):
+        '''
+            Names of the participating entities sorted by descending score, ties kept in order of appearance.
+        '''
+        order = self.appearance_order()
+        order = order[np.argsort(-np.asarray(scores)[order], kind='stable')]
+        return [self.entities[i] for i in order]
+
+
+def period_slices(period):
+    '''
+        Slices over consecutive runs of equal labels in a chronologically ordered period array.
+    '''
+    period = np.asarray(period)
+    bounds = np.flatnonzero(period[1:] != period[:-1]) + 1
+    bounds = np.concatenate([[0], bounds, [len(period)]]).tolist()
+    return [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def partition_entities(comparisons, max_group_size):
+    '''
+        Splits the participating entities into groups of at most max_group_size that play each
+        other often (e.g. NFL divisions): connected components of the comparison graph are bisected
+        recursively at the median of their Fiedler vector. Groups are lists of entity ids in order
+        of first appearance.
+    '''
+    from scipy.sparse.csgraph import connected_components
+
+    order = comparisons.appearance_order()
+    games = comparisons.win_matrix()
+    games = (games + games.T).tocsr()[order][:, order]
+    num_components, labels = connected_components(games, directed=False)
+    stack = [np.flatnonzero(labels == c) for c in range(num_components)]
+    groups = []
+    while stack:
+        members = stack.pop()
+        if len(members) <= max_group_size:
+            groups.append(members)
+            continue
+        adjacency = games[members][:, members].toarray()
+        degree = adjacency.sum(axis=1)
+        scale = 1 / np.sqrt(np.maximum(degree, 1e-12))
+        laplacian = np.eye(len(members)) - scale[:, None] * adjacency * scale[None, :]
+        fiedler = np.linalg.eigh(laplacian)[1][:, 1] * scale
+        split = np.argsort(fiedler, kind='stable')
+        half = len(members) // 2
+        stack += [np.sort(members[split[half:]]), np.sort(members[split[:half]])]
+    groups.sort(key=lambda members: members[0])
+    return [order[members] for members in groups]
+
+
+def as_comparisons(preference_data):
+    return ComparisonSet.from_tuples(preference_data)
@@ -0,0 +1,201 @@
+'''
+    Rank aggregation over a collection of (possibly partial or top-k) rankings, e.g. the samples
+    drawn by rank_using_self_consistency.
+
+    Every method takes a list of rankings (lists of names) and an optional candidate list. Names
+    outside the candidates are ignored, repeated names only count at their first position, and
+    candidates a ranking leaves out are treated as tied below everything it does list. Ties in the
+    final order are broken by candidate order.
+'''
+
+import numpy as np
+
+def _candidates(rankings, candidates):
+    if candidates is not None:
+        return list(dict.fromkeys(candidates))
+    return list(dict.fromkeys(name for ranking in rankings for name in ranking))
+
+
+def positions(rankings, candidates):
+    '''
+        S x n matrix with the 0-based position of each candidate in each ranking, inf where absent.
+    '''
+    index = {name: i for i, name in enumerate(candidates)}
+    pos = np.full((len(rankings), len(candidates)), np.inf)
+    for s, ranking in enumerate(rankings):
+        p = 0
+        for name in ranking:
+            i = index.get(name)
+            if i is not None and pos[s, i] == np.inf:
+                pos[s, i] = p
+                p += 1
+    return pos
+
+
+def preference_matrix(pos):
+    '''
+        M[a, b] = number of rankings that place a above b.
+    '''
+    n = pos.shape[1]
+    M = np.zeros((n, n))
+    for row in pos:
+        M += row[:, None] < row[None, :]
+    return M
+
+
+def _order(scores):
+    return np.argsort(-np.asarray(scores), kind='stable')
+
+
+def borda_scores(pos):
+    '''
+        A listed candidate at position p earns n - 1 - p points; the candidates a ranking leaves out
+        share its remaining points equally.
+    '''
+    n = pos.shape[1]
+    listed = np.isfinite(pos)
+    length = listed.sum(axis=1, keepdims=True)
+    points = np.where(listed, n - 1 - np.where(listed, pos, 0), (n - length - 1) / 2)
+    return points.sum(axis=0)
+
+
+def copeland_scores(M):
+    return np.sign(M - M.T).sum(axis=1)
+
+
+def markov_chain_scores(M, damping=0.95, tol=1e-12, max_iter=10000):
+    '''
+        Stationary distribution of the MC4 chain of Dwork et al. (2001): from candidate a, pick a
+        candidate b uniformly and move there if a majority of the rankings that compare the two
+        prefer b. A small uniform teleport keeps the chain ergodic.
+    '''
+    n = M.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    P = (M.T > M).astype(float) / n
+    P[np.diag_indices(n)] = 1 - P.sum(axis=1)
+    pi = np.full(n, 1 / n)
+    for _ in range(max_iter):
+        new_pi = damping * (pi @ P) + (1 - damping) / n
+        if np.abs(new_pi - pi).sum() < tol:
+            return new_pi
+        pi = new_pi
+    return pi
+
+
+def kemeny_cost(order, M):
+    '''
+        Number of (ranking, pair) disagreements of an order: sum over a placed above b of M[b, a].
+    '''
+    order = np.asarray(order)
+    placed_above = np.triu(np.ones((len(order), len(order)), dtype=bool), 1)
+    return M[np.ix_(order, order)].T[placed_above].sum()
+
+
+def _kemeny_local_search(order, M):
+    '''
+        Moves single candidates to the best position until no move lowers the Kemeny cost.
+    '''
+    order = list(order)
+    n = len(order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(n):
+            a = order[i]
+            rest = order[:i] + order[i + 1:]
+            # cost of a at slot k relative to the rest: candidates before it that a beats, after it that beat a
+            lose = M[rest, a]
+            win = M[a, rest]
+            cost = np.concatenate([[0.0], np.cumsum(win)]) + np.concatenate([np.cumsum(lose[::-1])[::-1], [0.0]])
+            best = int(np.argmin(cost))
+            if cost[best] < cost[i] - 1e-12:
+                order = rest[:best] + [a] + rest[best:]
+                improved = True
+    return order
+
+
+def _kemeny_branch_and_bound(M, initial):
+    n = M.shape[0]
+    pair_min = np.minimum(M, M.T)
+    best_order = list(initial)
+    best_cost = kemeny_cost(best_order, M)
+
+    def search(prefix, remaining, cost):
+        nonlocal best_order, best_cost
+        if not remaining:
+            if cost < best_cost:
+                best_order, best_cost = list(prefix), cost
+            return
+        rem = list(remaining)
+        bound = cost + pair_min[np.ix_(rem, rem)].sum() / 2
+        if bound >= best_cost:
+            return
+        # try candidates in the order of the heuristic solution so good orders are found first
+        for a in [c for c in best_order if c in remaining]:
+            others = [b for b in rem if b != a]
+            step = M[others, a].sum()
+            if cost + step < best_cost:
+                prefix.append(a)
+                remaining.discard(a)
+                search(prefix, remaining, cost + step)
+                remaining.add(a)
+                prefix.pop()
+
+    search([], set(range(n)), 0.0)
+    return best_order
+
+
+def kemeny_order(M, initial=None, exact_limit=10):
+    '''
+        Kemeny-optimal order by branch and bound for n <= exact_limit candidates, otherwise a local
+        search started from initial (Borda by default).
+    '''
+    n = M.shape[0]
+    if initial is None:
+        initial = _order(M.sum(axis=1))
+    order = _kemeny_local_search(initial, M)
+    if n <= exact_limit:
+        order = _kemeny_branch_and_bound(M, order)
+    return np.asarray(order, dtype=int)
+
+
+def rank_using_borda(rankings, candidates=None):
+    candidates = _candidates(rankings, candidates)
+    return [candidates[i] for i in _order(borda_scores(positions(rankings, candidates)))]
+
+
+def rank_using_copeland(rankings, candidates=None):
+    candidates = _candidates(rankings, candidates)
+    pos = positions(rankings, candidates)
+    scores = copeland_scores(preference_matrix(pos))
+    # Borda as secondary key for candidates with equal Copeland score
+    order = np.lexsort((-borda_scores(pos), -scores))
+    return [candidates[i] for i in order]
+
+
+def rank_using_markov_chain(rankings, candidates=None):
+    candidates = _candidates(rankings, candidates)
+    M = preference_matrix(positions(rankings, candidates))
+    return [candidates[i] for i in _order(markov_chain_scores(M))]
+
+
+def rank_using_kemeny(rankings, candidates=None, exact_limit=10):
+    candidates = _candidates(rankings, candidates)
+    pos = positions(rankings, candidates)
+    order = kemeny_order(preference_matrix(pos), initial=_order(borda_scores(pos)), exact_limit=exact_limit)
+    return [candidates[i] for i in order]
+
+
+CONSENSUS_METHODS = {
+    'borda': rank_using_borda,
+    'copeland': rank_using_copeland,
+    'markov_chain': rank_using_markov_chain,
+    'kemeny': rank_using_kemeny,
+}
+
+
+def aggregate_rankings(rankings, method='borda', candidates=None):
+    if method not in CONSENSUS_METHODS:
+        raise ValueError(f"Unknown consensus method: {method}")
+    return CONSENSUS_METHODS[method](rankings, candidates)
@@ -0,0 +1,230 @@
+'''
+    Timing, memory and profiling hooks for rankers, data loading and LLM calls, e.g.
+
+        recorder = Recorder(trace_memory=True, dataset="nfl-2020")
+        with recording(recorder):
+            with span("method", method="bradley_terry"):
+                res = fit_bradley_terry(...)
+                annotate(nit=res.nit, nfev=res.nfev)
+        recorder.write("metrics.jsonl")
+
+    Outside `recording` every hook costs one global lookup, so they can stay in hot paths. Spans
+    nest per thread and annotate() adds fields to the innermost open span of the calling thread;
+    the recorder itself is shared, so spans opened by worker threads (e.g. self-consistency
+    samples) are collected too.
+'''
+
+import contextlib
+import functools
+import json
+import os
+import re
+import threading
+import time
+import tracemalloc
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+_recorder = None
+_local = threading.local()
+
+
+class Recorder:
+    '''
+        Collects one dict per finished span or event, tagged with the given context fields.
+
+        trace_memory: trace allocations with tracemalloc while recording (slows Python code down) and
+                    record the peak of every outermost span; tracemalloc's peak is process-wide, so
+                    spans that overlap with another traced span (e.g. in worker threads) share one
+                    peak and are marked peak_shared
+        profiler: None, 'cprofile' or 'pyinstrument'; spans opened with profile=True are profiled
+                    and the profile is written to profile_dir (.prof for cProfile, .html for pyinstrument)
+    '''
+
+    def __init__(self, trace_memory=False, profiler=None, profile_dir=".profiles", **context):
+        if profiler is not None and profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler: {profiler}")
+        self.trace_memory = trace_memory
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        self.context = context
+        self.records = []
+        self._lock = threading.Lock()
+        # traced spans open in any thread, and traced spans started so far
+        self._open_traces = 0
+        self._trace_starts = 0
+
+    def emit(self, record):
+        with self._lock:
+            self.records.append({**self.context, **record})
+
+    def extend(self, records):
+        '''
+            Adds records collected by another recorder, e.g. in a worker process.
+        '''
+        with self._lock:
+            self.records.extend(records)
+
+    def write(self, path):
+        '''
+            Appends the collected records to the JSONL file at path, clears them and returns how many
+            were written.
+        '''
+        with self._lock:
+            records, self.records = self.records, []
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record, default=_to_json) + "\n")
+        return len(records)
+
+
+def _to_json(value):
+    # numpy scalars and arrays
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+@contextlib.contextmanager
+def recording(recorder):
+    '''
+        Makes recorder the destination of all spans and events until the block exits, tracing
+        memory allocations meanwhile if the recorder has trace_memory set.
+    '''
+    global _recorder
+    start_tracing = recorder.trace_memory and not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    previous, _recorder = _recorder, recorder
+    try:
+        yield recorder
+    finally:
+        _recorder = previous
+        if start_tracing:
+            tracemalloc.stop()
+
+
+def active():
+    return _recorder is not None
+
+
+def _start_profiler(kind):
+    if kind == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+    return profiler
+
+
+def _save_profile(kind, profiler, directory, name):
+    os.makedirs(directory, exist_ok=True)
+    label = re.sub(r"[^\w.-]+", "_", name)
+    stem = os.path.join(directory, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+    if kind == "cprofile":
+        profiler.disable()
+        path = stem + ".prof"
+        profiler.dump_stats(path)
+    else:
+        profiler.stop()
+        path = stem + ".html"
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+    return path
+
+
+@contextlib.contextmanager
+def span(name, profile=False, **fields):
+    '''
+        Times the block and emits {'event': name, 'start', 'seconds', 'parent', **fields}. Yields the
+        record, so the block can add fields directly; an exception is recorded as 'error' and re-raised.
+        profile: capture a profile of the block with the recorder's profiler, if it has one
+    '''
+    recorder = _recorder
+    if recorder is None:
+        yield fields
+        return
+
+    stack = _stack()
+    record = {"event": name, "start": time.time(), "parent": stack[-1]["event"] if stack else None, **fields}
+    trace = recorder.trace_memory and not stack and tracemalloc.is_tracing()
+    if trace:
+        with recorder._lock:
+            # the peak is only reset when no other traced span is measuring it
+            shared = recorder._open_traces > 0
+            if not shared:
+                tracemalloc.reset_peak()
+            recorder._open_traces += 1
+            recorder._trace_starts += 1
+            trace_starts = recorder._trace_starts
+            baseline = tracemalloc.get_traced_memory()[0]
+    profiler = _start_profiler(recorder.profiler) if profile and recorder.profiler is not None else None
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = repr(e)
+        raise
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        stack.pop()
+        if profiler is not None:
+            record["profile"] = _save_profile(recorder.profiler, profiler, recorder.profile_dir, name)
+        if trace:
+            with recorder._lock:
+                record["peak_bytes"] = max(tracemalloc.get_traced_memory()[1] - baseline, 0)
+                recorder._open_traces -= 1
+                if shared or recorder._trace_starts != trace_starts:
+                    record["peak_shared"] = True
+        recorder.emit(record)
+
+
+def annotate(**fields):
+    '''
+        Adds fields (e.g. optimizer iterations) to the innermost open span of this thread.
+    '''
+    if _recorder is None:
+        return
+    stack = _stack()
+    if stack:
+        stack[-1].update(fields)
+
+
+def event(name, **fields):
+    '''
+        Emits a point record, e.g. a parse failure, with the enclosing span as its parent.
+    '''
+    recorder = _recorder
+    if recorder is None:
+        return
+    stack = _stack()
+    recorder.emit({"event": name, "start": time.time(), "parent": stack[-1]["event"] if stack else None, **fields})
+
+
+def instrumented(name=None):
+    '''
+        Decorator that runs every call of the function in a span named after it.
+    '''
+    def decorate(function):
+        label = name or f"{function.__module__}.{function.__qualname__}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return function(*args, **kwargs)
+            with span(label):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
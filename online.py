@@ -0,0 +1,334 @@
+import json
+import numpy as np
+import pandas as pd
+
+from scipy import sparse
+
+from bradley_terry import fit_bradley_terry
+from comparisons import as_comparisons, period_slices
+from instrumentation import event
+from rating_systems import (
+    glicko_rating, init_elo, init_glicko, init_trueskill, update_elo, update_glicko, update_trueskill,
+)
+
+
+class OnlineRanker:
+    '''
+        Stateful ranker fed with new results as they arrive:
+
+            ranker = OnlineElo()
+            ranker.update(week_1_matches)
+            ranker.update(week_2_matches)
+            ranker.current_ranking()
+            ranker.save('elo.npz'); ranker = OnlineRanker.load('elo.npz')
+
+        update() accepts a ComparisonSet or a list of (p1, p2, outcome) tuples. Entities get ids in
+        order of first appearance, so replaying a history in chunks gives the same ranking as the
+        batch rank_using_* function on the whole history. With by_period=True every update() call
+        must contain whole rating periods.
+    '''
+    kind = None
+    registry = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        OnlineRanker.registry[cls.kind] = cls
+
+    def __init__(self, by_period=False):
+        self.by_period = by_period
+        self.entities = []
+        self.entity_index = {}
+        self.num_comparisons = 0
+        self.state = self._init_state(0)
+
+    def config(self):
+        return {'by_period': self.by_period}
+
+    def _init_state(self, n):
+        raise NotImplementedError
+
+    def _update(self, winner, loser, outcome, period):
+        raise NotImplementedError
+
+    def scores(self):
+        raise NotImplementedError
+
+    def _encode(self, new_matches):
+        comparisons = as_comparisons(new_matches)
+        mapping = np.empty(comparisons.num_entities, dtype=np.int32)
+        for idx in comparisons.appearance_order().tolist():
+            name = comparisons.entities[idx]
+            if name not in self.entity_index:
+                self.entity_index[name] = len(self.entities)
+                self.entities.append(name)
+            mapping[idx] = self.entity_index[name]
+        return comparisons, mapping[comparisons.winner], mapping[comparisons.loser]
+
+    def _grow(self):
+        added = len(self.entities) - len(next(iter(self.state.values())))
+        if added > 0:
+            extra = self._init_state(added)
+            self.state = {key: np.concatenate([value, extra[key]]) for key, value in self.state.items()}
+
+    def update(self, new_matches):
+        comparisons, winner, loser = self._encode(new_matches)
+        if len(comparisons) == 0:
+            return self
+        self._grow()
+        period = None
+        if self.by_period:
+            if comparisons.period is None:
+                raise ValueError("by_period requires comparisons with period labels")
+            period = comparisons.period
+        self._update(winner, loser, comparisons.outcome, period)
+        self.num_comparisons += len(comparisons)
+        return self
+
+    def current_ranking(self):
+        order = np.argsort(-self.scores(), kind='stable')
+        return [self.entities[i] for i in order]
+
+    def _arrays(self):
+        return {f'state_{key}': value for key, value in self.state.items()}
+
+    def _restore(self, arrays):
+        self.state = {key[len('state_'):]: value for key, value in arrays.items() if key.startswith('state_')}
+
+    def save(self, path):
+        meta = {'kind': self.kind, 'config': self.config(), 'num_comparisons': self.num_comparisons}
+        np.savez(path, entities=np.array(self.entities, dtype=str), meta=np.array(json.dumps(meta)), **self._arrays())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            ranker = OnlineRanker.registry[meta['kind']](**meta['config'])
+            ranker.entities = data['entities'].tolist()
+            ranker.entity_index = {entity: idx for idx, entity in enumerate(ranker.entities)}
+            ranker.num_comparisons = meta['num_comparisons']
+            ranker._restore({key: data[key] for key in data.files})
+        return ranker
+
+
+class OnlineElo(OnlineRanker):
+    kind = 'elo'
+
+    def __init__(self, k=0.15, by_period=False):
+        self.k = k
+        super().__init__(by_period)
+
+    def config(self):
+        return {'k': self.k, 'by_period': self.by_period}
+
+    def _init_state(self, n):
+        return init_elo(n)
+
+    def _update(self, winner, loser, outcome, period):
+        update_elo(self.state, winner, loser, outcome, k=self.k, period=period)
+
+    def scores(self):
+        return self.state['rating']
+
+
+class OnlineGlicko(OnlineRanker):
+    kind = 'glicko'
+
+    def _init_state(self, n):
+        return init_glicko(n)
+
+    def _update(self, winner, loser, outcome, period):
+        update_glicko(self.state, winner, loser, outcome, period=period)
+
+    def scores(self):
+        return glicko_rating(self.state)
+
+
+class OnlineTrueSkill(OnlineRanker):
+    kind = 'trueskill'
+
+    def _init_state(self, n):
+        return init_trueskill(n)
+
+    def _update(self, winner, loser, outcome, period):
+        update_trueskill(self.state, winner, loser, outcome, period=period)
+
+    def scores(self):
+        return self.state['mu']
+
+
+class OnlineBradleyTerry(OnlineRanker):
+    '''
+        Keeps the cumulative sparse win matrix and refits after every update, warm-started from the
+        previous log-strengths (new entities start at 0). The ranking agrees with a batch fit up to
+        the solver tolerance.
+    '''
+    kind = 'bradley_terry'
+
+    def __init__(self, method='lbfgs', tol=None):
+        self.method = method
+        self.tol = tol
+        self.win_matrix = sparse.csr_matrix((0, 0))
+        super().__init__(by_period=False)
+
+    def config(self):
+        return {'method': self.method, 'tol': self.tol}
+
+    def _init_state(self, n):
+        return {'strength': np.zeros(n)}
+
+    def _update(self, winner, loser, outcome, period):
+        n = len(self.entities)
+        draw = outcome == 0.5
+        new_wins = sparse.coo_matrix(
+            (np.concatenate([outcome, outcome[draw]]),
+             (np.concatenate([winner, loser[draw]]), np.concatenate([loser, winner[draw]]))),
+            shape=(n, n),
+        )
+        self.win_matrix.resize((n, n))
+        self.win_matrix = (self.win_matrix + new_wins).tocsr()
+        res = fit_bradley_terry(self.win_matrix, method=self.method, init_params=self.state['strength'], tol=self.tol)
+        event('bradley_terry.refit', kind=self.kind, num_comparisons=self.num_comparisons, nit=res.nit, nfev=res.nfev, converged=res.success)
+        self.state['strength'] = res.x
+
+    def scores(self):
+        return self.state['strength']
+
+    def _arrays(self):
+        coo = self.win_matrix.tocoo()
+        return {**super()._arrays(), 'wins_row': coo.row, 'wins_col': coo.col, 'wins_data': coo.data}
+
+    def _restore(self, arrays):
+        super()._restore(arrays)
+        n = len(self.entities)
+        self.win_matrix = sparse.csr_matrix((arrays['wins_data'], (arrays['wins_row'], arrays['wins_col'])), shape=(n, n))
+
+
+class OnlineDecayedBradleyTerry(OnlineBradleyTerry):
+    '''
+        Bradley-Terry over a sliding window of rating periods with exponential time decay. Every
+        update() must contain whole periods (labels from ComparisonSet.period); each new period
+        advances time by one step.
+
+        half_life: periods after which a game counts half as much (None: no decay)
+        window: number of most recent periods kept (None: all)
+        prior: virtual draws of every entity against a fixed average opponent, weighted as games of
+                    the current period. Without them the maximum-likelihood strengths diverge on short
+                    windows (e.g. for unbeaten teams) and the warm-started refits would carry stale,
+                    diverged strengths forward; with them the fit has a unique optimum, so the
+                    ranking depends only on the games in the window. 0 disables the prior.
+
+        The Bradley-Terry fit does not change when all weights are scaled by a constant, so a game
+        from step t is stored with weight exp(rate * (t - base)) and decay needs no rewrite of old
+        entries; games leaving the window are subtracted, and base moves forward before the weights
+        overflow. Each update() refits once, warm-started from the previous strengths; entities
+        whose games have all left the window restart from 0.
+    '''
+    kind = 'decayed_bradley_terry'
+
+    def __init__(self, method='lbfgs', tol=None, half_life=None, window=None, prior=1.0):
+        self.half_life = half_life
+        self.window = window
+        self.prior = prior
+        self.rate = 0.0 if half_life is None else np.log(2) / half_life
+        self.step = 0
+        self.base = 0
+        self.last_period = None
+        self.history = []
+        super().__init__(method, tol)
+        self.by_period = True
+
+    def config(self):
+        return {'method': self.method, 'tol': self.tol, 'half_life': self.half_life, 'window': self.window, 'prior': self.prior}
+
+    def _add(self, rows, cols, wins, sign=1.0):
+        n = len(self.entities)
+        self.win_matrix.resize((n, n))
+        self.win_matrix = (self.win_matrix + sparse.coo_matrix((sign * wins, (rows, cols)), shape=(n, n))).tocsr()
+
+    def _update(self, winner, loser, outcome, period):
+        draw = outcome == 0.5
+        for sl in period_slices(period):
+            if self.last_period is None or period[sl.start] != self.last_period:
+                self.step += 1
+                self.last_period = period[sl.start]
+            if self.rate * (self.step - self.base) > 50:
+                scale = np.exp(-self.rate * (self.step - self.base))
+                self.win_matrix = self.win_matrix * scale
+                self.history = [(step, rows, cols, wins * scale) for step, rows, cols, wins in self.history]
+                self.base = self.step
+            w, l, s, d = winner[sl], loser[sl], outcome[sl], draw[sl]
+            rows = np.concatenate([w, l[d]])
+            cols = np.concatenate([l, w[d]])
+            wins = np.concatenate([s, s[d]]) * np.exp(self.rate * (self.step - self.base))
+            self._add(rows, cols, wins)
+            self.history.append((self.step, rows, cols, wins))
+
+        if self.window is not None:
+            while self.history and self.history[0][0] <= self.step - self.window:
+                _, rows, cols, wins = self.history.pop(0)
+                self._add(rows, cols, wins, sign=-1.0)
+            # drop the rounding residue of subtracted entries (and games decayed below 1e-9 of the newest)
+            data = self.win_matrix.data
+            data[np.abs(data) < 1e-9 * np.abs(data).max(initial=0.0)] = 0
+            self.win_matrix.eliminate_zeros()
+
+        strength = np.where(self.active(), self.state['strength'], 0.0)
+        win_matrix = self.win_matrix
+        if self.prior:
+            # the average opponent is entity n; its strength is subtracted after the fit
+            n = len(self.entities)
+            draws = np.full(n, 0.5 * self.prior * np.exp(self.rate * (self.step - self.base)))
+            win_matrix = sparse.bmat([[win_matrix, draws[:, None]], [draws[None, :], None]], format='csr')
+            strength = np.append(strength, 0.0)
+        res = fit_bradley_terry(win_matrix, method=self.method, init_params=strength, tol=self.tol)
+        event('bradley_terry.refit', kind=self.kind, num_comparisons=self.num_comparisons, nit=res.nit, nfev=res.nfev, converged=res.success)
+        self.state['strength'] = res.x[:-1] - res.x[-1] if self.prior else res.x
+
+    def active(self):
+        '''
+            Mask of the entities with at least one game in the current window.
+        '''
+        games = self.win_matrix + self.win_matrix.T
+        return np.asarray(games.sum(axis=1)).ravel() > 0
+
+    def current_ranking(self):
+        active = np.flatnonzero(self.active())
+        order = active[np.argsort(-self.scores()[active], kind='stable')]
+        return [self.entities[i] for i in order]
+
+    def _arrays(self):
+        arrays = super()._arrays()
+        if self.history:
+            arrays['history_step'] = np.concatenate([np.full(len(rows), step) for step, rows, _, _ in self.history])
+            arrays['history_row'] = np.concatenate([rows for _, rows, _, _ in self.history])
+            arrays['history_col'] = np.concatenate([cols for _, _, cols, _ in self.history])
+            arrays['history_wins'] = np.concatenate([wins for _, _, _, wins in self.history])
+        arrays['clock'] = np.array([self.step, self.base])
+        arrays['last_period'] = np.array([] if self.last_period is None else [self.last_period])
+        return arrays
+
+    def _restore(self, arrays):
+        super()._restore(arrays)
+        self.step, self.base = arrays['clock'].tolist()
+        self.last_period = arrays['last_period'][0] if len(arrays['last_period']) else None
+        self.history = []
+        if 'history_step' in arrays:
+            steps = arrays['history_step']
+            for sl in period_slices(steps):
+                self.history.append((int(steps[sl.start]), arrays['history_row'][sl], arrays['history_col'][sl], arrays['history_wins'][sl]))
+
+
+def ranking_trajectory(preference_data, ranker):
+    '''
+        Feeds the comparisons to an OnlineRanker one rating period at a time and returns a
+        DataFrame of 1-based ranks, one row per period label and one column per entity (NaN for
+        entities not ranked after that period).
+    '''
+    comparisons = as_comparisons(preference_data)
+    if comparisons.period is None:
+        raise ValueError("ranking_trajectory requires comparisons with period labels")
+    rows = {}
+    for sl in period_slices(comparisons.period):
+        ranker.update(comparisons.subset(np.arange(sl.start, sl.stop)))
+        rows[comparisons.period[sl.start]] = {entity: rank for rank, entity in enumerate(ranker.current_ranking(), 1)}
+    return pd.DataFrame.from_dict(rows, orient='index')
@@ -0,0 +1,148 @@
+'''
+    Incremental parser for rankings streamed by an LLM as JSON arrays of team names, e.g.
+
+        parser = RankingParser(teams)
+        for chunk in stream:
+            if parser.feed(chunk.text):
+                break  # every team has been ranked, the rest of the stream is not needed
+        ranking = parser.ranking(fallback=baseline_ranking)
+
+    Only string items of arrays are read, so ["A", "B"], {"ranking": ["A", "B"]} and arrays
+    embedded in other output all work, and a malformed or truncated tail costs only the names
+    it cuts off. Names are checked against the known teams as they arrive (ignoring case and
+    extra whitespace); unknown names and repeats are dropped.
+'''
+
+import json
+
+def _key(name):
+    return " ".join(str(name).split()).casefold()
+
+
+class RankingParser:
+    '''
+        teams: known team names; None accepts every string
+        stop_early: feed() reports completion as soon as one array has named every team. Without
+                    it (e.g. for chain-of-thought output, which may list candidate rankings before
+                    the final one) the last array that closes is taken as the ranking.
+    '''
+
+    def __init__(self, teams=None, stop_early=True):
+        self.teams = None if teams is None else {_key(team): team for team in teams}
+        self.stop_early = stop_early
+        self.reset()
+
+    def reset(self):
+        '''
+            Forgets everything fed so far, e.g. before a retried request is streamed again.
+        '''
+        # open containers: an insertion-ordered dict of names for arrays, None for objects
+        self._stack = []
+        self._string = None
+        self._escape = False
+        self._last = None
+        self._complete = None
+        self.unknown = []
+        self.filled = 0
+
+    @property
+    def complete(self):
+        return self._complete is not None
+
+    @property
+    def done(self):
+        return self.stop_early and self.complete
+
+    def feed(self, text):
+        '''
+            Parses the next chunk of the response and returns whether the stream can stop.
+        '''
+        i, n = 0, len(text)
+        while i < n and not self.done:
+            if self._string is not None:
+                j = i
+                while j < n:
+                    char = text[j]
+                    if self._escape:
+                        self._escape = False
+                    elif char == '\\':
+                        self._escape = True
+                    elif char == '"':
+                        break
+                    j += 1
+                self._string.append(text[i:j])
+                if j == n:
+                    break
+                self._end_string()
+                i = j + 1
+                continue
+
+            char = text[i]
+            if char == '"':
+                self._string = []
+            elif char == '[':
+                self._stack.append({})
+            elif char == '{':
+                self._stack.append(None)
+            elif char in ']}' and self._stack:
+                closed = self._stack.pop()
+                if closed:
+                    self._last = closed
+            i += 1
+        return self.done
+
+    def _end_string(self):
+        raw = "".join(self._string)
+        self._string = None
+        if not self._stack or self._stack[-1] is None:
+            return
+        try:
+            value = json.loads('"' + raw + '"')
+        except ValueError:
+            value = raw
+
+        if self.teams is None:
+            name = value
+        else:
+            name = self.teams.get(_key(value))
+            if name is None:
+                self.unknown.append(value)
+                return
+        array = self._stack[-1]
+        array[name] = None
+        if self.teams is not None and self._complete is None and len(array) == len(self.teams):
+            self._complete = array
+
+    def names(self):
+        '''
+            The best ranking read so far: the first complete array when stopping early, otherwise
+            the last closed array, or else the longest array still open (a truncated response).
+        '''
+        if self.done:
+            return list(self._complete)
+        if self._last is not None:
+            return list(self._last)
+        return list(max((array for array in self._stack if array is not None), key=len, default={}))
+
+    def ranking(self, fallback=None):
+        '''
+            The parsed ranking, followed by the teams it leaves out in the order of fallback (e.g. a
+            Bradley-Terry ranking); self.filled is set to how many were filled in this way.
+            ValueError if the response contains no usable name at all.
+        '''
+        names = self.names()
+        if not names:
+            raise ValueError("No ranking found in the model response")
+        self.filled = 0
+        if fallback is not None:
+            ranked = set(names)
+            missing = [team for team in fallback if team not in ranked]
+            self.filled = len(missing)
+            names += missing
+        return names
+
+
+def parse_ranking(text, teams=None, fallback=None, stop_early=True):
+    parser = RankingParser(teams, stop_early)
+    parser.feed(text)
+    return parser.ranking(fallback)
@@ -0,0 +1,339 @@
+'''
+    Array-native Elo, Glicko-2 and TrueSkill kernels. Ratings live in NumPy arrays indexed by
+    entity id and are grouped in a state dict so they can be extended and checkpointed.
+
+    Every update_* function takes the winner / loser / outcome columns of a ComparisonSet and
+    either replays the matches one at a time (period=None), reproducing the elo_rating, glicko2 and
+    trueskill packages, or vectorizes all matches of a rating period against the ratings at the
+    start of that period and moves sequentially from one period to the next.
+'''
+
+import math
+import numpy as np
+
+from comparisons import period_slices
+
+# Elo (elo_rating.Elo with denom=1.0, default rating 0)
+
+ELO_POINTS = 400 / math.log(10)
+
+def _touched(winner, loser):
+    '''
+        The entity ids a batch of matches involves, and winner / loser as indices into them, so that
+        sequential updates read and write O(k) ratings for k matches whatever the number of entities.
+    '''
+    ids, local = np.unique(np.concatenate([winner, loser]), return_inverse=True)
+    return ids, local[:len(winner)].tolist(), local[len(winner):].tolist()
+
+
+def init_elo(n, rating=0.0):
+    return {'rating': np.full(n, rating, dtype=float)}
+
+
+def update_elo(state, winner, loser, outcome, k=0.15, period=None):
+    ratings = state['rating']
+    n = len(ratings)
+    if period is None:
+        ids, winner, loser = _touched(winner, loser)
+        r = ratings[ids].tolist()
+        for i, j, s in zip(winner, loser, outcome.tolist()):
+            e1 = 1 / (1 + math.e ** (r[j] - r[i]))
+            e2 = 1 - e1
+            r[i] = r[i] + k * (s - e1)
+            r[j] = r[j] + k * ((1 - s) - e2)
+        ratings[ids] = r
+        return state
+
+    for sl in period_slices(period):
+        w, l, s = winner[sl], loser[sl], outcome[sl]
+        surprise = s - 1 / (1 + np.exp(ratings[l] - ratings[w]))
+        ratings += k * (np.bincount(w, surprise, minlength=n) - np.bincount(l, surprise, minlength=n))
+    return state
+
+
+def _mov_multiplier(margin, rating_gap):
+    # FiveThirtyEight's NFL multiplier, with rating gaps converted from this natural-log scale to Elo points
+    return np.log1p(np.maximum(margin, 1)) * 2.2 / (rating_gap * ELO_POINTS * 0.001 + 2.2)
+
+
+def update_elo_mov(state, winner, loser, outcome, margin, home=None, k=0.15, home_advantage=0.0, period=None):
+    '''
+        Elo with a margin-of-victory multiplier ln(margin + 1) * 2.2 / (0.001 * gap + 2.2), where
+        gap is the winner's pre-game lead in Elo points, which damps the autocorrelation of
+        favourites running up the score. Draws count as a margin of 1. With home (+1 / -1 / 0 per
+        match, see ComparisonSet.home) the home side's expected score uses its rating plus
+        home_advantage.
+    '''
+    ratings = state['rating']
+    n = len(ratings)
+    bonus = np.zeros(len(winner)) if home is None else home_advantage * np.asarray(home, dtype=float)
+    if period is None:
+        ids, local_winner, local_loser = _touched(winner, loser)
+        r = ratings[ids].tolist()
+        for i, j, s, mov, b in zip(local_winner, local_loser, outcome.tolist(), margin.tolist(), bonus.tolist()):
+            gap = r[i] + b - r[j]
+            e1 = 1 / (1 + math.e ** -gap)
+            step = k * float(_mov_multiplier(mov, gap)) * (s - e1)
+            r[i] = r[i] + step
+            r[j] = r[j] - step
+        ratings[ids] = r
+        return state
+
+    for sl in period_slices(period):
+        w, l, s = winner[sl], loser[sl], outcome[sl]
+        gap = ratings[w] + bonus[sl] - ratings[l]
+        step = k * _mov_multiplier(margin[sl], gap) * (s - 1 / (1 + np.exp(-gap)))
+        ratings += np.bincount(w, step, minlength=n) - np.bincount(l, step, minlength=n)
+    return state
+
+
+# Glicko-2 (glicko2.Player, tau = 0.5), ratings kept on the internal Glicko-2 scale
+
+GLICKO_SCALE = 173.7178
+GLICKO_TAU = 0.5
+GLICKO_EPS = 0.000001
+
+
+def init_glicko(n, rating=1500, rd=350, vol=0.06):
+    return {
+        'mu': np.full(n, (rating - 1500) / GLICKO_SCALE),
+        'phi': np.full(n, rd / GLICKO_SCALE),
+        'vol': np.full(n, vol, dtype=float),
+        'games': np.zeros(n, dtype=np.int64),
+    }
+
+
+def glicko_rating(state):
+    return state['mu'] * GLICKO_SCALE + 1500
+
+
+def _glicko_vol(mu, phi, vol, delta, v):
+    # glicko2.Player._newVol, including its use of the rating (not the deviation) inside f
+    a = math.log(vol ** 2)
+    tau = GLICKO_TAU
+
+    def f(x):
+        ex = math.exp(x)
+        return (ex * (delta ** 2 - mu ** 2 - v - ex)) / (2 * ((mu ** 2 + v + ex) ** 2)) - ((x - a) / (tau ** 2))
+
+    A = a
+    if (delta ** 2) > ((phi ** 2) + v):
+        B = math.log(delta ** 2 - phi ** 2 - v)
+    else:
+        k = 1
+        while f(a - k * math.sqrt(tau ** 2)) < 0:
+            k = k + 1
+        B = a - k * math.sqrt(tau ** 2)
+    fA, fB = f(A), f(B)
+    while math.fabs(B - A) > GLICKO_EPS:
+        C = A + ((A - B) * fA) / (fB - fA)
+        fC = f(C)
+        if fC * fB <= 0:
+            A, fA = B, fB
+        else:
+            fA = fA / 2.0
+        B, fB = C, fC
+    return math.exp(A / 2)
+
+
+def _glicko_update_player(mu, phi, vol, opp_mu, opp_phi, score):
+    g = 1 / math.sqrt(1 + 3 * math.pow(opp_phi, 2) / math.pow(math.pi, 2))
+    E = 1 / (1 + math.exp(-1 * g * (mu - opp_mu)))
+    v = 1 / (math.pow(g, 2) * E * (1 - E))
+    temp = g * (score - E)
+    vol = _glicko_vol(mu, phi, vol, v * temp, v)
+    phi = math.sqrt(math.pow(phi, 2) + math.pow(vol, 2))
+    phi = 1 / math.sqrt((1 / math.pow(phi, 2)) + (1 / v))
+    mu += math.pow(phi, 2) * temp
+    return mu, phi, vol
+
+
+def _glicko_vol_batch(mu, phi, vol, delta, v):
+    a = np.log(vol ** 2)
+    tau = GLICKO_TAU
+
+    def f(x):
+        ex = np.exp(x)
+        return (ex * (delta ** 2 - mu ** 2 - v - ex)) / (2 * ((mu ** 2 + v + ex) ** 2)) - ((x - a) / (tau ** 2))
+
+    A = a.copy()
+    big = delta ** 2 > phi ** 2 + v
+    B = np.where(big, np.log(np.where(big, delta ** 2 - phi ** 2 - v, 1.0)), a - tau)
+    k = np.ones_like(a)
+    pending = ~big & (f(B) < 0)
+    while pending.any():
+        k[pending] += 1
+        B[pending] = a[pending] - k[pending] * tau
+        pending &= f(B) < 0
+    fA, fB = f(A), f(B)
+    active = np.abs(B - A) > GLICKO_EPS
+    while active.any():
+        C = np.where(active, A + ((A - B) * fA) / np.where(active, fB - fA, 1.0), B)
+        fC = np.where(active, f(C), fB)
+        swap = active & (fC * fB <= 0)
+        halve = active & ~swap
+        A, fA = np.where(swap, B, A), np.where(swap, fB, np.where(halve, fA / 2.0, fA))
+        B, fB = np.where(active, C, B), np.where(active, fC, fB)
+        active &= np.abs(B - A) > GLICKO_EPS
+    return np.exp(A / 2)
+
+
+def update_glicko(state, winner, loser, outcome, period=None):
+    '''
+        Sequential mode feeds every match to both players as its own one-game update, as the
+        baseline did with glicko2.Player. Period mode is the Glicko-2 rating period: each player is
+        updated once against all opponents faced in the period, and players who sat the period out
+        after their first game have their deviation inflated by their volatility.
+    '''
+    games = state['games']
+    if period is None:
+        np.add.at(games, winner, 1)
+        np.add.at(games, loser, 1)
+        ids, winner, loser = _touched(winner, loser)
+        mu, phi, vol = state['mu'][ids].tolist(), state['phi'][ids].tolist(), state['vol'][ids].tolist()
+        for i, j, s in zip(winner, loser, outcome.tolist()):
+            # opponents go through the same rating <-> internal-scale round trip as glicko2.Player
+            opp_mu = ((mu[j] * GLICKO_SCALE + 1500) - 1500) / GLICKO_SCALE
+            opp_phi = (phi[j] * GLICKO_SCALE) / GLICKO_SCALE
+            mu[i], phi[i], vol[i] = _glicko_update_player(mu[i], phi[i], vol[i], opp_mu, opp_phi, s)
+            opp_mu = ((mu[i] * GLICKO_SCALE + 1500) - 1500) / GLICKO_SCALE
+            opp_phi = (phi[i] * GLICKO_SCALE) / GLICKO_SCALE
+            mu[j], phi[j], vol[j] = _glicko_update_player(mu[j], phi[j], vol[j], opp_mu, opp_phi, 1 - s)
+        state['mu'][ids], state['phi'][ids], state['vol'][ids] = mu, phi, vol
+        return state
+
+    games_before = games.copy()
+    games += np.bincount(winner, minlength=len(games)) + np.bincount(loser, minlength=len(games))
+    mu, phi, vol = state['mu'], state['phi'], state['vol']
+    n = len(mu)
+    for sl in period_slices(period):
+        # every match contributes one game record to each side
+        player = np.concatenate([winner[sl], loser[sl]])
+        opponent = np.concatenate([loser[sl], winner[sl]])
+        score = np.concatenate([outcome[sl], 1 - outcome[sl]])
+
+        g = 1 / np.sqrt(1 + 3 * phi[opponent] ** 2 / np.pi ** 2)
+        E = 1 / (1 + np.exp(-g * (mu[player] - mu[opponent])))
+        info = np.bincount(player, g ** 2 * E * (1 - E), minlength=n)
+        temp = np.bincount(player, g * (score - E), minlength=n)
+
+        played = info > 0
+        idle = ~played & (games_before > 0)
+        games_before += np.bincount(player, minlength=n)
+        v = 1 / info[played]
+        new_vol = _glicko_vol_batch(mu[played], phi[played], vol[played], v * temp[played], v)
+        pre_phi = np.sqrt(phi[played] ** 2 + new_vol ** 2)
+        new_phi = 1 / np.sqrt(1 / pre_phi ** 2 + 1 / v)
+
+        phi[idle] = np.sqrt(phi[idle] ** 2 + vol[idle] ** 2)
+        mu[played] += new_phi ** 2 * temp[played]
+        phi[played] = new_phi
+        vol[played] = new_vol
+    return state
+
+
+# TrueSkill (trueskill global environment defaults), using the package's own erfc approximation
+
+TRUESKILL_MU = 25.
+TRUESKILL_SIGMA = TRUESKILL_MU / 3
+TRUESKILL_BETA = TRUESKILL_SIGMA / 2
+TRUESKILL_TAU = TRUESKILL_SIGMA / 100
+TRUESKILL_DRAW_PROBABILITY = .10
+
+
+def _erfc(x):
+    z = np.abs(x)
+    t = 1. / (1. + z / 2.)
+    r = t * np.exp(-z * z - 1.26551223 + t * (1.00002368 + t * (
+        0.37409196 + t * (0.09678418 + t * (-0.18628806 + t * (
+            0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (
+                -0.82215223 + t * 0.17087277
+            )))
+        )))
+    )))
+    return np.where(x < 0, 2. - r, r)
+
+
+def _cdf(x):
+    return 0.5 * _erfc(-x / math.sqrt(2))
+
+
+def _pdf(x):
+    return 1 / math.sqrt(2 * math.pi) * np.exp(-(x ** 2 / 2))
+
+
+def _ppf(p):
+    # trueskill.backends erfcinv: rational initial guess refined by two Newton steps
+    y = 2 * p
+    zero_point = y < 1
+    if not zero_point:
+        y = 2 - y
+    t = math.sqrt(-2 * math.log(y / 2.))
+    x = -0.70711 * ((2.30753 + t * 0.27061) / (1. + t * (0.99229 + t * 0.04481)) - t)
+    for _ in range(2):
+        err = float(_erfc(x)) - y
+        x += err / (1.12837916709551257 * math.exp(-(x ** 2)) - x * err)
+    return -math.sqrt(2) * (x if zero_point else -x)
+
+
+TRUESKILL_DRAW_MARGIN = _ppf((TRUESKILL_DRAW_PROBABILITY + 1) / 2.) * math.sqrt(2) * TRUESKILL_BETA
+
+
+def init_trueskill(n, mu=TRUESKILL_MU, sigma=TRUESKILL_SIGMA):
+    return {'mu': np.full(n, mu, dtype=float), 'sigma': np.full(n, sigma, dtype=float)}
+
+
+def _trueskill_vw(diff, margin, draw):
+    '''
+        V and W truncation functions of trueskill.TrueSkill for standardized mean differences.
+    '''
+    x = diff - margin
+    denom = _cdf(x)
+    safe = denom > 0
+    v_win = np.where(safe, _pdf(x) / np.where(safe, denom, 1.0), -x)
+    w_win = v_win * (v_win + x)
+
+    abs_diff = np.abs(diff)
+    a, b = margin - abs_diff, -margin - abs_diff
+    denom = _cdf(a) - _cdf(b)
+    safe = denom > 0
+    v_abs = np.where(safe, (_pdf(b) - _pdf(a)) / np.where(safe, denom, 1.0), a)
+    v_draw = v_abs * np.where(diff < 0, -1, 1)
+    w_draw = v_abs ** 2 + (a * _pdf(a) - b * _pdf(b)) / np.where(safe, denom, 1.0)
+
+    return np.where(draw, v_draw, v_win), np.where(draw, w_draw, w_win)
+
+
+def update_trueskill(state, winner, loser, outcome, period=None):
+    '''
+        Sequential mode matches trueskill.rate_1vs1 match by match. Period mode rates every match of
+        a period against the ratings at its start, adds the dynamics factor once per active player
+        and combines a player's mean shifts additively and variance shrinkage multiplicatively.
+    '''
+    mu, sigma = state['mu'], state['sigma']
+    n = len(mu)
+    if period is None:
+        for i, j, s in zip(winner.tolist(), loser.tolist(), outcome.tolist()):
+            var_i, var_j = sigma[i] ** 2 + TRUESKILL_TAU ** 2, sigma[j] ** 2 + TRUESKILL_TAU ** 2
+            c = math.sqrt(2 * TRUESKILL_BETA ** 2 + var_i + var_j)
+            v, wf = _trueskill_vw((mu[i] - mu[j]) / c, TRUESKILL_DRAW_MARGIN / c, s == 0.5)
+            mu[i] += var_i / c * v
+            mu[j] -= var_j / c * v
+            sigma[i] = math.sqrt(var_i * (1 - var_i / c ** 2 * wf))
+            sigma[j] = math.sqrt(var_j * (1 - var_j / c ** 2 * wf))
+        return state
+
+    for sl in period_slices(period):
+        w, l, draw = winner[sl], loser[sl], outcome[sl] == 0.5
+        active = np.zeros(n, dtype=bool)
+        active[w] = active[l] = True
+        var = np.where(active, sigma ** 2 + TRUESKILL_TAU ** 2, sigma ** 2)
+
+        c = np.sqrt(2 * TRUESKILL_BETA ** 2 + var[w] + var[l])
+        v, wf = _trueskill_vw((mu[w] - mu[l]) / c, TRUESKILL_DRAW_MARGIN / c, draw)
+
+        mu += np.bincount(w, var[w] / c * v, minlength=n) - np.bincount(l, var[l] / c * v, minlength=n)
+        shrink = np.bincount(w, np.log(1 - var[w] / c ** 2 * wf), minlength=n) \
+            + np.bincount(l, np.log(1 - var[l] / c ** 2 * wf), minlength=n)
+        sigma[:] = np.sqrt(var * np.exp(shrink))
+    return state
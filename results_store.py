@@ -0,0 +1,250 @@
+'''
+    Append-only store of evaluation results in a SQLite file, e.g.
+
+        store = ResultsStore("results.sqlite")
+        store.log_run("nfl-2020", "elo", metrics, params={"k": 0.15}, seed=42)
+        store.export_csv("results.csv")
+
+    Every run adds one row to `runs` (dataset, season, method, column, hyperparameters, seed,
+    code version) and one row per metric to `metrics`; nothing is updated in place, so repeated
+    runs and their p-values are all kept. The database is in WAL mode, so concurrent runs can log
+    while others read, and each run is a single short transaction instead of a rewrite of the
+    whole results table. The wide results.csv is a view of the store: per (dataset, column,
+    metric) the latest value, as merge_results used to keep it.
+
+        python results_store.py import results.csv    # log an existing wide CSV
+        python results_store.py export results.csv    # write the wide CSV from the store
+'''
+
+import argparse
+import json
+import math
+import os
+import sqlite3
+import stat
+import subprocess
+import tempfile
+import threading
+import time
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS runs ("
+    "id INTEGER PRIMARY KEY, created REAL NOT NULL, dataset TEXT NOT NULL, season INTEGER, "
+    "method TEXT NOT NULL, column_name TEXT NOT NULL, params TEXT NOT NULL, seed INTEGER, code_version TEXT)",
+    "CREATE TABLE IF NOT EXISTS metrics ("
+    "run_id INTEGER NOT NULL REFERENCES runs (id), metric TEXT NOT NULL, value REAL, PRIMARY KEY (run_id, metric))",
+    "CREATE INDEX IF NOT EXISTS runs_dataset_method ON runs (dataset, method)",
+    "CREATE INDEX IF NOT EXISTS runs_column ON runs (column_name, dataset)",
+    "CREATE INDEX IF NOT EXISTS runs_code_version ON runs (code_version)",
+    "CREATE INDEX IF NOT EXISTS metrics_metric ON metrics (metric, value)",
+)
+
+RUN_FIELDS = ("dataset", "season", "method", "column_name", "seed", "code_version")
+
+
+def code_version():
+    '''
+        `git describe --always --dirty` of the working tree, or None outside a git checkout.
+    '''
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def dataset_season(dataset):
+    '''
+        2020 for "nfl-2020"; None for datasets that are not a single season.
+    '''
+    suffix = dataset.rsplit("-", 1)[-1]
+    return int(suffix) if dataset.startswith("nfl") and suffix.isdigit() else None
+
+
+def _line_terminator(csv_path, default="\r\n"):
+    try:
+        with open(csv_path, "rb") as f:
+            line = f.readline()
+    except FileNotFoundError:
+        return default
+    return "\r\n" if line.endswith(b"\r\n") else "\n" if line.endswith(b"\n") else default
+
+
+def _file_mode(path):
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+class ResultsStore:
+    '''
+        path: SQLite file; ":memory:" for a throwaway store
+        code_version: recorded with every run; by default read from git once per store
+    '''
+
+    def __init__(self, path="results.sqlite", code_version=code_version):
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._code_version = code_version
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+
+    @property
+    def code_version(self):
+        if callable(self._code_version):
+            self._code_version = self._code_version()
+        return self._code_version
+
+    def log_run(self, dataset, method, metrics, params=None, seed=None, column=None, created=None):
+        '''
+            Appends one run and its {metric: value} results and returns the run id.
+            column: name of the run in the wide table (default: method), e.g. sweep.column_name
+        '''
+        params = json.dumps(params or {}, sort_keys=True, default=str)
+        values = [
+            (metric, float(value)) for metric, value in metrics.items()
+            if value is not None and not math.isnan(float(value))
+        ]
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (created, dataset, season, method, column_name, params, seed, code_version) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time() if created is None else created, dataset, dataset_season(dataset), method,
+                 column or method, params, seed, self.code_version),
+            )
+            run_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO metrics (run_id, metric, value) VALUES (?, ?, ?)",
+                [(run_id, metric, value) for metric, value in values],
+            )
+        return run_id
+
+    def query(self, metric=None, **filters):
+        '''
+            Long table (pandas DataFrame) of run and metric rows in logging order, filtered by equality
+            on metric and any of dataset, season, method, column_name, seed, code_version.
+        '''
+        import pandas as pd
+
+        unknown = set(filters) - set(RUN_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown filters: {sorted(unknown)}")
+        # None matches NULL (e.g. season=None for datasets that are not a single season)
+        conditions = [f"runs.{field} IS NULL" if value is None else f"runs.{field} = ?" for field, value in filters.items()]
+        args = [value for value in filters.values() if value is not None]
+        if metric is not None:
+            conditions.append("metrics.metric = ?")
+            args.append(metric)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT runs.id AS run_id, runs.created, runs.dataset, runs.season, runs.method, runs.column_name, "
+                "runs.params, runs.seed, runs.code_version, metrics.metric, metrics.value "
+                f"FROM runs JOIN metrics ON metrics.run_id = runs.id {where}ORDER BY runs.id, metrics.rowid",
+                args,
+            )
+            columns = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+        return pd.DataFrame(rows, columns=columns)
+
+    def pivot(self, **filters):
+        '''
+            The wide results table: rows (dataset, metric) and one column per run column name, in order
+            of first appearance, holding the latest value logged for each cell.
+        '''
+        import pandas as pd
+
+        logged = self.query(**filters)
+        index = pd.MultiIndex.from_frame(logged[["dataset", "metric"]].drop_duplicates())
+        columns = list(dict.fromkeys(logged["column_name"]))
+        long = logged.drop_duplicates(["dataset", "metric", "column_name"], keep="last")
+        wide = long.pivot(index=["dataset", "metric"], columns="column_name", values="value")
+        wide = wide.reindex(index=index, columns=columns)
+        wide.columns.name = None
+        return wide
+
+    def export_csv(self, csv_path, lineterminator=None, **filters):
+        '''
+            Writes pivot() to csv_path through a temporary file in the same directory, so readers
+            never see a partial file. The store's write lock is held from the snapshot until the file
+            is replaced, so concurrent exports (and runs logged meanwhile) are serialised and an
+            older snapshot cannot overwrite a newer one.
+            lineterminator: default: that of the existing file, or "\r\n" as in the tracked results.csv
+        '''
+        if lineterminator is None:
+            lineterminator = _line_terminator(csv_path)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                wide = self.pivot(**filters)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(csv_path)), suffix=".csv.tmp")
+                try:
+                    with os.fdopen(fd, "w", newline="") as f:
+                        wide.to_csv(f, lineterminator=lineterminator)
+                    # mkstemp creates the file as 0600; keep the mode results.csv had, or the umask default
+                    os.chmod(tmp_path, _file_mode(csv_path))
+                    os.replace(tmp_path, csv_path)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+            finally:
+                # nothing was written; ending the transaction releases the lock
+                self._conn.rollback()
+        return wide
+
+    def import_csv(self, csv_path):
+        '''
+            Logs every (dataset, column) of a wide results CSV as one run without hyperparameters,
+            e.g. to carry results.csv over into the store. Returns the number of runs logged.
+        '''
+        import pandas as pd
+
+        wide = pd.read_csv(csv_path, header=[0], index_col=[0, 1], float_precision="round_trip")
+        count = 0
+        for dataset in wide.index.get_level_values(0).unique():
+            for column in wide.columns:
+                metrics = wide.loc[dataset, column].dropna()
+                if len(metrics):
+                    self.log_run(dataset, column, metrics.to_dict(), column=column)
+                    count += 1
+        return count
+
+    def import_if_empty(self, csv_path):
+        '''
+            Imports csv_path into a store without runs, so that exporting to csv_path afterwards
+            keeps the results it already holds. Returns the number of runs imported.
+        '''
+        with self._lock:
+            empty = self._conn.execute("SELECT NOT EXISTS (SELECT 1 FROM runs)").fetchone()[0]
+        if not empty or not os.path.exists(csv_path):
+            return 0
+        return self.import_csv(csv_path)
+
+    def close(self):
+        self._conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import into or export from the results store")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("csv_path", nargs="?", default="results.csv")
+    parser.add_argument("--db_path", type=str, default="results.sqlite")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db_path)
+    if args.action == "import":
+        print(f"{store.import_csv(args.csv_path)} runs imported from {args.csv_path} into {args.db_path}")
+    else:
+        wide = store.export_csv(args.csv_path)
+        print(f"{wide.shape[0]} rows x {wide.shape[1]} columns written to {args.csv_path}")
@@ -1,94 +1,220 @@
 import argparse
+import importlib
 import json
-import numpy as np
 import os
-import pandas as pd
 import random
+import re
+import subprocess
+import sys
+import time
 
-
-from collections import defaultdict
-from datasets import load_dataset
 from dotenv import load_dotenv
-from huggingface_hub import login 
 
-from baseline import rank_using_trueskill, rank_using_elo, rank_using_glicko, rank_using_bradley_terry
-from aggregation_mechanisms import rank_using_direct_prompt, rank_using_self_consistency, rank_using_cot
-from utils import process_icc_dataset, process_nfl_dataset, evaluate_ranking
+from instrumentation import PROFILERS, Recorder, recording, span
+from results_store import ResultsStore
+from utils import load_icc_dataset, load_nfl_games, nfl_season, evaluate_ranking, format_preference_data
+
+SEED = 42
+
+# method -> "module:function"; the module (and with it the method's dependencies, e.g. google.genai
+# for the LLM methods) is imported only when the method is run
+BASELINE_METHODS = {
+    "trueskill": "baseline:rank_using_trueskill",
+    "elo": "baseline:rank_using_elo",
+    "glicko": "baseline:rank_using_glicko",
+    "bradley_terry": "baseline:rank_using_bradley_terry",
+    "rank_centrality": "baseline:rank_using_rank_centrality",
+    "pagerank": "baseline:rank_using_pagerank",
+    "keener": "baseline:rank_using_keener",
+    "massey": "baseline:rank_using_massey",
+    "colley": "baseline:rank_using_colley",
+    "bradley_terry_home": "baseline:rank_using_bradley_terry_home",
+    "elo_mov": "baseline:rank_using_elo_mov",
+    "massey_margin": "baseline:rank_using_massey_margin",
+}
+LLM_METHODS = {
+    "direct_prompt": "aggregation_mechanisms:rank_using_direct_prompt",
+    "self_consistency": "aggregation_mechanisms:rank_using_self_consistency",
+    "chain_of_thought": "aggregation_mechanisms:rank_using_cot",
+    "hierarchical": "aggregation_mechanisms:rank_using_hierarchical",
+    "hybrid": "aggregation_mechanisms:rank_using_hybrid",
+}
+
+def load_method(method):
+    module, function = {**BASELINE_METHODS, **LLM_METHODS}[method].split(":")
+    return getattr(importlib.import_module(module), function)
 
 parser = argparse.ArgumentParser(description="Run Rank Aggregation")
-parser.add_argument("--method", type=str, choices=["direct_prompt", "trueskill", "elo", "glicko", "bradley_terry", "self_consistency", "chain_of_thought"])
-parser.add_argument("--csv_path", type=str, default="results.csv")
+parser.add_argument("--method", type=str, choices=list(BASELINE_METHODS) + list(LLM_METHODS))
+parser.add_argument("--db_path", type=str, default="results.sqlite", help="results store every run is appended to")
+parser.add_argument("--csv_path", type=str, default="results.csv", help="wide results table exported after the run ('' to skip)")
 parser.add_argument("--dataset", type=str, required=True)
+parser.add_argument("--cache_path", type=str, default=".cache/llm_responses.sqlite", help="LLM response cache")
+parser.add_argument("--no_cache", action="store_true", help="always query the LLM, bypassing the response cache")
+parser.add_argument("--k", type=float, default=0.15, help="elo: update step")
+parser.add_argument("--num_samples", type=int, default=10, help="self-consistency: samples to aggregate")
+parser.add_argument("--max_concurrency", type=int, default=4, help="self-consistency samples requested in parallel")
+parser.add_argument("--quorum", type=int, default=None, help="stop self-consistency once this many samples agree")
+parser.add_argument("--quorum_top_k", type=int, default=3,
+                    help="self-consistency: samples agree when their top k teams match in order (0: whole ranking)")
+parser.add_argument("--prompt_format", type=str, default="raw", choices=["raw", "compact", "auto"],
+                    help="LLM input: one line per match, a head-to-head table, or the table once the lines exceed --token_budget")
+parser.add_argument("--token_budget", type=int, default=2000)
+parser.add_argument("--group_size", type=int, default=8, help="hierarchical: teams per first-round prompt")
+parser.add_argument("--window", type=int, default=8, help="hierarchical: teams per merge-round prompt; hybrid: teams per prompt")
+parser.add_argument("--merge_passes", type=int, default=2, help="hierarchical: sliding-window merge rounds")
+parser.add_argument("--groups", type=str, default=None,
+                    help="hierarchical: JSON file with a list of lists of team names ranked by the first-round prompts "
+                         "(e.g. divisions); default: clusters of at most --group_size teams")
+parser.add_argument("--hybrid_model", type=str, default="bradley_terry", choices=["bradley_terry", "glicko"],
+                    help="hybrid: statistical model whose uncertain adjacent pairs are sent to the LLM")
+parser.add_argument("--threshold", type=float, default=1.0, help="hybrid: pairs closer than this many standard errors are ambiguous")
+parser.add_argument("--max_queries", type=int, default=None, help="hybrid: at most this many LLM prompts")
+parser.add_argument("--consensus", type=str, default="borda", choices=["borda", "copeland", "markov_chain", "kemeny"])
+parser.add_argument("--metrics_path", type=str, default="metrics.jsonl",
+                    help="timings, optimizer iterations and LLM latencies are appended here as JSON lines")
+parser.add_argument("--trace_memory", action="store_true", help="record peak memory with tracemalloc (slower)")
+parser.add_argument("--profile", type=str, default=None, choices=PROFILERS, help="profile the method and save the profile")
+parser.add_argument("--profile_dir", type=str, default=".profiles")
+parser.add_argument("--profile_startup", "--profile-startup", action="store_true",
+                    help="time the imports of this script and of --method under -X importtime, without running it")
+
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def profile_startup(method=None, top=15):
+    '''
+        Imports this script and the module behind method under `python -X importtime` in a fresh
+        interpreter and prints the top-level imports by cumulative time, so slow-starting dependencies
+        show up without an external profiler. Only the imports run: no data is loaded, no LLM is
+        queried and nothing is written to the results store.
+    '''
+    code = "import run" if method is None else f"import run; run.load_method({method!r})"
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], stderr=subprocess.PIPE, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    wall = time.perf_counter() - start
+
+    cumulative = {}
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match is None:
+            if not line.startswith("import time:"):
+                print(line, file=sys.stderr)
+        elif len(match.group(3)) == 1:
+            # one space of indentation: imported directly by a script or by the interpreter itself
+            module = match.group(4)
+            cumulative[module] = cumulative.get(module, 0) + int(match.group(2))
+
+    print(f"\nimport time: {sum(cumulative.values()) / 1e6:.3f}s of {wall:.3f}s wall")
+    for module, microseconds in sorted(cumulative.items(), key=lambda item: -item[1])[:top]:
+        print(f"{microseconds / 1e6:9.3f}s  {module}")
+    return process.returncode
+
+def load_preference_data(dataset_name):
+    '''
+        Returns (preference_data, team_identifier, gold_rankings) for "icc-2023-2025" or "nfl-<season>".
+    '''
+    if dataset_name == "icc-2023-2025":
+        # downloaded once, then read from the local cache without logging in to Hugging Face
+        def download():
+            from datasets import load_dataset
+            from huggingface_hub import login
+
+            load_dotenv()
+            login(os.getenv("HF_TOKEN"))
+            dataset = load_dataset("konan-kun/icc-test-championship-rankings-2023-2025-cycle")
+            return dataset['train'].to_pandas()
+
+        return load_icc_dataset(download)
+    elif dataset_name.startswith("nfl"):
+        season = int(dataset_name.split("-")[-1])
+        preference_data, team_identifier, _ = nfl_season(load_nfl_games(), season)
+        names = json.load(open("./data/names.json", "r"))
+        # later seasons of ranks.json list abbreviations rather than names
+        gold_rankings = [names.get(team, team) for team in json.load(open("./data/ranks.json", "r"))[str(season)]]
+        return preference_data, team_identifier, gold_rankings
+    raise ValueError(f"Unknown dataset: {dataset_name}")
+
+def run_method(method, preference_data, team_identifier, cache=None, prompt_format="raw", token_budget=2000, **params):
+    '''
+        Predicted ranking of one method. params are passed on to its rank_using_* function, e.g.
+        k for elo or num_samples / consensus for self_consistency. The run is recorded as a
+        "method" span (see instrumentation.py) and profiled when the active recorder has a profiler.
+    '''
+    ranker = load_method(method)
+    with span("method", profile=True, method=method, params=dict(params)):
+        if method in BASELINE_METHODS:
+            return ranker(preference_data, **params)
+        if method in ("hierarchical", "hybrid"):
+            return ranker(preference_data, cache=cache, prompt_format=prompt_format, token_budget=token_budget, **params)
+
+        formatted_preference_data = format_preference_data(preference_data, prompt_format, token_budget)
+        # sorted, since team_identifier follows the gold ranking for some datasets (e.g. ICC)
+        params.setdefault("teams", sorted(team_identifier))
+        # teams a response leaves out are filled in from Bradley-Terry, which takes milliseconds
+        params.setdefault("fallback", load_method("bradley_terry")(preference_data))
+        return ranker(formatted_preference_data, cache=cache, **params)
 
 if __name__ == "__main__":
     args = parser.parse_args()
-    
-    # set up 
+
+    if args.profile_startup:
+        sys.exit(profile_startup(args.method))
+
+    # set up
     load_dotenv()
-    token = os.getenv("HF_TOKEN")
-    login(token)
-
-    random.seed(42)
-    
-    if args.dataset == "icc-2023-2025":
-        dataset_name = "icc-test-championship-rankings-2023-2025-cycle"
-        dataset = load_dataset("konan-kun/" + dataset_name)
-        dataset = dataset['train'].to_pandas()
-
-        preference_data, team_identifier, gold_rankings = process_icc_dataset(dataset)
-    elif args.dataset.startswith("nfl"):
-        season = int(args.dataset.split("-")[-1])
-        dataset = pd.read_csv("./data/nfl_mahomes_era_games.csv")
-        names = json.load(open("./data/names.json", "r"))
-        dataset["home_team"] = dataset["home_team"].map(names)
-        dataset["away_team"] = dataset["away_team"].map(names)
-    
-        preference_data, team_identifier, _ = process_nfl_dataset(dataset, season)
-        print(team_identifier, preference_data)
-        # names = json.load(open("./data/names.json", "r"))
-        # gold_rankings = [names[id] for id in json.load(open("./data/ranks.json", "r"))[str(season)]]
-        gold_rankings = json.load(open("./data/ranks.json", "r"))[str(season)]
-        print(gold_rankings)
-        exit()
-        
-    # perform rank aggregation 
-    if args.method == "trueskill":
-        predicted_rankings = rank_using_trueskill(preference_data)
-    if args.method == "elo":
-        predicted_rankings = rank_using_elo(preference_data)
-    if args.method == "glicko":
-        predicted_rankings = rank_using_glicko(preference_data)
-    if args.method == "bradley_terry":
-        predicted_rankings = rank_using_bradley_terry(preference_data)
-    elif args.method == "direct_prompt":
-        llm_preference_data = [f"{tup[0]} vs {tup[1]}, {tup[int(tup[2] == 'L')] + ' won' if tup[2] != 'D' else 'Match Drawn'}" for tup in preference_data]
-        formatted_preference_data = '\n'.join(llm_preference_data)
-        print(formatted_preference_data)
-        predicted_rankings = rank_using_direct_prompt(formatted_preference_data)
-    elif args.method == "self_consistency":
-        llm_preference_data = [f"{tup[0]} vs {tup[1]}, {tup[int(tup[2] == 'L')] + ' won' if tup[2] != 'D' else 'Match Drawn'}" for tup in preference_data]
-        formatted_preference_data = '\n'.join(llm_preference_data)
-        predicted_rankings = rank_using_self_consistency(formatted_preference_data, num_samples=10)
-    elif args.method == "chain_of_thought":
-        llm_preference_data = [f"{tup[0]} vs {tup[1]}, {tup[int(tup[2] == 'L')] + ' won' if tup[2] != 'D' else 'Match Drawn'}" for tup in preference_data]       
-        formatted_preference_data = '\n'.join(llm_preference_data)
-        predicted_rankings = rank_using_cot(formatted_preference_data)
-        
-    print(team_identifier)
-    gold_list = [team_identifier[team] for team in gold_rankings]
-    predicted_list = [team_identifier[team] for team in predicted_rankings]
-    results = evaluate_ranking(gold_list, predicted_list)
-
-    metrics = list(results.keys())
-    values = list(results.values())
-    index = pd.MultiIndex.from_tuples([(args.dataset, metric) for metric in metrics], names=["dataset", "metric"])
-    df = pd.DataFrame({args.method: values}, index=index)
-
-    try:
-        existing_df = pd.read_csv(args.csv_path, header=[0], index_col=[0, 1])
-        print(args.method, df[args.method])
-        existing_df[args.method] = df[args.method]
-        existing_df.to_csv(args.csv_path)
-    except FileNotFoundError:
-        df.to_csv(args.csv_path)
-    
\ No newline at end of file
+
+    random.seed(SEED)
+
+    recorder = Recorder(
+        trace_memory=args.trace_memory, profiler=args.profile, profile_dir=args.profile_dir,
+        dataset=args.dataset, method=args.method,
+    )
+    with recording(recorder):
+        with span("load_preference_data"):
+            preference_data, team_identifier, gold_rankings = load_preference_data(args.dataset)
+
+        cache = None
+        if args.method in LLM_METHODS and not args.no_cache:
+            from llm_cache import ResponseCache
+            cache = ResponseCache(args.cache_path)
+
+        # perform rank aggregation
+        params = {
+            "elo": {"k": args.k},
+            "self_consistency": {
+                "num_samples": args.num_samples, "max_concurrency": args.max_concurrency, "quorum": args.quorum,
+                "quorum_top_k": args.quorum_top_k or None,
+                "consensus": args.consensus,
+            },
+            "hierarchical": {
+                "groups": json.load(open(args.groups, "r")) if args.groups else None, "group_size": args.group_size,
+                "window": args.window, "merge_passes": args.merge_passes, "max_concurrency": args.max_concurrency,
+            },
+            "hybrid": {
+                "model": args.hybrid_model, "threshold": args.threshold, "window": args.window,
+                "max_queries": args.max_queries, "max_concurrency": args.max_concurrency,
+            },
+        }.get(args.method, {})
+        predicted_rankings = run_method(
+            args.method, preference_data, team_identifier, cache=cache, prompt_format=args.prompt_format,
+            token_budget=args.token_budget, **params,
+        )
+
+        if cache is not None and cache.hits + cache.misses > 0:
+            print("LLM cache:", cache.stats())
+
+        print(team_identifier)
+        # names the model invents or repeats are ignored rather than raising a KeyError
+        results = evaluate_ranking(gold_rankings, predicted_rankings)
+
+    print(args.method, results)
+    store = ResultsStore(args.db_path)
+    if args.csv_path:
+        store.import_if_empty(args.csv_path)
+    if args.method in LLM_METHODS:
+        params = {**params, "prompt_format": args.prompt_format, "token_budget": args.token_budget}
+    store.log_run(args.dataset, args.method, results, params=params, seed=SEED)
+    if args.csv_path:
+        store.export_csv(args.csv_path)
+    print(f"{recorder.write(args.metrics_path)} measurements appended to {args.metrics_path}")
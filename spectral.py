@@ -0,0 +1,146 @@
+'''
+    Linear-algebra ratings computed from a sparse n x n win matrix W, W[i, j] = wins of i over j
+    (draws as 0.5 each way, see ComparisonSet.win_matrix). Every method costs a few sparse
+    matrix-vector products per iteration, i.e. O(number of compared pairs).
+'''
+
+import numpy as np
+
+from scipy import sparse
+from scipy.sparse.linalg import cg, lsqr
+
+def _power_iteration(P, tol=1e-12, max_iter=10000):
+    '''
+        Normalized left Perron vector x ~ x @ P of a nonnegative sparse P (the stationary
+        distribution when P is row-stochastic), started from the uniform vector.
+    '''
+    n = P.shape[0]
+    x = np.full(n, 1 / n)
+    PT = P.T.tocsr()
+    for _ in range(max_iter):
+        new_x = PT @ x
+        new_x /= new_x.sum()
+        if np.abs(new_x - x).sum() < tol:
+            return new_x
+        x = new_x
+    return x
+
+
+def _games(W):
+    '''
+        Symmetric matrix of games played per pair and the number of games per entity.
+    '''
+    N = (W + W.T).tocsr()
+    N.setdiag(0)
+    N.eliminate_zeros()
+    return N, np.asarray(N.sum(axis=1)).ravel()
+
+
+def rank_centrality_scores(W, reg=1.0, tol=1e-12, max_iter=10000):
+    '''
+        Stationary distribution of the Rank Centrality chain of Negahban et al. (2017): from i, move
+        to a compared opponent j with probability proportional to the fraction of their games j
+        won, scaled by 1 / max degree. reg adds that many pseudo-wins each way to every compared
+        pair, which keeps undefeated and winless entities from absorbing the chain.
+    '''
+    W = sparse.csr_matrix(W, dtype=float)
+    N, _ = _games(W)
+    pairs = N.tocoo()
+    i, j = pairs.row, pairs.col
+    lost_to = np.asarray(W[j, i]).ravel()
+    frac = (lost_to + reg) / (pairs.data + 2 * reg)
+    d_max = max(np.bincount(i, minlength=W.shape[0]).max(initial=0), 1)
+    P = sparse.coo_matrix((frac / d_max, (i, j)), shape=W.shape).tocsr()
+    P = P + sparse.diags(1 - np.asarray(P.sum(axis=1)).ravel())
+    return _power_iteration(P.tocsr(), tol, max_iter)
+
+
+def pagerank_scores(W, damping=0.85, tol=1e-12, max_iter=10000):
+    '''
+        PageRank on the graph where every loss is a link from the loser to the winner, weighted by
+        the number of losses; undefeated entities teleport uniformly.
+    '''
+    W = sparse.csr_matrix(W, dtype=float)
+    n = W.shape[0]
+    links = W.T.tocsr()
+    links.setdiag(0)
+    out = np.asarray(links.sum(axis=1)).ravel()
+    dangling = out == 0
+    links = sparse.diags(np.where(dangling, 0, 1 / np.where(dangling, 1, out))) @ links
+    x = np.full(n, 1 / n)
+    linksT = links.T.tocsr()
+    for _ in range(max_iter):
+        new_x = damping * (linksT @ x + x[dangling].sum() / n) + (1 - damping) / n
+        new_x /= new_x.sum()
+        if np.abs(new_x - x).sum() < tol:
+            return new_x
+        x = new_x
+    return x
+
+
+def keener_scores(W, tol=1e-12, max_iter=10000):
+    '''
+        Keener's (1993) method: the Perron vector of a_ij = h((W_ij + 1) / (N_ij + 2)) / n_i over
+        compared pairs, with the skewing h(x) = 1/2 + sgn(x - 1/2) sqrt(|2x - 1|) / 2 and n_i the
+        games played by i. Iterates on (A + I) / 2, which has the same Perron vector but is aperiodic.
+    '''
+    W = sparse.csr_matrix(W, dtype=float)
+    N, games = _games(W)
+    pairs = N.tocoo()
+    i, j = pairs.row, pairs.col
+    x = (np.asarray(W[i, j]).ravel() + 1) / (pairs.data + 2)
+    h = 0.5 + np.sign(x - 0.5) * np.sqrt(np.abs(2 * x - 1)) / 2
+    A = sparse.coo_matrix((h / games[i], (i, j)), shape=W.shape).tocsr()
+    # right Perron vector of A = left fixed point of its transpose
+    return _power_iteration(((A + sparse.identity(W.shape[0])) / 2).T.tocsr(), tol, max_iter)
+
+
+def massey_scores(W, differential=None, tol=1e-10):
+    '''
+        Least-squares ratings of Massey (1997): r_i - r_j fits the result of every game, i.e.
+        (diag(games) - N) r = differential with sum(r) = 0 on every connected component.
+        differential: per-entity total margin; defaults to wins - losses
+        The Laplacian system is singular but consistent and is solved by conjugate gradients.
+    '''
+    W = sparse.csr_matrix(W, dtype=float)
+    N, games = _games(W)
+    if differential is None:
+        differential = np.asarray(W.sum(axis=1)).ravel() - np.asarray(W.sum(axis=0)).ravel()
+    M = (sparse.diags(games) - N).tocsr()
+    r, _ = cg(M, np.asarray(differential, dtype=float), rtol=tol, maxiter=10 * W.shape[0])
+    return r - r.mean()
+
+
+def massey_least_squares(num_entities, winner, loser, margin, home=None, tol=1e-10):
+    '''
+        Massey ratings from the score margins of individual games: the minimum-norm least-squares
+        solution of r_winner - r_loser + h * home = margin, found by LSQR on the sparse m x n (or
+        m x (n + 1) with a home-field column) design matrix. The minimum-norm solution has zero
+        mean on every connected component. Returns the ratings, followed by h when home is given.
+    '''
+    m = len(winner)
+    games = np.arange(m)
+    rows = [games, games]
+    cols = [winner, loser]
+    data = [np.ones(m), -np.ones(m)]
+    width = num_entities
+    if home is not None:
+        rows.append(games)
+        cols.append(np.full(m, num_entities))
+        data.append(np.asarray(home, dtype=float))
+        width += 1
+    X = sparse.csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))), shape=(m, width))
+    return lsqr(X, np.asarray(margin, dtype=float), atol=tol, btol=tol, iter_lim=10 * width)[0]
+
+
+def colley_scores(W, tol=1e-10):
+    '''
+        Colley's (2002) ratings: (2I + diag(games) - N) r = 1 + (wins - losses) / 2, a symmetric
+        positive definite system solved by conjugate gradients.
+    '''
+    W = sparse.csr_matrix(W, dtype=float)
+    N, games = _games(W)
+    b = 1 + (np.asarray(W.sum(axis=1)).ravel() - np.asarray(W.sum(axis=0)).ravel()) / 2
+    C = (sparse.diags(2 + games) - N).tocsr()
+    r, _ = cg(C, b, rtol=tol, maxiter=10 * W.shape[0])
+    return r
@@ -0,0 +1,155 @@
+'''
+    Runs every (method, dataset, hyperparameter) combination and appends each result to the
+    results store (results_store.py) as soon as it is evaluated, e.g.
+
+        python sweep.py --methods elo glicko bradley_terry self_consistency \
+            --datasets icc-2023-2025 nfl-2018 nfl-2019 --param elo.k=0.1,0.15,0.3 \
+            --param self_consistency.num_samples=5,10
+
+    Each dataset is loaded once. Baselines run in a process pool whose workers receive the parsed
+    datasets once at start-up; LLM methods run in threads of the main process, at most
+    --llm_concurrency at a time, sharing one response cache.
+'''
+
+import argparse
+import itertools
+import json
+import os
+import random
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+from instrumentation import Recorder, recording, span
+from results_store import ResultsStore
+from run import BASELINE_METHODS, LLM_METHODS, SEED, load_preference_data, run_method
+from utils import evaluate_ranking
+
+parser = argparse.ArgumentParser(description="Sweep rank aggregation methods over datasets and hyperparameters")
+parser.add_argument("--methods", type=str, nargs="+", required=True, choices=list(BASELINE_METHODS) + list(LLM_METHODS))
+parser.add_argument("--datasets", type=str, nargs="+", required=True)
+parser.add_argument("--param", type=str, action="append", default=[],
+                    help="method.name=v1,v2,... grid of values passed to the method, e.g. elo.k=0.1,0.3")
+parser.add_argument("--db_path", type=str, default="results.sqlite")
+parser.add_argument("--csv_path", type=str, default="results.csv", help="wide results table exported after the sweep ('' to skip)")
+parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes for the baseline methods")
+parser.add_argument("--llm_concurrency", type=int, default=2, help="LLM method runs in flight at once")
+parser.add_argument("--cache_path", type=str, default=".cache/llm_responses.sqlite")
+parser.add_argument("--no_cache", action="store_true")
+parser.add_argument("--prompt_format", type=str, default="raw", choices=["raw", "compact", "auto"],
+                    help="as for run.py")
+parser.add_argument("--token_budget", type=int, default=2000)
+parser.add_argument("--metrics_path", type=str, default="metrics.jsonl")
+parser.add_argument("--trace_memory", action="store_true")
+
+_datasets = {}
+_trace_memory = False
+
+def parse_params(specs):
+    '''
+        ["elo.k=0.1,0.3", ...] -> {'elo': {'k': [0.1, 0.3]}}; values are read as JSON where possible.
+    '''
+    grid = {}
+    for spec in specs:
+        name, values = spec.split("=", 1)
+        method, param = name.split(".", 1)
+        parsed = []
+        for value in values.split(","):
+            try:
+                parsed.append(json.loads(value))
+            except json.JSONDecodeError:
+                parsed.append(value)
+        grid.setdefault(method, {})[param] = parsed
+    return grid
+
+def expand_grid(param_grid):
+    names = list(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(param_grid[name] for name in names))]
+
+def column_name(method, params):
+    if not params:
+        return method
+    return f"{method}[{','.join(f'{name}={value}' for name, value in params.items())}]"
+
+def _init_worker(datasets, trace_memory):
+    global _datasets, _trace_memory
+    _datasets = datasets
+    _trace_memory = trace_memory
+    random.seed(SEED)
+
+def _run_baseline(dataset, method, params):
+    '''
+        (predicted ranking, instrumentation records), as the worker's records cannot reach the
+        recorder of the main process otherwise.
+    '''
+    preference_data, team_identifier, _ = _datasets[dataset]
+    recorder = Recorder(trace_memory=_trace_memory, dataset=dataset, method=method)
+    with recording(recorder):
+        predicted_rankings = run_method(method, preference_data, team_identifier, **params)
+    return predicted_rankings, recorder.records
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    load_dotenv()
+    random.seed(SEED)
+
+    datasets = {dataset: load_preference_data(dataset) for dataset in args.datasets}
+    param_grid = parse_params(args.param)
+    jobs = [
+        (dataset, method, params)
+        for method in args.methods
+        for params in expand_grid(param_grid.get(method, {}))
+        for dataset in args.datasets
+    ]
+    cache = None
+    if any(method in LLM_METHODS for method in args.methods) and not args.no_cache:
+        from llm_cache import ResponseCache
+        cache = ResponseCache(args.cache_path)
+
+    store = ResultsStore(args.db_path)
+    if args.csv_path:
+        store.import_if_empty(args.csv_path)
+    # LLM runs share the main process, so their records carry no per-run context
+    recorder = Recorder(trace_memory=args.trace_memory)
+
+    results = {}
+    with recording(recorder), \
+            ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(datasets, args.trace_memory)) as processes, \
+            ThreadPoolExecutor(max_workers=args.llm_concurrency) as threads:
+        futures = {}
+        for dataset, method, params in jobs:
+            if method in BASELINE_METHODS:
+                future = processes.submit(_run_baseline, dataset, method, params)
+            else:
+                preference_data, team_identifier, _ = datasets[dataset]
+                future = threads.submit(
+                    run_method, method, preference_data, team_identifier, cache=cache,
+                    prompt_format=args.prompt_format, token_budget=args.token_budget, **params,
+                )
+            futures[future] = (dataset, method, params)
+
+        for future in as_completed(futures):
+            dataset, method, params = futures[future]
+            column = column_name(method, params)
+            try:
+                predicted_rankings = future.result()
+            except Exception as e:
+                print(f"{column} on {dataset} failed: {e!r}")
+                continue
+            if method in BASELINE_METHODS:
+                predicted_rankings, records = predicted_rankings
+                recorder.extend(records)
+            with span("evaluate", dataset=dataset, column=column):
+                results[(dataset, column)] = evaluate_ranking(datasets[dataset][2], predicted_rankings)
+            if method in LLM_METHODS:
+                params = {**params, "prompt_format": args.prompt_format, "token_budget": args.token_budget}
+            store.log_run(dataset, method, results[(dataset, column)], params=params, seed=SEED, column=column)
+            print(f"{column} on {dataset}: kendalltau-tau={results[(dataset, column)]['kendalltau-tau']:.4f}")
+
+    if cache is not None and cache.hits + cache.misses > 0:
+        print("LLM cache:", cache.stats())
+    if args.csv_path:
+        store.export_csv(args.csv_path)
+    recorder.write(args.metrics_path)
+    print(f"{len(results)}/{len(jobs)} runs logged to {args.db_path}")
@@ -0,0 +1,53 @@
+import threading
+import time
+import types
+
+
+class FakeChunk:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class FakeModels:
+    '''
+        Stand-in for genai.Client().models. Each call of generate_content_stream takes the next
+        script from responses: a list of chunks, an exception to raise, or a callable returning
+        either. A chunk is a text, or a number of seconds the stream stalls for.
+        delay: seconds slept before every chunk.
+    '''
+
+    def __init__(self, responses, delay=0.0):
+        self.responses = list(responses)
+        self.delay = delay
+        self.calls = 0
+        self.closed = 0
+        self.system_instructions = []
+        self._lock = threading.Lock()
+
+    def generate_content_stream(self, model, contents, config):
+        with self._lock:
+            script = self.responses[min(self.calls, len(self.responses) - 1)]
+            self.calls += 1
+            self.system_instructions.append(config.system_instruction[0].text)
+        if callable(script):
+            script = script(contents[0].parts[0].text)
+        if isinstance(script, BaseException):
+            raise script
+        return self._stream(script)
+
+    def _stream(self, chunks):
+        try:
+            for text in chunks:
+                time.sleep(self.delay)
+                if isinstance(text, (int, float)):
+                    time.sleep(text)
+                    continue
+                yield FakeChunk(text)
+        finally:
+            with self._lock:
+                self.closed += 1
+
+
+def fake_client(responses, delay=0.0):
+    return types.SimpleNamespace(models=FakeModels(responses, delay))
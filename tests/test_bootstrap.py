@@ -0,0 +1,63 @@
+from statistics import NormalDist
+
+import numpy as np
+import pytest
+
+from baseline import rank_using_colley
+from bootstrap import bootstrap_rankings
+from comparisons import ComparisonSet
+from utils import evaluate_rankings
+
+
+@pytest.fixture
+def league():
+    rng = np.random.default_rng(3)
+    n, m = 8, 120
+    strength = np.linspace(1.5, -1.5, n)
+    first, second = rng.integers(0, n, m), rng.integers(0, n, m)
+    first, second = first[first != second], second[first != second]
+    won = rng.random(len(first)) < 1 / (1 + np.exp(strength[second] - strength[first]))
+    winner, loser = np.where(won, first, second), np.where(won, second, first)
+    period = np.repeat(np.arange(12), -(-len(winner) // 12))[:len(winner)]
+    return ComparisonSet([f"team{i}" for i in range(n)], winner, loser, period=period)
+
+
+def jackknife_replicates(league):
+    rankings = []
+    for week in range(12):
+        keep = np.flatnonzero(league.period != week)
+        rankings.append(rank_using_colley(league.subset(keep)))
+    return rankings
+
+
+def test_jackknife_intervals_use_the_jackknife_variance(league):
+    gold = league.entities
+    result = bootstrap_rankings(league, rank_using_colley, method='jackknife', gold_rankings=gold, workers=1)
+    replicates = jackknife_replicates(league)
+    n = len(replicates)
+    assert result.num_samples == n
+    z = NormalDist().inv_cdf(0.975)
+
+    index = {team: i for i, team in enumerate(gold)}
+    encoded = np.array([[index[team] for team in ranking] for ranking in replicates])
+    for metric, values in evaluate_rankings(np.arange(len(gold)), encoded).items():
+        std = np.sqrt((n - 1) / n * ((values - values.mean()) ** 2).sum())
+        low, mean, high = result.metric_intervals(0.95)[metric]
+        assert mean == pytest.approx(values.mean())
+        assert (low, high) == pytest.approx((values.mean() - z * std, values.mean() + z * std), abs=1e-9)
+
+    intervals = result.rank_intervals(0.95)
+    for team in gold:
+        ranks = np.array([ranking.index(team) + 1 for ranking in replicates], dtype=float)
+        std = np.sqrt((n - 1) / n * ((ranks - ranks.mean()) ** 2).sum())
+        low, mean, high = intervals[team]
+        assert mean == pytest.approx(ranks.mean())
+        assert low == pytest.approx(max(ranks.mean() - z * std, 1))
+        assert high == pytest.approx(min(ranks.mean() + z * std, len(gold)))
+
+
+def test_bootstrap_intervals_are_percentiles(league):
+    result = bootstrap_rankings(league, rank_using_colley, num_samples=200, workers=1, seed=1)
+    quantiles = result.rank_quantiles([0.025, 0.5, 0.975])
+    for i, team in enumerate(league.entities):
+        assert result.rank_intervals(0.95)[team] == tuple(quantiles[:, i])
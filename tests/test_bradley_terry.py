@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from scipy.optimize import approx_fprime
+
+from benchmarks.synthetic import generate_league
+from bradley_terry import (
+    fit_bradley_terry, neg_log_likelihood, neg_log_likelihood_grad, neg_log_likelihood_hess, win_edges,
+)
+
+
+def league_win_matrix(num_teams=12, seed=0):
+    comparisons, _, _ = generate_league(num_teams, games_per_team=30, draw_rate=0.1, seed=seed)
+    W = comparisons.win_matrix().toarray()
+    # a pseudo-game each way keeps the MLE finite, as no team may be undefeated
+    return W + 0.5 * (1 - np.eye(num_teams))
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_solvers_agree(seed):
+    W = league_win_matrix(seed=seed)
+    fits = {method: fit_bradley_terry(W, method=method, tol=1e-10) for method in ("lbfgs", "mm", "newton")}
+    for res in fits.values():
+        assert res.success
+    centered = {method: res.x - res.x.mean() for method, res in fits.items()}
+    np.testing.assert_allclose(centered["mm"], centered["newton"], atol=1e-6)
+    np.testing.assert_allclose(centered["lbfgs"], centered["newton"], atol=1e-4)
+
+
+def test_sparse_and_dense_input_agree():
+    from scipy import sparse
+
+    W = league_win_matrix()
+    dense = fit_bradley_terry(W, method="newton").x
+    sparse_fit = fit_bradley_terry(sparse.csr_matrix(W), method="newton").x
+    np.testing.assert_allclose(dense - dense.mean(), sparse_fit - sparse_fit.mean(), atol=1e-8)
+
+
+def test_gradient_and_hessian_match_finite_differences():
+    W = league_win_matrix()
+    rows, cols, wins = win_edges(W)
+    x = np.random.default_rng(0).standard_normal(W.shape[0])
+
+    numeric = approx_fprime(x, neg_log_likelihood, 1e-6, rows, cols, wins)
+    np.testing.assert_allclose(neg_log_likelihood_grad(x, rows, cols, wins), numeric, rtol=1e-4, atol=1e-4)
+
+    hess = neg_log_likelihood_hess(x, rows, cols, wins).toarray()
+    numeric_hess = np.array([
+        approx_fprime(x, lambda p: neg_log_likelihood_grad(p, rows, cols, wins)[i], 1e-6) for i in range(len(x))
+    ])
+    np.testing.assert_allclose(hess, numeric_hess, rtol=1e-4, atol=1e-4)
+
+
+def test_warm_start_converges_to_the_same_fit():
+    W = league_win_matrix()
+    cold = fit_bradley_terry(W, method="newton").x
+    warm = fit_bradley_terry(W, method="mm", init_params=cold + 3.0).x
+    np.testing.assert_allclose(warm - warm.mean(), cold - cold.mean(), atol=1e-6)
@@ -0,0 +1,57 @@
+import numpy as np
+
+from comparisons import ComparisonSet, period_slices
+
+PREFERENCES = [('South Africa', 'Pakistan', 'W'),
+               ('South Africa', 'West Indies', 'D'),
+               ('South Africa', 'New Zealand', 'L'),
+               ('Pakistan', 'West Indies', 'W')]
+
+
+def test_from_tuples_encodes_in_order_of_appearance():
+    comparisons = ComparisonSet.from_tuples(PREFERENCES)
+    assert comparisons.entities == ['South Africa', 'Pakistan', 'West Indies', 'New Zealand']
+    assert comparisons.winner.tolist() == [0, 0, 3, 1]
+    assert comparisons.loser.tolist() == [1, 2, 0, 2]
+    assert comparisons.draw.tolist() == [False, True, False, False]
+    assert ComparisonSet.from_tuples(comparisons) is comparisons
+
+
+def test_iteration_round_trips_with_losses_flipped():
+    comparisons = ComparisonSet.from_tuples(PREFERENCES)
+    expected = [('South Africa', 'Pakistan', 'W'),
+                ('South Africa', 'West Indies', 'D'),
+                ('New Zealand', 'South Africa', 'W'),
+                ('Pakistan', 'West Indies', 'W')]
+    assert list(comparisons) == expected
+    again = ComparisonSet.from_tuples(list(comparisons), entities=comparisons.entities)
+    assert list(again) == expected
+    assert again.entities == comparisons.entities
+
+
+def test_fixed_entities_keep_their_ids():
+    comparisons = ComparisonSet.from_tuples(PREFERENCES, entities=['New Zealand', 'Australia'])
+    assert comparisons.entities == ['New Zealand', 'Australia', 'South Africa', 'Pakistan', 'West Indies']
+    assert comparisons.appearance_order().tolist() == [2, 3, 4, 0]
+
+
+def test_win_matrix_counts_draws_half_each_way():
+    comparisons = ComparisonSet.from_tuples(PREFERENCES + [('Pakistan', 'West Indies', 'W')])
+    np.testing.assert_array_equal(comparisons.win_matrix().toarray(), [[0, 1, 0.5, 0],
+                                                                         [0, 0, 2, 0],
+                                                                         [0.5, 0, 0, 0],
+                                                                         [1, 0, 0, 0]])
+
+
+def test_rank_skips_absent_entities_and_breaks_ties_by_appearance():
+    comparisons = ComparisonSet.from_tuples(PREFERENCES, entities=['Australia'])
+    scores = np.array([9.0, 1.0, 2.0, 1.0, 0.0])
+    assert comparisons.rank(scores) == ['Pakistan', 'South Africa', 'West Indies', 'New Zealand']
+
+
+def test_subset_and_period_slices():
+    comparisons = ComparisonSet.from_tuples(PREFERENCES, period=[1, 1, 2, 2])
+    later = comparisons.subset(comparisons.period == 2)
+    assert later.entities == comparisons.entities
+    assert list(later) == list(comparisons)[2:]
+    assert period_slices(comparisons.period) == [slice(0, 2), slice(2, 4)]
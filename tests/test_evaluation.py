@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from scipy.stats import kendalltau, spearmanr
+
+from utils import _count_inversions, encode_rankings, evaluate_ranking, evaluate_rankings
+
+
+def brute_force_inversions(row):
+    return sum(row[i] > row[j] for i in range(len(row)) for j in range(i + 1, len(row)))
+
+
+@pytest.mark.parametrize("m", [1, 2, 3, 7, 8, 9, 31, 64])
+def test_count_inversions_matches_brute_force(m):
+    rng = np.random.default_rng(m)
+    values = np.array([rng.permutation(m) for _ in range(20)])
+    assert _count_inversions(values).tolist() == [brute_force_inversions(row.tolist()) for row in values]
+
+
+@pytest.mark.parametrize("n", [2, 5, 16, 33])
+def test_full_rankings_match_scipy(n):
+    rng = np.random.default_rng(n)
+    predicted = np.array([rng.permutation(n) for _ in range(25)])
+    results = evaluate_rankings(np.arange(n), predicted)
+    for s, row in enumerate(predicted):
+        assert results["kendalltau-tau"][s] == pytest.approx(kendalltau(np.arange(n), row).statistic)
+        assert results["spearman-rho"][s] == pytest.approx(spearmanr(np.arange(n), row).statistic)
+    assert (results["coverage"] == 1).all()
+
+
+def test_partial_rankings_are_scored_on_their_projection():
+    rng = np.random.default_rng(0)
+    n = 12
+    gold = rng.permutation(n)
+    for _ in range(25):
+        kept = rng.permutation(n)[:rng.integers(2, n + 1)]
+        # padding, an unknown id and a repeat are ignored
+        row = np.concatenate([kept, [kept[0], 99, -1, -1]])
+        results = evaluate_rankings(gold, row[None, :])
+        gold_positions = [int(np.flatnonzero(gold == team)[0]) for team in kept]
+        assert results["kendalltau-tau"][0] == pytest.approx(kendalltau(np.arange(len(kept)), gold_positions).statistic)
+        assert results["coverage"][0] == pytest.approx(len(kept) / n)
+
+
+def test_evaluate_ranking_reports_scipy_p_values():
+    gold = ["A", "B", "C", "D", "E", "F"]
+    predicted = ["B", "A", "C", "Unknown", "E", "D", "F"]
+    results = evaluate_ranking(gold, predicted)
+    positions = encode_rankings([predicted], gold)[0]
+    positions = positions[positions >= 0]
+    expected = kendalltau(np.arange(len(positions)), positions)
+    assert results["kendalltau-tau"] == pytest.approx(expected.statistic)
+    assert results["kendalltau-pvalue"] == pytest.approx(expected.pvalue)
+    assert results["top_3_accuracy"] == 1.0
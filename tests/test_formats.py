@@ -0,0 +1,42 @@
+import json
+
+from comparisons import ComparisonSet
+from utils import estimate_tokens, format_head_to_head, format_match_lines, format_preference_data
+
+
+def league():
+    teams = [f"Team {i}" for i in range(12)]
+    winner = [i for i in range(12) for j in range(12) if i < j] * 5
+    loser = [j for i in range(12) for j in range(12) if i < j] * 5
+    return ComparisonSet(teams, winner, loser)
+
+
+def test_default_is_the_line_format_the_prompts_describe():
+    comparisons = league()
+    lines = format_match_lines(comparisons)
+    assert estimate_tokens(lines) > 2000
+    assert format_preference_data(comparisons) == lines
+    assert lines.splitlines()[0] == "Team 0 vs Team 1, Team 0 won"
+
+
+def test_auto_switches_to_the_table_over_budget():
+    comparisons = league()
+    assert format_preference_data(comparisons, 'auto', token_budget=2000) == format_head_to_head(comparisons)
+    assert format_preference_data(comparisons, 'auto', token_budget=10 ** 6) == format_match_lines(comparisons)
+    assert format_preference_data(comparisons, 'compact') == format_head_to_head(comparisons)
+
+
+def test_prompts_describe_the_table_they_are_sent():
+    from aggregation_mechanisms import HEAD_TO_HEAD_FORMAT, MATCH_LINES_FORMAT, rank_using_cot, rank_using_direct_prompt
+    from fake_genai import fake_client
+
+    comparisons = league()
+    teams = comparisons.entities
+    for ranker in (rank_using_direct_prompt, rank_using_cot):
+        client = fake_client([[json.dumps(teams)]])
+        ranker(format_preference_data(comparisons, 'compact'), client=client, teams=teams)
+        ranker(format_preference_data(comparisons, 'raw'), client=client, teams=teams)
+        table, lines = client.models.system_instructions
+        assert HEAD_TO_HEAD_FORMAT in table and HEAD_TO_HEAD_FORMAT not in lines
+        if ranker is rank_using_direct_prompt:
+            assert MATCH_LINES_FORMAT in lines and MATCH_LINES_FORMAT not in table
@@ -0,0 +1,72 @@
+import json
+
+import numpy as np
+import pytest
+
+from aggregation_mechanisms import rank_using_hierarchical
+from comparisons import ComparisonSet
+from fake_genai import fake_client
+
+TRUE_ORDER = [f"Team {i:02d}" for i in range(24)]
+
+
+def oracle(prompt):
+    # ranks the teams it is asked about in their true order, whatever the matches say
+    teams = json.loads(prompt.rsplit("Teams to rank: ", 1)[1])
+    return [json.dumps(sorted(teams, key=TRUE_ORDER.index))]
+
+
+def league():
+    # every team plays every other once; results are noisy, so win rates misorder many teams
+    rng = np.random.default_rng(0)
+    first, second = np.triu_indices(len(TRUE_ORDER), 1)
+    upset = rng.random(len(first)) < 0.35
+    return ComparisonSet(TRUE_ORDER, np.where(upset, second, first), np.where(upset, first, second))
+
+
+def test_merge_keeps_group_orders_and_windows_run_until_stable():
+    comparisons = league()
+    # groups that split the true order across them, so merging by raw win rate would interleave wrongly
+    groups = [TRUE_ORDER[i::3] for i in range(3)]
+    client = fake_client([oracle])
+    ranking = rank_using_hierarchical(comparisons, client=client, groups=groups, window=6, merge_passes=None, max_concurrency=1)
+    assert ranking == TRUE_ORDER
+
+
+def test_fixed_merge_passes_limit_the_calls():
+    comparisons = league()
+    groups = [TRUE_ORDER[i::3] for i in range(3)]
+    client = fake_client([oracle])
+    ranking = rank_using_hierarchical(comparisons, client=client, groups=groups, window=6, merge_passes=1, max_concurrency=1)
+    assert sorted(ranking) == TRUE_ORDER
+    # three group prompts and one round of four windows
+    assert client.models.calls == 3 + 4
+
+
+def test_merge_keeps_every_group_ranking():
+    comparisons = league()
+    groups = [TRUE_ORDER[i::3] for i in range(3)]
+    ranking = rank_using_hierarchical(comparisons, client=fake_client([oracle]), groups=groups, merge_passes=0)
+    assert sorted(ranking) == TRUE_ORDER
+    for group in groups:
+        assert [team for team in ranking if team in group] == group
+
+
+@pytest.mark.parametrize("groups", [
+    [TRUE_ORDER[:12], TRUE_ORDER[12:-1]],
+    [TRUE_ORDER[:12], TRUE_ORDER[12:] + ["Team 99"]],
+    [TRUE_ORDER[:13], TRUE_ORDER[12:]],
+])
+def test_groups_must_name_every_team_once(groups):
+    client = fake_client([oracle])
+    with pytest.raises(ValueError, match="exactly once"):
+        rank_using_hierarchical(league(), client=client, groups=groups)
+    assert client.models.calls == 0
+
+
+def test_default_critical_path_is_three_rounds():
+    groups = [TRUE_ORDER[i::3] for i in range(3)]
+    client = fake_client([oracle])
+    rank_using_hierarchical(league(), client=client, groups=groups, window=6, max_concurrency=1)
+    # three group prompts, then a round of four aligned windows and a round of four shifted windows
+    assert client.models.calls == 3 + 4 + 4
@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+import pytest
+
+from aggregation_mechanisms import _scores_with_errors, rank_using_hybrid
+from benchmarks.synthetic import generate_league
+from fake_genai import fake_client
+
+
+@pytest.fixture(scope="module")
+def league():
+    comparisons, strength, _ = generate_league(20, games_per_team=10, seed=2)
+    true_order = [comparisons.entities[i] for i in np.argsort(-strength)]
+    return comparisons, true_order
+
+
+def oracle(true_order, asked):
+    def respond(prompt):
+        teams = json.loads(prompt.rsplit("Teams to rank: ", 1)[1])
+        asked.append(teams)
+        return [json.dumps(sorted(teams, key=true_order.index))]
+    return respond
+
+
+def statistical_order(comparisons):
+    scores, errors = _scores_with_errors(comparisons, 'bradley_terry')
+    order = comparisons.appearance_order()
+    order = order[np.argsort(-scores[order], kind='stable')]
+    z = (scores[order[:-1]] - scores[order[1:]]) / np.sqrt(errors[order[:-1]] ** 2 + errors[order[1:]] ** 2)
+    return [comparisons.entities[i] for i in order], z
+
+
+def test_only_ambiguous_pairs_are_queried_and_repaired(league):
+    comparisons, true_order = league
+    base, z = statistical_order(comparisons)
+    threshold = float(np.median(z))
+    asked = []
+    ranking = rank_using_hybrid(comparisons, client=fake_client([oracle(true_order, asked)]), threshold=threshold, window=20)
+
+    # every prompt covers a run of adjacent teams linked by gaps below the threshold, and together
+    # the prompts cover every such gap
+    covered = set()
+    for teams in asked:
+        start = min(base.index(team) for team in teams)
+        assert sorted(base.index(team) for team in teams) == list(range(start, start + len(teams)))
+        assert (z[start:start + len(teams) - 1] < threshold).all()
+        covered.update(range(start, start + len(teams) - 1))
+    assert covered == set(np.flatnonzero(z < threshold))
+
+    # each block comes back in the oracle's order; everything else keeps the statistical order
+    for teams in asked:
+        start = min(base.index(team) for team in teams)
+        assert ranking[start:start + len(teams)] == sorted(teams, key=true_order.index)
+    untouched = [p for p in range(len(base)) if all(base[p] not in teams for teams in asked)]
+    assert [ranking[p] for p in untouched] == [base[p] for p in untouched]
+
+
+def test_max_queries_takes_the_most_ambiguous_blocks(league):
+    comparisons, true_order = league
+    base, z = statistical_order(comparisons)
+    asked = []
+    rank_using_hybrid(comparisons, client=fake_client([oracle(true_order, asked)]), threshold=float(np.median(z)),
+                      window=3, max_queries=2, max_concurrency=1)
+    assert len(asked) == 2
+    # the block holding the smallest gap of all is among them
+    closest = int(np.argmin(z))
+    assert any(base[closest] in teams and base[closest + 1] in teams for teams in asked)
+    assert all(len(teams) <= 3 for teams in asked)
+
+
+def test_no_ambiguity_means_no_queries(league):
+    comparisons, true_order = league
+    client = fake_client([oracle(true_order, [])])
+    assert rank_using_hybrid(comparisons, client=client, threshold=0.0) == statistical_order(comparisons)[0]
+    assert client.models.calls == 0
@@ -0,0 +1,55 @@
+import os
+
+import pandas as pd
+import pytest
+
+import utils
+from utils import load_icc_dataset, parse_icc_matches
+
+ROWS = {
+    'Team': ["South Africa", "Pakistan", "India"],
+    'Matches': [
+        [
+            "W January 03, 2025, 2nd Test, South Africa vs Pakistan South Africa won by 10 wickets",
+            "D  March 08, 2024, 1st Test, South Africa vs India Match drawn",
+        ],
+        [
+            "L January 03, 2025, 2nd Test, South Africa vs Pakistan South Africa won by 10 wickets",
+            "T July 01, 2024, 1st Test, Pakistan vs. India Match tied",
+        ],
+        ["Abandoned, India vs Pakistan", "W June 10, 2024, 3rd Test, India vs Australia India won by 5 runs"],
+    ],
+}
+
+
+def test_matches_listed_by_both_teams_are_kept_once():
+    with pytest.warns(UserWarning, match="1 of 6 ICC match strings"):
+        matches = parse_icc_matches(pd.DataFrame(ROWS))
+    assert matches == [
+        ("South Africa", "Pakistan", 'W'),
+        ("South Africa", "India", 'D'),
+        ("Pakistan", "India", 'D'),
+    ]
+
+
+def test_parsed_data_is_cached_per_source_and_parser_version(tmp_path, monkeypatch):
+    downloads = []
+
+    def download():
+        downloads.append(1)
+        return pd.DataFrame(ROWS)
+
+    with pytest.warns(UserWarning):
+        preference_data, team_identifier, gold_rankings = load_icc_dataset(download, cache_dir=str(tmp_path))
+    assert gold_rankings == ROWS['Team'] and team_identifier["India"] == 2
+    assert len(preference_data) == 3
+
+    # the second load parses nothing and downloads nothing
+    again = load_icc_dataset(download, cache_dir=str(tmp_path))
+    assert list(again[0]) == list(preference_data) and len(downloads) == 1
+    assert len(os.listdir(tmp_path)) == 2
+
+    monkeypatch.setattr(utils, "ICC_PARSER_VERSION", utils.ICC_PARSER_VERSION + 1)
+    with pytest.warns(UserWarning):
+        load_icc_dataset(download, cache_dir=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 3 and len(downloads) == 1
@@ -0,0 +1,60 @@
+import threading
+import tracemalloc
+
+from instrumentation import Recorder, annotate, event, recording, span
+
+
+def allocate(size):
+    return bytearray(size)
+
+
+def test_spans_nest_and_collect_fields():
+    recorder = Recorder(dataset="nfl-2020")
+    with recording(recorder):
+        with span("method", method="elo"):
+            with span("fit"):
+                annotate(nit=3)
+            event("llm.timeout", seed=1)
+    fit, timeout, method = recorder.records
+    assert (fit["event"], fit["parent"], fit["nit"], fit["dataset"]) == ("fit", "method", 3, "nfl-2020")
+    assert (timeout["event"], timeout["parent"]) == ("llm.timeout", "method")
+    assert method["parent"] is None and method["seconds"] >= fit["seconds"]
+
+
+def test_tracing_runs_once_per_recording():
+    recorder = Recorder(trace_memory=True)
+    assert not tracemalloc.is_tracing()
+    with recording(recorder):
+        assert tracemalloc.is_tracing()
+        with span("small"):
+            allocate(10_000)
+        with span("large"):
+            allocate(5_000_000)
+        assert tracemalloc.is_tracing()
+    assert not tracemalloc.is_tracing()
+    small, large = recorder.records
+    assert small["peak_bytes"] < 1_000_000 and large["peak_bytes"] > 4_900_000
+    assert "peak_shared" not in small and "peak_shared" not in large
+
+
+def test_overlapping_spans_are_marked_shared():
+    recorder = Recorder(trace_memory=True)
+    inside, release = threading.Event(), threading.Event()
+
+    def worker():
+        with span("worker"):
+            inside.set()
+            release.wait(5)
+
+    with recording(recorder):
+        thread = threading.Thread(target=worker)
+        thread.start()
+        inside.wait(5)
+        with span("main"):
+            allocate(1_000_000)
+        release.set()
+        thread.join()
+    assert all(record["peak_shared"] for record in recorder.records)
+    # the main span did not reset the peak the worker span was measuring
+    worker_record = next(record for record in recorder.records if record["event"] == "worker")
+    assert worker_record["peak_bytes"] > 900_000
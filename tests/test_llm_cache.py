@@ -0,0 +1,90 @@
+import pytest
+
+from aggregation_mechanisms import _generate, rank_using_direct_prompt
+from fake_genai import fake_client
+from llm_cache import ResponseCache
+from ranking_parser import RankingParser
+
+TEAMS = ["India", "Australia", "England"]
+
+
+@pytest.fixture
+def cache():
+    cache = ResponseCache(":memory:")
+    yield cache
+    cache.close()
+
+
+def test_hit_and_miss(cache):
+    key = cache.make_key("model", "system", "prompt", {"temperature": 0.3})
+    assert cache.get(key) is None
+    cache.put(key, '["India"]')
+    assert cache.get(key) == '["India"]'
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_keys_depend_on_every_part_of_the_request(cache):
+    base = cache.make_key("model", "system", "prompt", {"temperature": 0.3}, seed=0)
+    assert base == cache.make_key("model", "system", "prompt", {"temperature": 0.3}, seed=0)
+    assert base != cache.make_key("other", "system", "prompt", {"temperature": 0.3}, seed=0)
+    assert base != cache.make_key("model", "system", "prompt!", {"temperature": 0.3}, seed=0)
+    assert base != cache.make_key("model", "system", "prompt", {"temperature": 0.5}, seed=0)
+    assert base != cache.make_key("model", "system", "prompt", {"temperature": 0.3}, seed=1)
+
+
+def test_max_entries_evicts_least_recently_used(monkeypatch):
+    cache = ResponseCache(":memory:", max_entries=2)
+    clock = iter(range(100))
+    monkeypatch.setattr("llm_cache.time.time", lambda: next(clock))
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"  # b is now the least recently used
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+
+
+def test_max_bytes_and_max_age(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("llm_cache.time.time", lambda: now[0])
+    cache = ResponseCache(":memory:", max_bytes=10, max_age=100)
+    cache.put("a", "x" * 6)
+    now[0] = 1
+    cache.put("b", "y" * 6)
+    assert cache.get("a") is None and cache.get("b") == "y" * 6
+    now[0] = 200
+    assert cache.get("b") is None
+    assert len(cache) == 0
+
+
+def test_generate_answers_repeated_requests_from_the_cache(cache):
+    client = fake_client([['["India", ', '"Australia", "England"]']])
+    first = rank_using_direct_prompt("matches", client=client, cache=cache, teams=TEAMS)
+    second = rank_using_direct_prompt("matches", client=client, cache=cache, teams=TEAMS)
+    assert first == second == TEAMS
+    assert client.models.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_responses_without_a_ranking_are_not_cached(cache):
+    client = fake_client([['I cannot rank these teams'], ['["England", "India", "Australia"]']])
+    with pytest.raises(ValueError):
+        rank_using_direct_prompt("matches", client=client, cache=cache, teams=TEAMS)
+    assert len(cache) == 0
+    assert rank_using_direct_prompt("matches", client=client, cache=cache, teams=TEAMS) == ["England", "India", "Australia"]
+    assert client.models.calls == 2 and len(cache) == 1
+
+
+def test_invalid_cached_responses_are_dropped_and_requested_again(cache):
+    client = fake_client([['["Australia", "India", "England"]']])
+    parser = RankingParser(TEAMS)
+    key_args = ("system", "matches")
+    # a response cached without validation, e.g. by an earlier version
+    _generate(client, *key_args, cache=cache)
+    key = next(iter(cache._conn.execute("SELECT key FROM responses")))[0]
+    cache.put(key, "garbage")
+
+    assert _generate(client, *key_args, cache=cache, parser=parser) == '["Australia", "India", "England"]'
+    assert parser.ranking() == ["Australia", "India", "England"]
+    assert client.models.calls == 2
+    assert cache.get(key) == '["Australia", "India", "England"]'
@@ -0,0 +1,128 @@
+import time
+
+import pytest
+from google.genai import errors
+
+from aggregation_mechanisms import _generate, rank_using_self_consistency
+from fake_genai import fake_client
+from instrumentation import Recorder, recording
+from ranking_parser import RankingParser
+
+TEAMS = ["India", "Australia", "England"]
+RANKING = '["India", "Australia", "England"]'
+
+
+def rate_limited():
+    return errors.APIError(429, {"error": {"message": "Resource exhausted", "status": "RESOURCE_EXHAUSTED"}})
+
+
+def test_retries_rate_limit_errors():
+    client = fake_client([rate_limited(), rate_limited(), [RANKING]])
+    recorder = Recorder()
+    with recording(recorder):
+        assert _generate(client, "system", "matches", backoff=0) == RANKING
+    assert client.models.calls == 3
+    assert recorder.records[-1]["attempts"] == 3
+
+
+def test_gives_up_after_max_retries():
+    client = fake_client([rate_limited()])
+    with pytest.raises(errors.APIError):
+        _generate(client, "system", "matches", max_retries=2, backoff=0)
+    assert client.models.calls == 3
+
+
+def test_does_not_retry_client_errors():
+    client = fake_client([errors.APIError(400, {"error": {"message": "Bad request"}}), [RANKING]])
+    with pytest.raises(errors.APIError):
+        _generate(client, "system", "matches", backoff=0)
+    assert client.models.calls == 1
+
+
+def test_stream_is_closed_once_every_team_is_ranked():
+    client = fake_client([[RANKING, " and some more text", " that is never read"]])
+    parser = RankingParser(TEAMS)
+    assert _generate(client, "system", "matches", parser=parser) == RANKING
+    assert client.models.closed == 1
+
+
+def test_slow_stream_times_out():
+    client = fake_client([['["India", ', 0.3, '"Australia", "England"]']])
+    with pytest.raises(TimeoutError):
+        _generate(client, "system", "matches", timeout=0.1)
+
+
+def test_self_consistency_abandons_stalled_samples():
+    # the first sample stalls far beyond the timeout; the other two answer at once
+    client = fake_client([['["England", ', 1.5, '"India", "Australia"]'], [RANKING]])
+    recorder = Recorder()
+    start = time.monotonic()
+    with recording(recorder):
+        ranking = rank_using_self_consistency(
+            "matches", num_samples=3, client=client, max_concurrency=3, timeout=0.2, teams=TEAMS,
+        )
+    assert time.monotonic() - start < 1
+    assert ranking == TEAMS
+    assert [record["event"] for record in recorder.records].count("llm.timeout") == 1
+
+
+def test_self_consistency_drops_samples_without_a_ranking():
+    client = fake_client([["no idea"], [RANKING]])
+    ranking = rank_using_self_consistency("matches", num_samples=3, client=client, max_concurrency=1, teams=TEAMS)
+    assert ranking == TEAMS
+
+
+def test_self_consistency_raises_when_no_sample_has_a_ranking():
+    client = fake_client([["no idea"]])
+    with pytest.raises(ValueError):
+        rank_using_self_consistency("matches", num_samples=2, client=client, teams=TEAMS)
+
+
+def test_self_consistency_stops_at_quorum():
+    client = fake_client([['["Australia", "India"]']], delay=0.05)
+    ranking = rank_using_self_consistency(
+        "matches", num_samples=10, client=client, max_concurrency=1, quorum=2, teams=TEAMS, fallback=TEAMS,
+    )
+    # the quorum ranking is completed from the fallback
+    assert ranking == ["Australia", "India", "England"]
+    assert client.models.calls < 10
+
+
+def test_self_consistency_quorum_agrees_on_the_top_k():
+    gold = ["India", "Australia", "England", "Pakistan", "South Africa"]
+    samples = [
+        ['["India", "Australia", "England", "Pakistan", "South Africa"]'],
+        ['["Australia", "India", "England", "Pakistan", "South Africa"]'],
+        ['["India", "Australia", "South Africa", "Pakistan", "England"]'],
+        ['["India", "Australia", "Pakistan", "England", "South Africa"]'],
+        ['["England", "India", "Australia", "Pakistan", "South Africa"]'],
+    ]
+    client = fake_client(samples, delay=0.05)
+    ranking = rank_using_self_consistency(
+        "matches", num_samples=10, client=client, max_concurrency=1, quorum=3, quorum_top_k=2, teams=gold,
+    )
+    # the samples that differ only below India, Australia agree, and only they are aggregated
+    assert client.models.calls < 10
+    assert ranking == ["India", "Australia", "Pakistan", "England", "South Africa"]
+
+    # no three samples are identical, so exact agreement never reaches the quorum
+    client = fake_client(samples)
+    rank_using_self_consistency(
+        "matches", num_samples=5, client=client, max_concurrency=1, quorum=3, quorum_top_k=None, teams=gold,
+    )
+    assert client.models.calls == 5
+
+
+def test_self_consistency_ties_and_missing_teams_follow_the_fallback():
+    gold = ["India", "Australia", "England", "Pakistan", "South Africa", "New Zealand"]
+    fallback = ["South Africa", "Pakistan", "New Zealand", "Australia", "England", "India"]
+    # England and Pakistan tie under Borda; India, South Africa and New Zealand are never listed
+    client = fake_client([['["Pakistan", "England", "Australia"]'], ['["England", "Pakistan", "Australia"]']])
+    ranking = rank_using_self_consistency(
+        "matches", num_samples=2, client=client, max_concurrency=1, teams=gold, fallback=fallback,
+    )
+    assert ranking == ["Pakistan", "England", "Australia", "South Africa", "New Zealand", "India"]
+
+    client = fake_client([['["Pakistan", "England", "Australia"]'], ['["England", "Pakistan", "Australia"]']])
+    ranking = rank_using_self_consistency("matches", num_samples=2, client=client, max_concurrency=1, teams=gold)
+    assert ranking == ["England", "Pakistan", "Australia", "India", "New Zealand", "South Africa"]
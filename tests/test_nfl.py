@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseline import rank_using_massey, rank_using_massey_margin
+from comparisons import ComparisonSet
+from spectral import massey_scores
+from utils import NFL_GAMES_PATH, load_nfl_games, nfl_history, nfl_season
+
+
+@pytest.fixture(scope="module")
+def games(tmp_path_factory):
+    return load_nfl_games(cache_dir=str(tmp_path_factory.mktemp("cache")))
+
+
+def test_super_bowls_are_played_at_a_neutral_venue(games):
+    game_type = pd.read_csv(NFL_GAMES_PATH)['game_type'].to_numpy()
+    history = nfl_history(games)
+    assert (history.home[game_type == 'SB'] == 0).all()
+    assert (history.home[game_type != 'SB'] != 0).all()
+
+
+def test_season_matches_history(games):
+    preference_data, _, _ = nfl_season(games, 2020)
+    history = nfl_history(games, [2020])
+    assert preference_data.entities == history.entities
+    np.testing.assert_array_equal(preference_data.home, history.home)
+    assert (preference_data.home == 0).sum() == 1
+
+
+def test_massey_ranks_wins_minus_losses_by_default(games):
+    preference_data, _, _ = nfl_season(games, 2020)
+    assert rank_using_massey(preference_data) == preference_data.rank(massey_scores(preference_data.win_matrix()))
+    assert rank_using_massey_margin(preference_data) != rank_using_massey(preference_data)
+
+
+def test_massey_margin_requires_margins():
+    with pytest.raises(ValueError):
+        rank_using_massey_margin(ComparisonSet(["a", "b"], [0], [1]))
@@ -0,0 +1,153 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseline import rank_using_bradley_terry, rank_using_elo, rank_using_glicko, rank_using_trueskill
+from benchmarks.synthetic import generate_league
+from bradley_terry import fit_bradley_terry
+from comparisons import period_slices
+from online import OnlineDecayedBradleyTerry, OnlineElo, OnlineGlicko, OnlineRanker, OnlineTrueSkill
+from rating_systems import init_elo, update_elo
+from utils import load_nfl_games
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = [
+    (OnlineElo, rank_using_elo),
+    (OnlineGlicko, rank_using_glicko),
+    (OnlineTrueSkill, rank_using_trueskill),
+]
+
+
+@pytest.fixture(scope="module")
+def league():
+    comparisons, _, _ = generate_league(30, games_per_team=12, draw_rate=0.05, seed=4)
+    return comparisons
+
+
+def replay(ranker, comparisons):
+    for sl in period_slices(comparisons.period):
+        ranker.update(comparisons.subset(np.arange(sl.start, sl.stop)))
+    return ranker
+
+
+@pytest.mark.parametrize("by_period", [False, True])
+@pytest.mark.parametrize("online, batch", CASES)
+def test_replaying_new_matches_equals_a_batch_recompute(league, online, batch, by_period):
+    ranker = replay(online(by_period=by_period), league)
+    assert ranker.num_comparisons == len(league)
+    assert ranker.current_ranking() == batch(league, by_period=by_period)
+
+
+@pytest.mark.parametrize("online, batch", CASES)
+def test_checkpoint_restores_the_ranker(league, online, batch, tmp_path):
+    periods = period_slices(league.period)
+    half = periods[len(periods) // 2].start
+    ranker = online()
+    ranker.update(league.subset(np.arange(half)))
+    ranker.save(tmp_path / "ranker.npz")
+
+    restored = OnlineRanker.load(tmp_path / "ranker.npz")
+    assert type(restored) is online and restored.entities == ranker.entities
+    for key, value in ranker.state.items():
+        np.testing.assert_array_equal(restored.state[key], value)
+    restored.update(league.subset(np.arange(half, len(league))))
+    assert restored.current_ranking() == batch(league)
+
+
+def test_sequential_update_touches_only_the_players():
+    state = init_elo(5)
+    state['rating'][:] = [0.5, 0.1, -0.2, 0.3, 0.0]
+    update_elo(state, np.array([3, 1]), np.array([1, 3]), np.array([1.0, 0.5]))
+    assert state['rating'][[0, 2, 4]].tolist() == [0.5, -0.2, 0.0]
+    assert state['rating'][[1, 3]].tolist() != [0.1, 0.3]
+
+
+def window_league():
+    comparisons, _, _ = generate_league(12, games_per_team=10, num_periods=10, seed=7)
+    return comparisons
+
+
+def periods_from(comparisons, first):
+    periods = period_slices(comparisons.period)
+    return comparisons.subset(np.arange(periods[first].start, len(comparisons)))
+
+
+def test_window_fit_depends_only_on_the_games_in_the_window():
+    comparisons = window_league()
+    ranker = replay(OnlineDecayedBradleyTerry(tol=1e-12, half_life=2, window=3), comparisons)
+    fresh = replay(OnlineDecayedBradleyTerry(tol=1e-12, half_life=2, window=3), periods_from(comparisons, 7))
+    assert ranker.current_ranking() == fresh.current_ranking()
+    index = [ranker.entity_index[team] for team in fresh.entities]
+    np.testing.assert_allclose(ranker.scores()[index], fresh.scores(), atol=1e-5)
+
+
+def test_window_evicts_old_games():
+    comparisons = window_league()
+    ranker = replay(OnlineDecayedBradleyTerry(window=3), comparisons)
+    window = periods_from(comparisons, 7)
+    assert ranker.win_matrix.sum() == pytest.approx(window.outcome.sum() + 0.5 * window.draw.sum())
+    played = {window.entities[i] for i in np.concatenate([window.winner, window.loser])}
+    assert set(ranker.current_ranking()) == played
+
+
+def test_decay_weights_games_by_age():
+    comparisons = window_league()
+    ranker = replay(OnlineDecayedBradleyTerry(method='newton', half_life=2, prior=0.5), comparisons)
+
+    # the same fit from scratch: games of period t weigh 2 ** ((t - last) / 2), plus the prior draws
+    n = len(ranker.entities)
+    W = np.zeros((n + 1, n + 1))
+    labels = period_slices(comparisons.period)
+    for t, sl in enumerate(labels):
+        weight = 2.0 ** ((t - (len(labels) - 1)) / 2)
+        for i, j, s in zip(comparisons.winner[sl], comparisons.loser[sl], comparisons.outcome[sl]):
+            i, j = ranker.entity_index[comparisons.entities[i]], ranker.entity_index[comparisons.entities[j]]
+            W[i, j] += weight * s
+            W[j, i] += weight * (1 - s) if s == 0.5 else 0
+    W[:n, n] = W[n, :n] = 0.25
+    expected = fit_bradley_terry(W, method='newton').x
+    np.testing.assert_allclose(ranker.scores(), expected[:n] - expected[n], atol=1e-6)
+
+
+def test_no_decay_no_window_and_no_prior_is_the_batch_fit():
+    comparisons = window_league()
+    ranker = replay(OnlineDecayedBradleyTerry(method='newton', prior=0), comparisons)
+    assert ranker.current_ranking() == rank_using_bradley_terry(comparisons)
+
+
+def test_decayed_checkpoint_round_trip(tmp_path):
+    comparisons = window_league()
+    periods = period_slices(comparisons.period)
+    ranker = OnlineDecayedBradleyTerry(method='newton', half_life=3, window=4)
+    replay(ranker, comparisons.subset(np.arange(periods[6].start)))
+    ranker.save(tmp_path / "ranker.npz")
+    restored = OnlineRanker.load(tmp_path / "ranker.npz")
+    assert restored.config() == ranker.config()
+
+    rest = periods_from(comparisons, 6)
+    replay(ranker, rest)
+    replay(restored, rest)
+    assert restored.current_ranking() == ranker.current_ranking()
+    np.testing.assert_allclose(restored.scores(), ranker.scores(), atol=1e-9)
+    assert (restored.win_matrix != ranker.win_matrix).nnz == 0
+
+
+def test_trajectory_script(tmp_path):
+    output = tmp_path / "trajectory.csv"
+    subprocess.run(
+        [sys.executable, "trajectory.py", "--seasons", "2020", "--half_life", "4", "--window", "8", "--output", str(output)],
+        cwd=REPO, check=True, capture_output=True,
+    )
+    trajectory = pd.read_csv(output, index_col="period")
+    games = load_nfl_games(cache_dir=str(tmp_path / "cache"))
+    weeks = np.unique(np.asarray(games['week'])[np.asarray(games['season']) == 2020])
+    assert trajectory.index.tolist() == (2020 * 100 + weeks).tolist()
+    assert trajectory.shape[1] == 32
+    # every team is ranked once it has played, with ranks 1..k
+    last = trajectory.iloc[-1].dropna()
+    assert sorted(last.astype(int)) == list(range(1, len(last) + 1))
@@ -0,0 +1,70 @@
+import pytest
+
+from ranking_parser import RankingParser, parse_ranking
+
+TEAMS = ["India", "Australia", "South Africa", "New Zealand"]
+RESPONSE = '{"ranking": ["Australia", "India", "South Africa", "New Zealand"]}'
+
+
+def feed_in_chunks(parser, text, size):
+    for start in range(0, len(text), size):
+        if parser.feed(text[start:start + size]):
+            return True
+    return False
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 1000])
+def test_chunk_boundaries_do_not_matter(size):
+    parser = RankingParser(TEAMS)
+    assert feed_in_chunks(parser, RESPONSE, size)
+    assert parser.ranking() == ["Australia", "India", "South Africa", "New Zealand"]
+
+
+def test_stops_once_every_team_is_ranked():
+    parser = RankingParser(TEAMS)
+    text = '["India", "Australia", "South Africa", "New Zealand"] and then the model keeps talking ["x"'
+    assert feed_in_chunks(parser, text, 3)
+    assert parser.names() == TEAMS
+
+
+def test_names_are_matched_loosely_and_unknown_names_dropped():
+    ranking = parse_ranking('["  south   africa", "INDIA", "England", "India", "Australia"]', TEAMS)
+    assert ranking == ["South Africa", "India", "Australia"]
+    parser = RankingParser(TEAMS)
+    parser.feed('["England", "India"]')
+    assert parser.unknown == ["England"]
+
+
+def test_escapes_in_names():
+    assert parse_ranking('["C\\u00f4te d\'Ivoire", "A \\"B\\""]') == ["Côte d'Ivoire", 'A "B"']
+
+
+def test_truncated_response_is_salvaged_and_filled_from_fallback():
+    parser = RankingParser(TEAMS)
+    parser.feed('["Australia", "New Zealand", "Ind')
+    assert parser.names() == ["Australia", "New Zealand"]
+    assert parser.ranking(fallback=TEAMS) == ["Australia", "New Zealand", "India", "South Africa"]
+    assert parser.filled == 2
+
+
+def test_without_stop_early_the_last_array_wins():
+    text = 'Candidates: ["India", "Australia", "South Africa", "New Zealand"]\nFinal: ["New Zealand", "India", "Australia", "South Africa"]'
+    assert parse_ranking(text, TEAMS, stop_early=False) == ["New Zealand", "India", "Australia", "South Africa"]
+    assert parse_ranking(text, TEAMS) == TEAMS
+
+
+def test_strings_outside_arrays_are_ignored():
+    assert parse_ranking('{"note": "India", "ranking": ["Australia"]}', TEAMS) == ["Australia"]
+
+
+def test_no_ranking_raises():
+    with pytest.raises(ValueError):
+        parse_ranking("I cannot rank these teams.", TEAMS)
+
+
+def test_reset_forgets_earlier_input():
+    parser = RankingParser(TEAMS)
+    parser.feed('["India", "Austr')
+    parser.reset()
+    parser.feed('["New Zealand"]')
+    assert parser.names() == ["New Zealand"]
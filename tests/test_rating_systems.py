@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from collections import defaultdict
+
+from comparisons import as_comparisons
+from rating_systems import (
+    glicko_rating, init_elo, init_glicko, init_trueskill, update_elo, update_glicko, update_trueskill,
+)
+
+
+def random_matches(num_teams=8, num_matches=300, seed=0):
+    rng = np.random.default_rng(seed)
+    teams = [f"team_{i}" for i in range(num_teams)]
+    matches = []
+    for _ in range(num_matches):
+        i, j = rng.choice(num_teams, 2, replace=False)
+        matches.append((teams[i], teams[j], rng.choice(["W", "L", "D"], p=[0.45, 0.45, 0.1])))
+    return matches
+
+
+# the package-based rankers these kernels replaced, returning ratings instead of rankings
+
+def reference_elo(preference_data, k=0.15):
+    from elo_rating import Elo
+
+    e = Elo()
+    for p1, p2, outcome in preference_data:
+        e.add_match(p1, p2, {'W': 1.0, 'L': 0.0}.get(outcome, 0.5), k=k)
+    return e.ratings()
+
+
+def reference_glicko(preference_data):
+    from glicko2 import Player
+
+    players = defaultdict(Player)
+    for p1, p2, outcome in preference_data:
+        if outcome == 'W':
+            players[p1].update_player([players[p2].rating], [players[p2].rd], [1])
+            players[p2].update_player([players[p1].rating], [players[p1].rd], [0])
+        elif outcome == 'L':
+            players[p2].update_player([players[p1].rating], [players[p1].rd], [1])
+            players[p1].update_player([players[p2].rating], [players[p2].rd], [0])
+        else:
+            players[p1].update_player([players[p2].rating], [players[p2].rd], [0.5])
+            players[p2].update_player([players[p1].rating], [players[p1].rd], [0.5])
+    return {team: player.rating for team, player in players.items()}
+
+
+def reference_trueskill(preference_data):
+    import trueskill
+
+    ratings = defaultdict(trueskill.Rating)
+    for p1, p2, outcome in preference_data:
+        if outcome == 'W':
+            ratings[p1], ratings[p2] = trueskill.rate_1vs1(ratings[p1], ratings[p2])
+        elif outcome == 'L':
+            ratings[p2], ratings[p1] = trueskill.rate_1vs1(ratings[p2], ratings[p1])
+        else:
+            ratings[p1], ratings[p2] = trueskill.rate_1vs1(ratings[p1], ratings[p2], drawn=True)
+    return {team: rating.mu for team, rating in ratings.items()}
+
+
+def by_name(comparisons, values):
+    return {team: values[comparisons.entity_index[team]] for team in comparisons.entities}
+
+
+def assert_ratings_close(actual, expected, **tolerance):
+    assert set(actual) == set(expected)
+    teams = sorted(expected)
+    np.testing.assert_allclose([actual[t] for t in teams], [expected[t] for t in teams], **tolerance)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_sequential_elo_matches_elo_rating(seed):
+    matches = random_matches(seed=seed)
+    comparisons = as_comparisons(matches)
+    state = init_elo(comparisons.num_entities)
+    update_elo(state, comparisons.winner, comparisons.loser, comparisons.outcome, k=0.15)
+    assert_ratings_close(by_name(comparisons, state['rating']), reference_elo(matches), rtol=1e-10, atol=1e-10)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_sequential_glicko_matches_glicko2(seed):
+    matches = random_matches(seed=seed)
+    comparisons = as_comparisons(matches)
+    state = init_glicko(comparisons.num_entities)
+    update_glicko(state, comparisons.winner, comparisons.loser, comparisons.outcome)
+    assert_ratings_close(by_name(comparisons, glicko_rating(state)), reference_glicko(matches), rtol=1e-8)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_sequential_trueskill_matches_trueskill(seed):
+    matches = random_matches(seed=seed)
+    comparisons = as_comparisons(matches)
+    state = init_trueskill(comparisons.num_entities)
+    update_trueskill(state, comparisons.winner, comparisons.loser, comparisons.outcome)
+    assert_ratings_close(by_name(comparisons, state['mu']), reference_trueskill(matches), rtol=1e-6)
+
+
+def test_elo_periods_of_one_match_match_sequential():
+    comparisons = as_comparisons(random_matches())
+    sequential = init_elo(comparisons.num_entities)
+    update_elo(sequential, comparisons.winner, comparisons.loser, comparisons.outcome)
+    batched = init_elo(comparisons.num_entities)
+    update_elo(batched, comparisons.winner, comparisons.loser, comparisons.outcome, period=np.arange(len(comparisons)))
+    np.testing.assert_allclose(batched['rating'], sequential['rating'], atol=1e-12)
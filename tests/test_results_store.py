@@ -0,0 +1,120 @@
+import os
+import shutil
+import stat
+import threading
+
+import pytest
+
+from results_store import ResultsStore
+
+RESULTS_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "results.csv")
+
+
+@pytest.fixture
+def store():
+    store = ResultsStore(":memory:", code_version="test")
+    yield store
+    store.close()
+
+
+def test_import_export_round_trip_is_byte_exact(store, tmp_path):
+    csv_path = tmp_path / "results.csv"
+    shutil.copy(RESULTS_CSV, csv_path)
+    original = csv_path.read_bytes()
+    assert b"\r\n" in original
+
+    assert store.import_csv(csv_path) > 0
+    store.export_csv(str(csv_path))
+    assert csv_path.read_bytes() == original
+
+
+def test_export_keeps_the_existing_line_terminator(store, tmp_path):
+    store.log_run("nfl-2020", "elo", {"kendalltau-tau": 0.5})
+    lf_path = tmp_path / "lf.csv"
+    lf_path.write_bytes(b"dataset,metric\n")
+    store.export_csv(str(lf_path))
+    assert b"\r" not in lf_path.read_bytes()
+
+    new_path = tmp_path / "new.csv"
+    store.export_csv(str(new_path))
+    assert new_path.read_bytes().count(b"\r\n") == 2
+
+
+def test_pivot_holds_the_latest_value_per_cell(store):
+    store.log_run("nfl-2020", "elo", {"kendalltau-tau": 0.5, "spearmanr-rho": 0.6}, params={"k": 0.1}, seed=42)
+    store.log_run("nfl-2020", "elo", {"kendalltau-tau": 0.7}, params={"k": 0.3}, seed=42)
+    store.log_run("icc-2023-2025", "glicko", {"kendalltau-tau": 0.4})
+    wide = store.pivot()
+    assert list(wide.columns) == ["elo", "glicko"]
+    assert wide.loc[("nfl-2020", "kendalltau-tau"), "elo"] == 0.7
+    assert wide.loc[("nfl-2020", "spearmanr-rho"), "elo"] == 0.6
+    # every run is kept
+    assert len(store.query(metric="kendalltau-tau", method="elo")) == 2
+
+
+def test_query_filters(store):
+    store.log_run("nfl-2020", "elo", {"kendalltau-tau": 0.5}, seed=1)
+    store.log_run("icc-2023-2025", "elo", {"kendalltau-tau": 0.4}, seed=None)
+    assert store.query(season=2020)["dataset"].tolist() == ["nfl-2020"]
+    assert store.query(season=None)["dataset"].tolist() == ["icc-2023-2025"]
+    assert store.query(seed=None, method="elo")["dataset"].tolist() == ["icc-2023-2025"]
+    with pytest.raises(ValueError):
+        store.query(team="India")
+
+
+def test_import_if_empty(store, tmp_path):
+    csv_path = tmp_path / "results.csv"
+    shutil.copy(RESULTS_CSV, csv_path)
+    assert store.import_if_empty(str(csv_path)) > 0
+    assert store.import_if_empty(str(csv_path)) == 0
+    assert store.import_if_empty(str(tmp_path / "missing.csv")) == 0
+
+
+def test_exports_are_serialised_with_logging(tmp_path, monkeypatch):
+    db_path, csv_path = str(tmp_path / "results.sqlite"), str(tmp_path / "results.csv")
+    exporter, logger = ResultsStore(db_path, code_version="test"), ResultsStore(db_path, code_version="test")
+    exporter.log_run("nfl-2020", "elo", {"kendalltau-tau": 0.5})
+    events = []
+    pivot = ResultsStore.pivot
+
+    def slow_pivot(self, **filters):
+        wide = pivot(self, **filters)
+        events.append("snapshot")
+        # another process logs a run while the snapshot is being written
+        thread.start()
+        thread.join(0.3)
+        events.append("replaced")
+        return wide
+
+    def log():
+        logger.log_run("nfl-2020", "glicko", {"kendalltau-tau": 0.6})
+        events.append("logged")
+
+    thread = threading.Thread(target=log)
+    monkeypatch.setattr(ResultsStore, "pivot", slow_pivot)
+    exporter.export_csv(csv_path)
+    thread.join()
+    assert events == ["snapshot", "replaced", "logged"]
+    monkeypatch.undo()
+
+    # the next export includes the run logged meanwhile
+    assert list(exporter.export_csv(csv_path).columns) == ["elo", "glicko"]
+    exporter.close()
+    logger.close()
+
+
+def test_export_keeps_the_file_mode(store, tmp_path):
+    store.log_run("nfl-2020", "elo", {"kendalltau-tau": 0.5})
+    csv_path = tmp_path / "results.csv"
+    csv_path.write_bytes(b"dataset,metric\r\n")
+    os.chmod(csv_path, 0o644)
+    store.export_csv(str(csv_path))
+    assert stat.S_IMODE(os.stat(csv_path).st_mode) == 0o644
+
+    new_path = tmp_path / "new.csv"
+    umask = os.umask(0o022)
+    try:
+        store.export_csv(str(new_path))
+    finally:
+        os.umask(umask)
+    assert stat.S_IMODE(os.stat(new_path).st_mode) == 0o644
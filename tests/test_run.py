@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('google.genai', 'scipy', 'datasets')
+
+
+def test_import_run_stays_light():
+    code = f"import run, sys; print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    process = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert process.stdout.strip() == "[]"
+
+
+@pytest.mark.parametrize("method", ["elo", "direct_prompt"])
+def test_profile_startup_only_imports(tmp_path, method):
+    db_path = tmp_path / "results.sqlite"
+    process = subprocess.run(
+        [sys.executable, "run.py", "--profile_startup", "--method", method, "--dataset", "nfl-2023",
+         "--db_path", str(db_path), "--csv_path", str(tmp_path / "results.csv")],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    assert process.returncode == 0, process.stderr
+    assert "import time:" in process.stdout
+    assert not db_path.exists() and not (tmp_path / "results.csv").exists()
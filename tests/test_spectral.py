@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from spectral import (
+    colley_scores, keener_scores, massey_least_squares, massey_scores, pagerank_scores, rank_centrality_scores,
+)
+
+# A beat B three times out of four
+TWO = np.array([[0., 3.], [1., 0.]])
+
+
+def test_rank_centrality_two_teams():
+    # pi_A * P(A -> B) = pi_B * P(B -> A) with P(A -> B) = 1/4, P(B -> A) = 3/4
+    np.testing.assert_allclose(rank_centrality_scores(TWO, reg=0), [0.75, 0.25])
+    # one pseudo-win each way: 4/6 and 2/6
+    np.testing.assert_allclose(rank_centrality_scores(TWO, reg=1), [2 / 3, 1 / 3])
+
+
+def test_pagerank_two_teams():
+    # A beat B once: B links to A, A is dangling
+    # x_B = d * x_A / 2 + (1 - d) / 2 and x_A + x_B = 1
+    x = pagerank_scores(np.array([[0., 1.], [0., 0.]]), damping=0.85)
+    x_a = 0.925 / 1.425
+    np.testing.assert_allclose(x, [x_a, 1 - x_a])
+
+
+def test_keener_two_teams():
+    h = lambda x: 0.5 + np.sign(x - 0.5) * np.sqrt(abs(2 * x - 1)) / 2
+    a_ab, a_ba = h(4 / 6) / 4, h(2 / 6) / 4
+    # Perron vector of [[0, a_ab], [a_ba, 0]]
+    ratio = np.sqrt(a_ab / a_ba)
+    np.testing.assert_allclose(keener_scores(TWO), [ratio / (1 + ratio), 1 / (1 + ratio)])
+
+
+def test_massey_two_teams():
+    # [[4, -4], [-4, 4]] r = [2, -2] with r_A + r_B = 0
+    np.testing.assert_allclose(massey_scores(TWO), [0.25, -0.25], atol=1e-9)
+
+
+def test_colley_two_teams():
+    # [[6, -4], [-4, 6]] r = [2, 0]: Colley's classic 0.6 / 0.4
+    np.testing.assert_allclose(colley_scores(TWO), [0.6, 0.4])
+
+
+def test_balanced_cycle_ties_everyone():
+    W = np.array([[0., 1., 0.], [0., 0., 1.], [1., 0., 0.]])
+    for scores in (rank_centrality_scores(W), pagerank_scores(W), keener_scores(W)):
+        np.testing.assert_allclose(scores, [1 / 3] * 3)
+    np.testing.assert_allclose(massey_scores(W), [0, 0, 0], atol=1e-9)
+    np.testing.assert_allclose(colley_scores(W), [0.5] * 3)
+
+
+def test_massey_and_colley_match_dense_solves():
+    rng = np.random.default_rng(1)
+    W = rng.integers(0, 3, (6, 6)).astype(float)
+    np.fill_diagonal(W, 0)
+    N = W + W.T
+    games = N.sum(axis=1)
+    diff = W.sum(axis=1) - W.sum(axis=0)
+    np.testing.assert_allclose(massey_scores(W), np.linalg.pinv(np.diag(games) - N) @ diff, atol=1e-8)
+    np.testing.assert_allclose(colley_scores(W), np.linalg.solve(2 * np.eye(6) + np.diag(games) - N, 1 + diff / 2), atol=1e-8)
+
+
+def test_massey_least_squares_recovers_margins_and_home_advantage():
+    # ratings 3, 0, -3 and a home edge of 1, observed without noise
+    r, h = np.array([3., 0., -3.]), 1.0
+    winner, loser = np.array([0, 0, 1, 1, 0, 2]), np.array([1, 2, 2, 0, 2, 1])
+    home = np.array([1, -1, 1, -1, 1, 1])
+    margin = r[winner] - r[loser] + h * home
+    fit = massey_least_squares(3, winner, loser, margin, home)
+    np.testing.assert_allclose(fit, [3, 0, -3, 1], atol=1e-6)
+    assert fit[:3].sum() == pytest.approx(0, abs=1e-9)
@@ -0,0 +1,38 @@
+'''
+    Week-by-week NFL ranking trajectories over several seasons in one pass, e.g.
+
+        python trajectory.py --seasons 2018 2019 2020 2021 2022 2023 --half_life 8 --window 34
+
+    Each week is fed to one online ranker, so every window advance is an incremental update
+    (and, for Bradley-Terry, a warm-started refit) rather than a run of run.py.
+'''
+
+import argparse
+
+from online import OnlineRanker, ranking_trajectory
+from utils import load_nfl_games, nfl_history
+
+parser = argparse.ArgumentParser(description="Week-by-week ranking trajectories")
+parser.add_argument("--ranker", type=str, default="decayed_bradley_terry", choices=list(OnlineRanker.registry))
+parser.add_argument("--seasons", type=int, nargs="+", default=None, help="default: every season in the data")
+parser.add_argument("--half_life", type=float, default=None, help="decayed_bradley_terry: weeks for a game's weight to halve")
+parser.add_argument("--window", type=int, default=None, help="decayed_bradley_terry: weeks kept in the window")
+parser.add_argument("--prior", type=float, default=1.0,
+                    help="decayed_bradley_terry: virtual draws per team against an average opponent")
+parser.add_argument("--output", type=str, default="trajectory.csv")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    preference_data = nfl_history(load_nfl_games(), args.seasons)
+    if args.ranker == "decayed_bradley_terry":
+        ranker = OnlineRanker.registry[args.ranker](half_life=args.half_life, window=args.window, prior=args.prior)
+    elif args.ranker == "bradley_terry":
+        ranker = OnlineRanker.registry[args.ranker]()
+    else:
+        ranker = OnlineRanker.registry[args.ranker](by_period=True)
+
+    trajectory = ranking_trajectory(preference_data, ranker)
+    trajectory.index.name = "period"
+    trajectory.to_csv(args.output)
+    print(f"{len(trajectory)} weeks x {trajectory.shape[1]} teams written to {args.output}")
@@ -1,108 +1,438 @@
+import hashlib
 import json 
 import numpy as np
+import os
+import re
+import shutil
+import tempfile
+import warnings
 
-from scipy.stats import kendalltau, spearmanr
-from sklearn.metrics import ndcg_score
+from comparisons import ComparisonSet, as_comparisons
+from instrumentation import instrumented
 
-def process_icc_dataset(dataset):
+CHARS_PER_TOKEN = 4
+# first line of format_head_to_head, by which prompts recognise the compact table
+HEAD_TO_HEAD_HEADER = "Team records (team: wins-losses-draws):"
+NFL_GAMES_PATH = "./data/nfl_mahomes_era_games.csv"
+NFL_NAMES_PATH = "./data/names.json"
+# bump when load_nfl_games stores different columns, so caches written by older code are not reused
+NFL_CACHE_VERSION = 2
+# games played at a neutral venue, whatever the home_team column says
+NFL_NEUTRAL_GAME_TYPES = ('SB',)
+
+# bump when parse_icc_matches changes its output, so parsed ICC caches written by older code are not reused
+ICC_PARSER_VERSION = 2
+MATCH_PATTERN = re.compile(r"^\s*(?P<status>[WLDT])\s+(?P<date>[A-Za-z]+\s+\d{1,2}),\s*(?P<year>\d{4}),[^,]*,\s*(?P<fixture>.*)$")
+
+def _team_pattern(teams):
+    # longest names first so e.g. "South Africa" is not matched as a prefix of a longer name
+    names = '|'.join(re.escape(team) for team in sorted(teams, key=len, reverse=True))
+    return re.compile(rf"(?P<first>{names})\s+vs\.?\s+(?P<second>{names})(?!\w)")
+
+def parse_icc_matches(dataset, teams=None):
+    '''
+        One (team, opponent, result) tuple per match in dataset['Matches'], where the match strings
+        of row i are seen from the point of view of dataset['Team'][i], e.g.
+
+            "W January 03, 2025, 2nd Test, South Africa vs Pakistan South Africa won by 10 wickets"
+
+        teams: names the fixtures may contain (default: dataset['Team']); matches against other
+                    teams are skipped
+        A match listed by both teams is kept once, at its first occurrence, keyed by date and
+        pairing. Tied matches ('T') are recorded as draws. Match strings that MATCH_PATTERN does
+        not recognise are skipped with a warning giving their number.
+    '''
+    if teams is None:
+        teams = dataset['Team'].tolist()
+    fixture_pattern = _team_pattern(teams)
     preference_data = []
-    matchday_dict = {}
-    unique_matches = []
-    team_dict = {0: 'South Africa', 1: 'Australia', 2: 'India', 3: 'New Zealand', 4: 'England', 5: 'Sri Lanka', 6: 'Bangladesh', 7: 'West Indies', 8: 'Pakistan'}
-    for idx, team_matches in enumerate(dataset['Matches']):
+    seen = set()
+    unmatched = []
+    total = 0
+    for team, team_matches in zip(dataset['Team'], dataset['Matches']):
         for mat in team_matches:
-            matchday = ' '.join(mat.split(',')[0].split(' ')[1:]) + mat.split(',')[1]
-            if matchday in matchday_dict.keys():
+            total += 1
+            match = MATCH_PATTERN.match(mat)
+            if not match:
+                unmatched.append(mat)
+                continue
+            fixture = fixture_pattern.search(match['fixture'])
+            if not fixture or team not in (fixture['first'], fixture['second']):
                 continue
-            unique_matches.append(mat)
-            match_status = mat.split(' ')[0]
-            opponent = None         
-            if match_status == 'D':
-                opponent = mat.split('vs')[-1].split('Match drawn')[0].strip()
-            elif mat.replace(team_dict[idx], '_').count('_') == 2:
-                opponent = mat.replace(team_dict[idx], '_').split('vs')[-1].split('_')[0].strip()
-            else:
-                if len(mat.split('vs')[-1].split('won')[0].strip().split(' ')) == 2:
-                    opponent = mat.split('vs')[-1].split('won')[0].strip().split(' ')[0].strip()
-                else:
-                    opponent = ' '.join(mat.split('vs')[-1].split('won')[0].strip().split(' ')[:2])
-            matchday_dict[matchday] = (team_dict[idx], opponent, match_status)
-    
-    for key, value in matchday_dict.items():
-        preference_data.append(value)
-        
+            opponent = fixture['second'] if fixture['first'] == team else fixture['first']
+            key = (' '.join(match['date'].split()).lower(), match['year'], *sorted((team, opponent)))
+            if key in seen:
+                continue
+            seen.add(key)
+            status = match['status']
+            preference_data.append((team, opponent, 'D' if status == 'T' else status))
+    if unmatched:
+        warnings.warn(f"{len(unmatched)} of {total} ICC match strings were not recognised and skipped, e.g. {unmatched[0]!r}")
+    return preference_data
+
+@instrumented()
+def process_icc_dataset(dataset, teams=None):
     gold_rankings = dataset['Team'].tolist()
-    team_identifier = {}
+    team_identifier = {team: idx for idx, team in enumerate(gold_rankings)}
+    preference_data = ComparisonSet.from_tuples(parse_icc_matches(dataset, teams), entities=gold_rankings)
+
+    return preference_data, team_identifier, gold_rankings
+
+def save_preference_data(path, preference_data, gold_rankings):
+    '''
+        Stores parsed preference data as JSON so later runs can skip downloading and parsing.
+    '''
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = {
+        'entities': as_comparisons(preference_data).entities,
+        'preference_data': [list(tup) for tup in preference_data],
+        'gold_rankings': list(gold_rankings),
+    }
+    with open(path + '.tmp', 'w') as f:
+        json.dump(payload, f)
+    os.replace(path + '.tmp', path)
+
+def load_icc_dataset(download, cache_dir=".cache", name="icc-2023-2025"):
+    '''
+        (preference_data, team_identifier, gold_rankings) of the ICC dataset. download() returns its
+        rows (a DataFrame with Team and Matches columns) and is only called when cache_dir holds no
+        copy of them yet. The parsed data is cached under a SHA-256 of the stored rows,
+        ICC_PARSER_VERSION and MATCH_PATTERN, so a new download or parser invalidates it.
+    '''
+    source_path = os.path.join(cache_dir, f"{name}-source.json")
+    if not os.path.exists(source_path):
+        dataset = download()
+        rows = {'Team': [str(team) for team in dataset['Team']], 'Matches': [[str(mat) for mat in matches] for matches in dataset['Matches']]}
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(source_path + '.tmp', 'w') as f:
+            json.dump(rows, f)
+        os.replace(source_path + '.tmp', source_path)
+
+    digest = _file_digest(source_path, version=f"{ICC_PARSER_VERSION}:{MATCH_PATTERN.pattern}")
+    cache_path = os.path.join(cache_dir, f"{name}-{digest[:16]}.json")
+    if os.path.exists(cache_path):
+        return load_preference_data_cache(cache_path)
+
+    import pandas as pd
+
+    preference_data, team_identifier, gold_rankings = process_icc_dataset(pd.DataFrame(json.load(open(source_path, "r"))))
+    save_preference_data(cache_path, preference_data, gold_rankings)
+    return preference_data, team_identifier, gold_rankings
+
+def load_preference_data_cache(path):
+    '''
+        (preference_data, team_identifier, gold_rankings) stored by save_preference_data.
+    '''
+    payload = json.load(open(path, "r"))
+    gold_rankings = payload['gold_rankings']
+    team_identifier = {team: idx for idx, team in enumerate(gold_rankings)}
+    preference_data = ComparisonSet.from_tuples([tuple(tup) for tup in payload['preference_data']], entities=payload['entities'])
+    return preference_data, team_identifier, gold_rankings
+
+def _nfl_preferences(teams, home, away, home_score, away_score, week, neutral=None):
+    '''
+        teams: names of the season's teams; home, away: ids into teams per game
+        neutral: per game, whether it was played at a neutral venue (the Super Bowl)
+    '''
+    home_won = home_score > away_score
+    draw = ~home_won & ~(home_score < away_score)
+    winner = np.where(home_won | draw, home, away)
+    loser = np.where(home_won | draw, away, home)
+    outcome = np.where(draw, 0.5, 1.0)
+    margin = np.abs(home_score - away_score)
+    home_side = np.where(home_won | draw, 1, -1)
+    if neutral is not None:
+        home_side[np.asarray(neutral, dtype=bool)] = 0
+
+    # gold: teams with a decided game by wins, ties in order of first appearance (winner before loser)
+    decided = ~draw
+    ids = np.empty(2 * decided.sum(), dtype=np.int64)
+    ids[0::2], ids[1::2] = winner[decided], loser[decided]
+    unique, first = np.unique(ids, return_index=True)
+    order = unique[np.argsort(first, kind='stable')]
+    wins = np.bincount(winner[decided], minlength=len(teams))
+    gold_rankings = [teams[i] for i in order[np.argsort(-wins[order], kind='stable')]]
+
+    team_identifier = {team: idx for idx, team in enumerate(teams)}
+    preference_data = ComparisonSet(teams, winner, loser, outcome, period=np.asarray(week), margin=margin, home=home_side)
 
-    for idx, team in enumerate(gold_rankings):
-        team_identifier[team] = idx
-            
     return preference_data, team_identifier, gold_rankings
 
+@instrumented()
 def process_nfl_dataset(dataset, season):
+    import pandas as pd
+
     df = dataset[dataset['season'] == season]
-    preference_data = []
-    matchday_dict = {}
-    unique_matches = []
-
-    team_win_count = {}
-    teams = set(df['home_team']).union(df['away_team'])
-
-    for _, row in df.iterrows():
-        home = row['home_team']
-        away = row['away_team']
-        home_score = row['home_score']
-        away_score = row['away_score']
-        game_id = row['game_id']
-
-        if home_score > away_score:
-            result = 'W'
-            winner, loser = home, away
-        elif home_score < away_score:
-            result = 'L'
-            winner, loser = away, home
-        else:
-            result = 'D'
-            winner = loser = None
-
-        unique_matches.append(game_id)
-        
-        if result == 'D':
-            matchday_dict[game_id] = (home, away, result)
-            preference_data.append((home, away, 'D'))
-        else:
-            matchday_dict[game_id] = (winner, loser, 'W')
-            preference_data.append((winner, loser, 'W'))
-            team_win_count[winner] = team_win_count.get(winner, 0) + 1
-            team_win_count[loser] = team_win_count.get(loser, 0)
-
-    gold_rankings = sorted(team_win_count.keys(), key=lambda t: team_win_count[t], reverse=True)
-    team_dict = {idx: team for idx, team in enumerate(sorted(teams))}
-    team_identifier = {team: idx for idx, team in team_dict.items()}
+    teams = sorted(set(df['home_team']).union(df['away_team']))
+    home = pd.Categorical(df['home_team'], categories=teams).codes
+    away = pd.Categorical(df['away_team'], categories=teams).codes
+    return _nfl_preferences(
+        teams, home, away, df['home_score'].to_numpy(), df['away_score'].to_numpy(), df['week'].to_numpy(),
+        df['game_type'].isin(NFL_NEUTRAL_GAME_TYPES).to_numpy(),
+    )
 
-    return preference_data, team_identifier, gold_rankings
+def _file_digest(*paths, version=None):
+    digest = hashlib.sha256()
+    if version is not None:
+        digest.update(str(version).encode())
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
 
+@instrumented()
+def load_nfl_games(csv_path=NFL_GAMES_PATH, names_path=NFL_NAMES_PATH, cache_dir=".cache"):
+    '''
+        All seasons of NFL results as columns: season, week, home, away (ids into teams, the sorted
+        team names), home_score, away_score and neutral (played at a neutral venue). The first call
+        parses the CSV and stores one .npy file per column under cache_dir, keyed by a hash of both
+        source files and NFL_CACHE_VERSION; later calls memory-map those files, so editing either
+        source invalidates the cache.
+    '''
+    path = os.path.join(cache_dir, f"nfl_games-{_file_digest(csv_path, names_path, version=NFL_CACHE_VERSION)[:16]}")
+    if not os.path.isdir(path):
+        import pandas as pd
+
+        df = pd.read_csv(csv_path, usecols=['season', 'game_type', 'week', 'home_team', 'away_team', 'home_score', 'away_score'])
+        names = json.load(open(names_path, "r"))
+        home = df['home_team'].map(lambda team: names.get(team, team))
+        away = df['away_team'].map(lambda team: names.get(team, team))
+        teams = sorted(set(home).union(away))
+        columns = {
+            'teams': np.array(teams, dtype=str),
+            'season': df['season'].to_numpy(np.int32),
+            'week': df['week'].to_numpy(np.int32),
+            'home': pd.Categorical(home, categories=teams).codes.astype(np.int32),
+            'away': pd.Categorical(away, categories=teams).codes.astype(np.int32),
+            'home_score': df['home_score'].to_numpy(),
+            'away_score': df['away_score'].to_numpy(),
+            'neutral': df['game_type'].isin(NFL_NEUTRAL_GAME_TYPES).to_numpy(),
+        }
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=cache_dir)
+        for name, column in columns.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), column)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # another process stored the same cache first
+            shutil.rmtree(tmp_path)
+    return {name[:-len('.npy')]: np.load(os.path.join(path, name), mmap_mode='r') for name in os.listdir(path)}
+
+@instrumented()
+def nfl_season(games, season):
+    '''
+        (preference_data, team_identifier, gold_rankings) of one season of load_nfl_games(), as
+        process_nfl_dataset would return them.
+    '''
+    mask = np.asarray(games['season']) == season
+    home, away = np.asarray(games['home'])[mask], np.asarray(games['away'])[mask]
+    present = np.unique(np.concatenate([home, away]))
+    teams = np.asarray(games['teams'])[present].tolist()
+    return _nfl_preferences(
+        teams, np.searchsorted(present, home), np.searchsorted(present, away),
+        np.asarray(games['home_score'])[mask], np.asarray(games['away_score'])[mask], np.asarray(games['week'])[mask],
+        np.asarray(games['neutral'])[mask],
+    )
+
+@instrumented()
+def nfl_history(games, seasons=None):
+    '''
+        ComparisonSet of several seasons of load_nfl_games() over all their teams, with period
+        labels season * 100 + week so that consecutive seasons stay in chronological order.
+    '''
+    season = np.asarray(games['season'])
+    mask = np.ones(len(season), dtype=bool) if seasons is None else np.isin(season, list(seasons))
+    home, away = np.asarray(games['home'])[mask], np.asarray(games['away'])[mask]
+    present = np.unique(np.concatenate([home, away]))
+    teams = np.asarray(games['teams'])[present].tolist()
+    preference_data, _, _ = _nfl_preferences(
+        teams, np.searchsorted(present, home), np.searchsorted(present, away),
+        np.asarray(games['home_score'])[mask], np.asarray(games['away_score'])[mask],
+        season[mask] * 100 + np.asarray(games['week'])[mask], np.asarray(games['neutral'])[mask],
+    )
+    return preference_data
+
+def format_match_lines(preference_data):
+    '''
+        One "team1 vs team2, result" line per match, as the LLM mechanisms were originally prompted.
+    '''
+    llm_preference_data = [f"{tup[0]} vs {tup[1]}, {tup[int(tup[2] == 'L')] + ' won' if tup[2] != 'D' else 'Match Drawn'}" for tup in preference_data]
+    return '\n'.join(llm_preference_data)
+
+def format_head_to_head(preference_data):
+    '''
+        Compact encoding whose size grows with the number of teams and pairings, not with the
+        number of games: per-team win/loss/draw totals followed by per-pair head-to-head counts.
+    '''
+    comparisons = as_comparisons(preference_data)
+    entities = comparisons.entities
+    n = comparisons.num_entities
+    winner, loser, draw = comparisons.winner.astype(np.int64), comparisons.loser.astype(np.int64), comparisons.draw
+
+    wins = np.bincount(winner[~draw], minlength=n)
+    losses = np.bincount(loser[~draw], minlength=n)
+    draws = np.bincount(winner[draw], minlength=n) + np.bincount(loser[draw], minlength=n)
+
+    first, second = np.minimum(winner, loser), np.maximum(winner, loser)
+    pairs, pair_idx = np.unique(first * n + second, return_inverse=True)
+    first_wins = np.bincount(pair_idx, ~draw & (winner == first), minlength=len(pairs))
+    second_wins = np.bincount(pair_idx, ~draw & (winner == second), minlength=len(pairs))
+    pair_draws = np.bincount(pair_idx, draw, minlength=len(pairs))
+
+    order = comparisons.appearance_order()
+    lines = [HEAD_TO_HEAD_HEADER]
+    lines += [f"{entities[i]}: {wins[i]}-{losses[i]}-{draws[i]}" for i in order]
+    lines += ["", "Head-to-head (team1 vs team2: team1 wins-team2 wins-draws):"]
+    for pair, a_wins, b_wins, d in zip(pairs.tolist(), first_wins.tolist(), second_wins.tolist(), pair_draws.tolist()):
+        a, b = divmod(pair, n)
+        lines.append(f"{entities[a]} vs {entities[b]}: {int(a_wins)}-{int(b_wins)}-{int(d)}")
+    return '\n'.join(lines)
+
+def estimate_tokens(text):
+    '''
+        Rough token count (about four characters per token for English text).
+    '''
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+@instrumented()
+def format_preference_data(preference_data, prompt_format='raw', token_budget=2000):
+    '''
+        prompt_format: 'raw' (one line per match), 'compact' (head-to-head table), or 'auto', which
+                    switches to the compact table once the raw lines exceed token_budget tokens
+    '''
+    if prompt_format == 'compact':
+        return format_head_to_head(preference_data)
+    formatted_preference_data = format_match_lines(preference_data)
+    if prompt_format == 'auto' and estimate_tokens(formatted_preference_data) > token_budget:
+        return format_head_to_head(preference_data)
+    return formatted_preference_data
+
+def encode_rankings(rankings, teams):
+    '''
+        S x len(teams) array of team ids (indices into teams) for a list of rankings of names. Names
+        outside teams and repeated names are dropped; shorter rankings are padded with -1.
+    '''
+    team_index = {team: idx for idx, team in enumerate(teams)}
+    encoded = np.full((len(rankings), len(teams)), -1, dtype=np.int64)
+    for s, ranking in enumerate(rankings):
+        ids = list(dict.fromkeys(team_index[team] for team in ranking if team in team_index))
+        encoded[s, :len(ids)] = ids
+    return encoded
+
+def _count_inversions(values):
+    '''
+        Inversions per row of an S x m integer array by bottom-up merge sort. At each level the
+        two sorted halves of every block are merged by a stable argsort (a linear-time merge of two
+        runs) and every element of the right half counts the left-half elements it moves past.
+    '''
+    S, m = values.shape
+    size = 1 << max(m - 1, 0).bit_length()
+    runs = np.concatenate([values, np.broadcast_to(values.max(initial=0) + 1 + np.arange(size - m), (S, size - m))], axis=1)
+    inversions = np.zeros(S, dtype=np.int64)
+    width = 1
+    while width < size:
+        blocks = runs.reshape(S, -1, 2 * width)
+        order = np.argsort(blocks, axis=-1, kind='stable')
+        merged_pos = np.empty_like(order)
+        np.put_along_axis(merged_pos, order, np.broadcast_to(np.arange(2 * width), order.shape), axis=-1)
+        inversions += (width - merged_pos[..., width:] + np.arange(width)).sum(axis=(1, 2))
+        runs = np.take_along_axis(blocks, order, axis=-1).reshape(S, size)
+        width *= 2
+    return inversions
+
+def _project(gold, predicted):
+    '''
+        Predicted rankings as gold positions, compacted to the left: entries that are -1, unknown
+        to gold or repeated are dropped. Returns the raw gold positions, their ranks among the teams
+        each row contains (its projection onto those teams; padding continues the sequence) and the
+        number of teams per row.
+    '''
+    gold = np.asarray(gold, dtype=np.int64)
+    predicted = np.atleast_2d(np.asarray(predicted, dtype=np.int64))
+    S, width = predicted.shape
+    n = len(gold)
+    lookup = np.full(max(gold.max(initial=-1), predicted.max(initial=-1)) + 1, -1, dtype=np.int64)
+    lookup[gold] = np.arange(n)
+    position = np.where(predicted >= 0, lookup[np.maximum(predicted, 0)], -1)
+
+    # first occurrence of every team in a row
+    order = np.argsort(position, axis=1, kind='stable')
+    sorted_position = np.take_along_axis(position, order, axis=1)
+    repeated = np.zeros_like(position, dtype=bool)
+    np.put_along_axis(repeated, order[:, 1:], sorted_position[:, 1:] == sorted_position[:, :-1], axis=1)
+    valid = (position >= 0) & ~repeated
+
+    compact = np.argsort(~valid, axis=1, kind='stable')
+    position = np.take_along_axis(position, compact, axis=1)
+    valid = np.take_along_axis(valid, compact, axis=1)
+    key = np.where(valid, position, n + np.arange(width))
+    projected = np.argsort(np.argsort(key, axis=1, kind='stable'), axis=1, kind='stable')
+    return np.where(valid, position, -1), projected, valid.sum(axis=1)
+
+@instrumented()
+def evaluate_rankings(gold, predicted, ks=(3, 5)):
+    '''
+        Batched evaluation of a stack of predicted rankings against one gold ranking.
+
+        gold: team ids in gold order
+        predicted: S x m integer array of team ids per predicted ranking (see encode_rankings); -1,
+                    ids not in gold and repeats are ignored, so rankings may be partial
+
+        Kendall tau, Spearman rho and NDCG score each ranking against the gold order restricted to
+        the teams it contains; top-k accuracy compares its first k teams with the full gold top-k
+        and coverage is the fraction of gold teams it contains. Returns a dict of length-S arrays.
+    '''
+    position, projected, m = _project(gold, predicted)
+    S, width = projected.shape
+    n = len(gold)
+    idx = np.arange(width)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pairs = m * (m - 1) / 2
+        tau = 1 - 2 * _count_inversions(projected) / pairs
+        rho = 1 - 6 * ((projected - idx) ** 2).sum(axis=1) / (m * (m ** 2 - 1))
+
+        # relevance of the item at predicted slot i is i, ranked by its gold position (evaluate_ranking semantics)
+        discount = 1 / np.log2(idx + 2)
+        present = idx < m[:, None]
+        ranked = np.argsort(np.where(present, -projected, 1), axis=1, kind='stable')
+        dcg = (np.where(present, idx, 0)[np.arange(S)[:, None], ranked] * discount).sum(axis=1)
+        idcg = (np.where(present, m[:, None] - 1 - idx, 0) * discount).sum(axis=1)
+        ndcg = dcg / idcg
+
+    results = {"kendalltau-tau": np.where(m > 1, tau, np.nan), "spearman-rho": np.where(m > 1, rho, np.nan)}
+    for k in ks:
+        hits = ((position[:, :k] >= 0) & (position[:, :k] < k)).sum(axis=1)
+        results[f"top_{k}_accuracy"] = hits / k
+    results["ndcg"] = np.where(m > 1, ndcg, np.nan)
+    results["coverage"] = m / n
+    return results
+
+@instrumented()
 def evaluate_ranking(gold_list, predicted_list):
+    '''
+        Metrics of a single predicted ranking, with p-values. Entries are team names or ids; entries
+        missing from gold_list are ignored instead of raising.
+    '''
+    from scipy.stats import kendalltau, spearmanr
+
+    gold = np.arange(len(gold_list))
+    predicted = encode_rankings([predicted_list], gold_list)
+    batch = evaluate_rankings(gold, predicted)
+    _, projected, m = _project(gold, predicted)
+    projected = projected[0, :m[0]]
+
     results = {}
 
-    kendall = kendalltau(gold_list, predicted_list)
-    spearman = spearmanr(gold_list, predicted_list)
+    kendall = kendalltau(np.arange(m[0]), projected)
+    spearman = spearmanr(np.arange(m[0]), projected)
 
-    results["kendalltau-tau"] = kendall.statistic
+    results["kendalltau-tau"] = batch["kendalltau-tau"][0]
     results["kendalltau-pvalue"] = kendall.pvalue
-    results["spearman-rho"] = spearman.statistic 
+    results["spearman-rho"] = batch["spearman-rho"][0]
     results["spearman-pvalue"] = spearman.pvalue
+    for key in ["top_3_accuracy", "top_5_accuracy", "ndcg", "coverage"]:
+        results[key] = batch[key][0]
 
-    # Top-k Accuracy
-    for k in [3, 5]:
-        gold_top_k = set(gold_list[:k])
-        pred_top_k = set(predicted_list[:k])
-        topk_accuracy = len(gold_top_k & pred_top_k) / k
-        results[f"top_{k}_accuracy"] = topk_accuracy
-        
-    true_relevance = np.asarray([gold_list])
-    scores = np.asarray([predicted_list])
-    ndcg = ndcg_score(true_relevance, scores)
-    results["ndcg"] = ndcg
-
-    return results
\ No newline at end of file
+    return results